@@ -1,8 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from .models import Profile
+from . import blocks
 from django.utils import timezone
 
+def _apply_block(queryset, blocked, reason="", until=None):
+    """Batched UPDATEs instead of per-row saves; blocks.apply mirrors them into the
+    search index, the cached contexts and the blocked set, and closes sockets.
+    Ids are read first: after the update a filtered changelist may select nobody."""
+    return blocks.apply(queryset.values_list("user_id", flat=True), blocked, reason, until)
+
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ("user", "first_name", "last_name", "profile_visibility", "is_blocked", "block_until", "theme")
@@ -26,23 +33,23 @@ class ProfileAdmin(admin.ModelAdmin):
     actions = ["block_users", "unblock_users", "temp_block_1_day", "temp_block_7_days"]
 
     def block_users(self, request, queryset):
-        queryset.update(is_blocked=True, block_reason="Blocked by admin", block_until=None)
-        self.message_user(request, f"{queryset.count()} users permanently blocked.")
+        n = _apply_block(queryset, True, "Blocked by admin")
+        self.message_user(request, f"{n} users permanently blocked.")
     block_users.short_description = "Block selected users permanently"
 
     def unblock_users(self, request, queryset):
-        queryset.update(is_blocked=False, block_reason="", block_until=None)
-        self.message_user(request, f"{queryset.count()} users unblocked.")
+        n = _apply_block(queryset, False)
+        self.message_user(request, f"{n} users unblocked.")
     unblock_users.short_description = "Unblock selected users"
 
     def temp_block_1_day(self, request, queryset):
         block_until = timezone.now() + timezone.timedelta(days=1)
-        queryset.update(is_blocked=True, block_reason="Temporary block (1 day)", block_until=block_until)
-        self.message_user(request, f"{queryset.count()} users blocked for 1 day.")
+        n = _apply_block(queryset, True, "Temporary block (1 day)", block_until)
+        self.message_user(request, f"{n} users blocked for 1 day.")
     temp_block_1_day.short_description = "Block selected users for 1 day"
 
     def temp_block_7_days(self, request, queryset):
         block_until = timezone.now() + timezone.timedelta(days=7)
-        queryset.update(is_blocked=True, block_reason="Temporary block (7 days)", block_until=block_until)
-        self.message_user(request, f"{queryset.count()} users blocked for 7 days.")
+        n = _apply_block(queryset, True, "Temporary block (7 days)", block_until)
+        self.message_user(request, f"{n} users blocked for 7 days.")
     temp_block_7_days.short_description = "Block selected users for 7 days"
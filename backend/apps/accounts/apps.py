@@ -6,10 +6,24 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         from django.contrib.auth.models import User
-        from django.db.models.signals import post_save
+        from django.contrib.auth.signals import user_logged_out
+        from django.db.models.signals import post_delete, post_init, post_save
         from .models import Profile
+        from .search import on_profile_saved
+        from . import blocks, context
+        from apps.media import images, refs
 
         def create_profile(sender, instance, created, **kwargs):
             if created:
                 Profile.objects.create(user=instance)
         post_save.connect(create_profile, sender=User)
+        post_save.connect(on_profile_saved, sender=Profile)
+        post_init.connect(blocks.on_profile_loaded, sender=Profile)
+        post_save.connect(blocks.on_profile_saved, sender=Profile)
+        post_delete.connect(blocks.on_profile_deleted, sender=Profile)
+        refs.track(Profile, "avatar")
+        for signal in (post_save, post_delete):
+            signal.connect(context.on_user_changed, sender=User)
+            signal.connect(context.on_profile_changed, sender=Profile)
+        images.variants_recorded.connect(context.on_variants_recorded, sender=Profile)
+        user_logged_out.connect(context.on_logged_out)
@@ -3,7 +3,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth import authenticate, login as dj_login, logout as dj_logout
 from django.contrib.auth.models import User
-from django.db.models import Q
+from . import blocks, search
 import re
 
 def validate_username(username):
@@ -18,28 +18,28 @@ def validate_username(username):
         return False
     return True
 
+def _block_error(block):
+    if block is None:
+        return None
+    until, reason = block
+    if until:
+        return f"Account temporarily blocked until {until.strftime('%Y-%m-%d %H:%M')}. Reason: {reason}"
+    return f"Account blocked. Reason: {reason}"
+
 @api_view(["POST"])  # username/password login (session auth)
 @permission_classes([AllowAny])
 def login(request):
     username = request.data.get("username", "")
     password = request.data.get("password", "")
 
-    # Check if user is blocked
-    try:
-        user = User.objects.get(username=username)
-        if hasattr(user, 'profile') and user.profile.is_blocked:
-            from datetime import timezone
-            from django.utils import timezone as tz
-            if user.profile.block_until and user.profile.block_until > tz.now():
-                return Response({"ok": False, "error": f"Account temporarily blocked until {user.profile.block_until.strftime('%Y-%m-%d %H:%M')}. Reason: {user.profile.block_reason}"}, status=403)
-            elif not user.profile.block_until:
-                return Response({"ok": False, "error": f"Account blocked. Reason: {user.profile.block_reason}"}, status=403)
-    except User.DoesNotExist:
-        pass
-
     user = authenticate(request, username=username, password=password)
     if user is None:
         return Response({"ok": False, "error": "invalid credentials"}, status=401)
+    # block check after the password, from the cached blocked set: no
+    # extra lookups, and block reasons aren't shown to anyone who types a username
+    error = _block_error(blocks.block_of(user.pk))
+    if error:
+        return Response({"ok": False, "error": error}, status=403)
     dj_login(request, user)
     return Response({"ok": True})
 
@@ -86,17 +86,4 @@ def register(request):
 @permission_classes([IsAuthenticated])
 def search_users(request):
     q = request.query_params.get("q", "").strip()
-    qs = User.objects.select_related('profile').filter(profile__is_blocked=False)
-    if q:
-        qs = qs.filter(Q(username__icontains=q) | Q(profile__first_name__icontains=q) | Q(profile__last_name__icontains=q))
-    data = [
-        {
-            "username": u.username,
-            "is_staff": u.is_staff,
-            "first_name": u.profile.first_name,
-            "last_name": u.profile.last_name,
-            "profile_visibility": u.profile.profile_visibility
-        }
-        for u in qs[:50]
-    ]
-    return Response(data)
+    return Response(search.search_user_data(q))
@@ -0,0 +1,17 @@
+from rest_framework.authentication import SessionAuthentication
+
+from . import blocks
+
+
+class BlockAwareSessionAuthentication(SessionAuthentication):
+    """SessionAuthentication that treats blocked users as anonymous.
+
+    CachedModelBackend.get_user already refuses them, but sessions opened
+    before it was added name ModelBackend and are resolved by that instead.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None and blocks.is_blocked(result[0].pk):
+            return None
+        return result
@@ -0,0 +1,19 @@
+from django.contrib.auth.backends import ModelBackend
+
+from . import blocks, context
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user(), run on every authenticated request, reads the cached context.
+
+    Blocked users come back as anonymous, so a block also ends sessions that
+    were opened before it. Sessions from before this backend name ModelBackend
+    and never reach it; REST (BlockAwareSessionAuthentication) and the socket
+    handshake check the blocked set themselves.
+    """
+
+    def get_user(self, user_id):
+        user = context.load(user_id)
+        if user is None or not self.user_can_authenticate(user) or blocks.is_blocked(user.pk):
+            return None
+        return user
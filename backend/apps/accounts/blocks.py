@@ -0,0 +1,187 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from pookiechat import versions
+
+from . import context, search
+from .models import Profile
+
+# Who is blocked right now, answered without a query. Active blocks are few
+# next to the user table, so the whole set ({user id: (until, reason)}, until
+# in epoch seconds or None when permanent) is one shared cache entry under a
+# generation key, with a copy in each worker for ACCOUNTS_BLOCKS_LOCAL_TTL
+# seconds (as in apps.chat.membership). Temporary blocks run out on their own:
+# lookups compare `until` with the clock, and the set is reloaded by the
+# earliest expiry, which also lifts the expired rows in the database.
+#
+# Blocking closes the user's open sockets at once: every ChatConsumer joins
+# group_name(user id), and block changes broadcast EVENT there after commit.
+
+GEN_KEY = "accounts:blocked:gen"
+EVENT = "account.blocked"
+CLOSE_CODE = 4403
+BATCH = 5000  # user ids per UPDATE in apply()
+BROADCAST_BATCH = 500
+
+_local = [0.0, None]  # [expires (monotonic), {user id: (until, reason)}]
+_lock = threading.Lock()
+
+
+def group_name(user_id):
+    return f"user_{user_id}"
+
+
+def _key():
+    return f"accounts:blocked:{versions.get_version(GEN_KEY)}"
+
+
+def _load():
+    now = timezone.now()
+    blocked, expired = {}, []
+    for uid, until, reason in Profile.objects.filter(is_blocked=True).values_list(
+            "user_id", "block_until", "block_reason"):
+        if until is not None and until <= now:
+            expired.append(uid)
+        else:
+            blocked[uid] = (until.timestamp() if until is not None else None, reason)
+    if expired:
+        lift_expired(expired)
+    return blocked
+
+
+def _ttl(blocked):
+    """Keep the shared entry no longer than the earliest temporary block lasts"""
+    ttl = settings.ACCOUNTS_BLOCKS_TTL
+    untils = [until for until, _ in blocked.values() if until is not None]
+    if untils:
+        ttl = max(1, min(ttl, int(min(untils) - time.time()) + 1))
+    return ttl
+
+
+def current():
+    """{user id: (until, reason)} of blocks that were active when the set was loaded"""
+    now = time.monotonic()
+    with _lock:
+        expires, blocked = _local
+        if blocked is not None and expires > now:
+            return blocked
+    key = _key()
+    blocked = cache.get(key)
+    if blocked is None:
+        blocked = _load()
+        cache.set(key, blocked, _ttl(blocked))
+    with _lock:
+        _local[:] = [now + settings.ACCOUNTS_BLOCKS_LOCAL_TTL, blocked]
+    return blocked
+
+
+def _active(entry):
+    return entry is not None and (entry[0] is None or entry[0] > time.time())
+
+
+def is_blocked(user_id):
+    return _active(current().get(user_id))
+
+
+def block_of(user_id):
+    """(until datetime or None, reason) of the user's active block, or None"""
+    entry = current().get(user_id)
+    if not _active(entry):
+        return None
+    until, reason = entry
+    return (datetime.fromtimestamp(until, dt_timezone.utc) if until is not None else None), reason
+
+
+def lift_expired(user_ids):
+    """Clear temporary blocks that have run out; returns the rows lifted"""
+    with transaction.atomic():
+        qs = Profile.objects.filter(user_id__in=user_ids, is_blocked=True, block_until__lte=timezone.now())
+        lifted = list(qs.values_list("user_id", flat=True))
+        if lifted:
+            Profile.objects.filter(user_id__in=lifted).update(is_blocked=False, block_reason="", block_until=None)
+            search.set_blocked(lifted, False)
+            context.invalidate(lifted)
+    return len(lifted)
+
+
+def apply(user_ids, is_blocked, reason="", until=None):
+    """Block or unblock many users: two UPDATEs per BATCH ids (profiles and the
+    search index), then one cache bump and the socket broadcast after commit"""
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        for i in range(0, len(user_ids), BATCH):
+            chunk = user_ids[i:i + BATCH]
+            Profile.objects.filter(user_id__in=chunk).update(
+                is_blocked=is_blocked, block_reason=reason, block_until=until)
+            search.set_blocked(chunk, is_blocked)
+        context.invalidate(user_ids)
+        changed(user_ids if is_blocked else ())
+    return len(user_ids)
+
+
+def _evict():
+    versions.bump(GEN_KEY)
+    with _lock:
+        _local[:] = [0.0, None]
+
+
+def evict_sockets(user_ids):
+    """Close every open socket of these users (ChatConsumer.account_blocked)"""
+    layer = get_channel_layer()
+    if layer is None or not user_ids:
+        return
+
+    async def broadcast():
+        for i in range(0, len(user_ids), BROADCAST_BATCH):
+            await asyncio.gather(*(layer.group_send(group_name(u), {"type": EVENT})
+                                   for u in user_ids[i:i + BROADCAST_BATCH]))
+
+    async_to_sync(broadcast)()
+
+
+def changed(blocked_ids=()):
+    """Call in the transaction that changed block state: after commit every
+    worker reloads the set and the newly blocked users' sockets are closed"""
+    blocked_ids = list(blocked_ids)
+
+    def after():
+        _evict()
+        evict_sockets(blocked_ids)
+
+    transaction.on_commit(after)
+
+
+def _state(profile):
+    until = profile.block_until
+    if not profile.is_blocked or (until is not None and until <= timezone.now()):
+        return None
+    return until, profile.block_reason
+
+
+def on_profile_loaded(sender, instance, **kwargs):
+    # deferred fields would cost a query each; such an instance just counts as changed
+    if not instance.get_deferred_fields() & {"is_blocked", "block_until", "block_reason"}:
+        instance._block_state = _state(instance)
+
+
+def on_profile_saved(sender, instance, created, **kwargs):
+    state = _state(instance)
+    if created and state is None:
+        return
+    if getattr(instance, "_block_state", False) != state:
+        changed([instance.user_id] if state is not None else ())
+    instance._block_state = state
+
+
+def on_profile_deleted(sender, instance, **kwargs):
+    if instance.is_blocked:
+        changed()
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+# Authenticated request context. Each request needs the session, the User
+# and (in most views) the Profile with its block state. Sessions come from
+# the cached_db engine, and the User is cached here with its Profile already
+# attached (select_related), so request.user.profile costs nothing more.
+# Together an authenticated request normally reaches the view without a
+# query. Writes delete the entry after commit; the TTL bounds how long a
+# reader that raced a write can keep a stale copy around.
+
+
+def _key(user_id):
+    return f"accounts:ctx:{user_id}"
+
+
+def load(user_id):
+    """The User with .profile preloaded, or None if there is no such user"""
+    key = _key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.select_related("profile").filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.ACCOUNTS_CONTEXT_TTL)
+    return user
+
+
+def invalidate(user_ids):
+    keys = [_key(u) for u in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def on_user_changed(sender, instance, **kwargs):
+    invalidate([instance.pk])
+
+
+def on_profile_changed(sender, instance, **kwargs):
+    invalidate([instance.user_id])
+
+
+def on_variants_recorded(sender, pk, **kwargs):
+    invalidate(sender.objects.filter(pk=pk).values_list("user_id", flat=True))
+
+
+def on_logged_out(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate([user.pk])
@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+LEGACY = {
+    "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+    "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+}
+
+
+class Command(BaseCommand):
+    help = "/api/me/ requests/sec and queries per request: DB sessions + ModelBackend vs the cached request context"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user("bench_me")
+        try:
+            n = options["requests"]
+            with override_settings(**LEGACY):
+                legacy = self._drive(user, n, "django.contrib.auth.backends.ModelBackend")
+            cached = self._drive(user, n, "apps.accounts.backends.CachedModelBackend")
+            for label, (elapsed, queries) in (("db session + user + profile", legacy), ("cached context", cached)):
+                self.stdout.write(f"{label:<28} {n / elapsed:>8.0f} req/s   {queries} queries/request")
+        finally:
+            user.delete()
+
+    def _drive(self, user, n, backend):
+        client = Client()
+        client.force_login(user, backend=backend)
+        client.get("/api/me/")  # fill the caches
+        with CaptureQueriesContext(connection) as ctx:
+            client.get("/api/me/")
+        queries = len(ctx.captured_queries)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            client.get("/api/me/")
+        return time.perf_counter() - t0, queries
@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from apps.accounts import search
+from apps.accounts.models import Profile
+
+FIRST = ["ava", "liam", "noah", "emma", "mia", "lucas", "zoe", "arjun", "priya", "kenji", "sofia", "omar"]
+LAST = ["smith", "garcia", "patel", "nguyen", "kim", "muller", "rossi", "silva", "khan", "cohen"]
+
+
+class Command(BaseCommand):
+    help = "User search latency: trigram/prefix index vs the old icontains join (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20000)
+        parser.add_argument("--queries", type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                User(username=f"{rng.choice(FIRST)}.{rng.choice(LAST)}{i}") for i in range(options["users"])
+            )
+            if users[0].id is None:
+                users = list(User.objects.filter(username__in=[u.username for u in users]))
+            Profile.objects.bulk_create(
+                Profile(user=u, first_name=u.username.split(".")[0].title(), last_name=rng.choice(LAST).title())
+                for u in users
+            )
+            t0 = time.perf_counter()
+            search.rebuild()
+            self.stdout.write(f"rebuild: {time.perf_counter() - t0:.1f}s for {User.objects.count()} users")
+
+            queries = [rng.choice(FIRST + LAST)[:rng.randint(2, 5)] for _ in range(options["queries"])]
+            queries += ["prya", "garcai", "nguyn"]  # typos only the trigram path finds
+            self._report("indexed", [self._time(lambda: search.search_users(q)) for q in queries])
+            self._report("icontains", [self._time(lambda: self._legacy(q)) for q in queries])
+            for q in ("prya", "garcai"):
+                self.stdout.write(f"{q!r} -> {[u.username for u in search.search_users(q)][:3]}")
+            transaction.set_rollback(True)
+
+    def _legacy(self, q):
+        qs = User.objects.select_related("profile").filter(profile__is_blocked=False)
+        qs = qs.filter(Q(username__icontains=q) | Q(profile__first_name__icontains=q) | Q(profile__last_name__icontains=q))
+        return list(qs[:50])
+
+    def _time(self, fn):
+        t0 = time.perf_counter()
+        fn()
+        return (time.perf_counter() - t0) * 1000
+
+    def _report(self, label, samples):
+        samples = sorted(samples)
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        self.stdout.write(f"{label:<10} p50 {statistics.median(samples):7.2f} ms  p95 {p95:7.2f} ms")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.accounts import search
+
+class Command(BaseCommand):
+    help = "Rebuild the user search index (prefix entries + trigrams) from profiles in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        n = search.rebuild(chunk_size=options["chunk_size"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {n} users"))
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-18 06:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('username', models.CharField(db_index=True, max_length=150)),
+                ('first_name', models.CharField(blank=True, db_index=True, default='', max_length=50)),
+                ('last_name', models.CharField(blank=True, db_index=True, default='', max_length=50)),
+                ('is_blocked', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserSearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='usersearchgram',
+            constraint=models.UniqueConstraint(fields=('gram', 'user'), name='accounts_search_gram_uniq'),
+        ),
+    ]
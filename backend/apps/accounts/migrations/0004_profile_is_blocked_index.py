@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='is_blocked',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -10,13 +10,32 @@ class Profile(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)  # {"64": name, ...}, see apps.media.images
     theme = models.CharField(max_length=10, choices=[("light", "light"), ("dark", "dark")], default="light")
     first_name = models.CharField(max_length=50, blank=True, default="")
     last_name = models.CharField(max_length=50, blank=True, default="")
     profile_visibility = models.CharField(max_length=10, choices=VISIBILITY_CHOICES, default="public")
-    is_blocked = models.BooleanField(default=False)
+    is_blocked = models.BooleanField(default=False, db_index=True)  # apps.accounts.blocks loads the blocked set by it
     block_reason = models.TextField(blank=True, default="")
     block_until = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Profile({self.user.username})"
+
+class UserSearchEntry(models.Model):
+    """Lower-cased copy of the searchable names, indexed for prefix lookups (see apps.accounts.search)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="+")
+    username = models.CharField(max_length=150, db_index=True)
+    first_name = models.CharField(max_length=50, db_index=True, blank=True, default="")
+    last_name = models.CharField(max_length=50, db_index=True, blank=True, default="")
+    is_blocked = models.BooleanField(default=False)
+
+class UserSearchGram(models.Model):
+    """One trigram of a user's names, for fuzzy matching"""
+    gram = models.CharField(max_length=3)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["gram", "user"], name="accounts_search_gram_uniq"),
+        ]
@@ -0,0 +1,125 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+
+from . import blocks
+from .models import Profile, UserSearchEntry, UserSearchGram
+
+# Weights: an exact username hit beats a username prefix, which beats a
+# first/last name prefix, which beats any fuzzy (trigram) match (score < 1).
+EXACT, USERNAME_PREFIX, NAME_PREFIX = 4.0, 3.0, 2.0
+FUZZY_CANDIDATES = 200
+
+
+def grams(text):
+    """Trigrams of each word, padded like pg_trgm so short words and word starts count"""
+    out = set()
+    for word in text.lower().split():
+        padded = f"  {word} "
+        out.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return out
+
+
+def _entry_fields(profile, username):
+    return {
+        "username": username.lower(),
+        "first_name": profile.first_name.lower(),
+        "last_name": profile.last_name.lower(),
+        "is_blocked": profile.is_blocked,
+    }
+
+
+def index_profile(profile):
+    """Refresh one user's entry and trigrams; called whenever a Profile is saved"""
+    username = profile.user.username
+    fields = _entry_fields(profile, username)
+    wanted = grams(" ".join((username, profile.first_name, profile.last_name)))
+    with transaction.atomic():
+        UserSearchEntry.objects.update_or_create(user_id=profile.user_id, defaults=fields)
+        have = set(UserSearchGram.objects.filter(user_id=profile.user_id).values_list("gram", flat=True))
+        if have - wanted:
+            UserSearchGram.objects.filter(user_id=profile.user_id, gram__in=have - wanted).delete()
+        UserSearchGram.objects.bulk_create(
+            [UserSearchGram(user_id=profile.user_id, gram=g) for g in wanted - have], ignore_conflicts=True,
+        )
+
+
+def set_blocked(user_ids, blocked):
+    """Mirror a bulk block/unblock (admin queryset.update skips signals)"""
+    UserSearchEntry.objects.filter(user_id__in=user_ids).update(is_blocked=blocked)
+
+
+def rebuild(chunk_size=2000, stdout=None):
+    """Rebuild the whole index in bulk, chunk by chunk"""
+    UserSearchGram.objects.all().delete()
+    UserSearchEntry.objects.all().delete()
+    done = 0
+    qs = Profile.objects.select_related("user").order_by("user_id")
+    last = 0
+    while True:
+        chunk = list(qs.filter(user_id__gt=last)[:chunk_size])
+        if not chunk:
+            break
+        entries, rows = [], []
+        for p in chunk:
+            entries.append(UserSearchEntry(user_id=p.user_id, **_entry_fields(p, p.user.username)))
+            rows += [UserSearchGram(user_id=p.user_id, gram=g)
+                     for g in grams(" ".join((p.user.username, p.first_name, p.last_name)))]
+        with transaction.atomic():
+            UserSearchEntry.objects.bulk_create(entries)
+            UserSearchGram.objects.bulk_create(rows, batch_size=5000)
+        last = chunk[-1].user_id
+        done += len(chunk)
+        if stdout:
+            stdout.write(f"indexed {done} users")
+    return done
+
+
+def search(q, limit=50):
+    """Ranked user ids for a query: prefix matches first, then trigram similarity"""
+    q = q.strip().lower()
+    live = UserSearchEntry.objects.filter(is_blocked=False)
+    if not q:
+        return list(live.order_by("username").values_list("user_id", flat=True)[:limit])
+
+    scores = {}
+    for field, weight in (("username", USERNAME_PREFIX), ("first_name", NAME_PREFIX), ("last_name", NAME_PREFIX)):
+        # LIKE 'q%': an index range scan in the column's own collation (a next-codepoint
+        # upper bound sorts wrong under MySQL's); entries are stored lowercased
+        prefix = {f"{field}__istartswith": q}
+        for uid, value in live.filter(**prefix).order_by(field).values_list("user_id", field)[:limit]:
+            score = EXACT if field == "username" and value == q else weight
+            scores[uid] = max(scores.get(uid, 0), score)
+
+    wanted = grams(q)
+    if len(q) >= 3 and len(scores) < limit:
+        hits = (UserSearchGram.objects.filter(gram__in=wanted).values("user_id")
+                .annotate(n=Count("gram")).filter(n__gte=max(1, len(wanted) // 2))
+                .order_by("-n")[:FUZZY_CANDIDATES])
+        fuzzy = {row["user_id"]: row["n"] / len(wanted) for row in hits if row["user_id"] not in scores}
+        scores.update((uid, s) for uid, s in fuzzy.items() if not blocks.is_blocked(uid))
+
+    return [uid for uid, _ in sorted(scores.items(), key=lambda kv: -kv[1])[:limit]]
+
+
+def search_users(q, limit=50):
+    """Users for search(), in rank order, with profiles loaded in one query"""
+    ids = search(q, limit)
+    users = User.objects.select_related("profile").in_bulk(ids)
+    return [users[uid] for uid in ids if uid in users]
+
+
+def search_user_data(q, limit=50):
+    """search_users() in the API's shape, read as one joined query over just those columns"""
+    ids = search(q, limit)
+    rows = {uid: row for uid, *row in User.objects.filter(id__in=ids).values_list(
+        "id", "username", "is_staff", "profile__first_name", "profile__last_name", "profile__profile_visibility")}
+    return [
+        {"username": username, "is_staff": is_staff, "first_name": first_name, "last_name": last_name,
+         "profile_visibility": visibility}
+        for username, is_staff, first_name, last_name, visibility in (rows[uid] for uid in ids if uid in rows)
+    ]
+
+
+def on_profile_saved(sender, instance, **kwargs):
+    index_profile(instance)
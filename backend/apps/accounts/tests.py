@@ -0,0 +1,129 @@
+import asyncio
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from django.utils import timezone
+
+from apps.chat.consumers import ChatConsumer
+
+from . import blocks, search
+from .models import Profile
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "accounts-tests"}}
+PASSWORD = "blk-check"
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CACHES=LOCAL_CACHE)
+class BlockTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        blocks._evict()
+        self.users = [User.objects.create_user(f"blk_{i}") for i in range(30)]
+        self.users[0].set_password(PASSWORD)
+        self.users[0].save()
+        self.admin = User.objects.create_superuser("blk-admin")  # outside the ?q= selection
+        self.client.force_login(self.admin)
+
+    def _action(self, name):
+        # the whole selection across pages, as "select all N" in the changelist
+        data = {"action": name, "select_across": "1", "index": "0",
+                "_selected_action": [str(self.users[0].profile.pk)]}
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post("/admin/accounts/profile/?q=blk_", data)
+        self.assertEqual(resp.status_code, 302)
+        return [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("UPDATE")]
+
+    def test_admin_action_blocks_the_selection_in_batched_statements(self):
+        writes = self._action("block_users")
+        self.assertEqual(len(writes), 2)  # profiles and the search index, one batch each
+        self.assertTrue(all(blocks.is_blocked(u.id) for u in self.users))
+        self.assertFalse(blocks.is_blocked(self.admin.id))
+
+        self._action("unblock_users")
+        self.assertFalse(any(blocks.is_blocked(u.id) for u in self.users))
+
+    def test_block_closes_open_sockets_and_refuses_new_ones(self):
+        app = URLRouter([path("ws/chat/", ChatConsumer.as_asgi())])
+
+        async def open_socket(user):
+            ws = WebsocketCommunicator(app, "/ws/chat/")
+            ws.scope["user"] = user
+            connected, _ = await ws.connect()
+            return ws, connected
+
+        async def run():
+            sockets = []
+            for user in self.users[:3]:
+                ws, connected = await open_socket(user)
+                self.assertTrue(connected)
+                sockets.append(ws)
+            await sync_to_async(blocks.apply)([u.id for u in self.users[:3]], True, "test")
+            closed = [await ws.receive_output(timeout=1) for ws in sockets]
+            ws, connected = await open_socket(self.users[0])
+            if connected:
+                await ws.disconnect()
+            return closed, connected
+
+        closed, reconnected = asyncio.run(run())
+        self.assertEqual([(o["type"], o.get("code")) for o in closed],
+                         [("websocket.close", blocks.CLOSE_CODE)] * 3)
+        self.assertFalse(reconnected)
+
+    def test_blocked_user_cannot_log_in_or_be_found(self):
+        user = self.users[0]
+        blocks.apply([user.id], True, "spam")
+        resp = self.client.post("/api/auth/login/", {"username": user.username, "password": PASSWORD},
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 403)
+        self.assertIn("spam", resp.json()["error"])
+        self.assertNotIn(user.id, search.search("blk_", 50))
+        self.assertIn(self.users[1].id, search.search("blk_", 50))
+
+    def test_block_ends_sessions_of_either_backend(self):
+        for backend in ("apps.accounts.backends.CachedModelBackend", "django.contrib.auth.backends.ModelBackend"):
+            user = self.users[1]
+            self.client.force_login(user, backend=backend)
+            self.assertEqual(self.client.get("/api/me/").status_code, 200)
+            blocks.apply([user.id], True, "spam")
+            self.assertEqual(self.client.get("/api/me/").status_code, 403, backend)
+            blocks.apply([user.id], False)
+
+    def test_temporary_block_runs_out(self):
+        user = self.users[0]
+        blocks.apply([user.id], True, "cool off", timezone.now() + timedelta(hours=1))
+        self.assertTrue(blocks.is_blocked(user.id))
+        with mock.patch("time.time", return_value=time.time() + 7200):
+            self.assertFalse(blocks.is_blocked(user.id))
+
+        # the next reload past block_until lifts the row too
+        Profile.objects.filter(user=user).update(block_until=timezone.now() - timedelta(seconds=1))
+        blocks.changed()
+        self.assertFalse(blocks.is_blocked(user.id))
+        self.assertFalse(Profile.objects.get(user=user).is_blocked)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class SearchPrefixTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        blocks._evict()
+        self.ids = {name: User.objects.create_user(name).id for name in ("buzz", "buzzard", "agent9", "agent90", "agent8")}
+
+    def test_prefixes_ending_in_z_or_9_match(self):
+        # as LIKE 'q%' rather than a next-codepoint range, which MySQL's collation orders differently
+        with CaptureQueriesContext(connection) as ctx:
+            found = search.search("buzz", 10)
+        self.assertIn("LIKE", ctx.captured_queries[0]["sql"].upper())
+        self.assertEqual(found[:2], [self.ids["buzz"], self.ids["buzzard"]])
+        self.assertEqual(set(search.search("agent9", 10)[:2]), {self.ids["agent9"], self.ids["agent90"]})
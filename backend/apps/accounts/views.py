@@ -3,6 +3,9 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.contrib.auth.models import User
+from apps.media import images
+
+AVATAR_PX = 256  # largest size the UI shows an avatar at
 
 @api_view(["GET"])  # whoami + profile
 @permission_classes([IsAuthenticated])
@@ -15,7 +18,7 @@ def me(request):
         "first_name": p.first_name,
         "last_name": p.last_name,
         "profile_visibility": p.profile_visibility,
-        "settings": {"theme": p.theme, "avatarUrl": (request.build_absolute_uri(p.avatar.url) if p.avatar else "")},
+        "settings": {"theme": p.theme, "avatarUrl": images.variant_url(request, p.avatar, p.avatar_variants, AVATAR_PX)},
     })
 
 @api_view(["POST"])  # update settings (theme only)
@@ -52,8 +55,17 @@ def update_profile(request):
 def update_avatar(request):
     p = request.user.profile
     file = request.FILES.get("file")
+    if getattr(request, "upload_too_large", False):
+        return Response({"error": "file too large"}, status=413)
     if not file:
         return Response({"error": "file required"}, status=400)
+    try:
+        images.probe(file)
+    except images.InvalidImage as e:
+        return Response({"error": str(e)}, status=400)
     p.avatar = file
+    p.avatar_variants = {}
     p.save()
+    images.process(p, "avatar")
+    # variants are still being made; the original is served until they land
     return Response({"ok": True, "avatarUrl": request.build_absolute_uri(p.avatar.url)})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, Message, MessageSegment
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
@@ -9,3 +9,8 @@ class ConversationAdmin(admin.ModelAdmin):
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ("id", "conversation", "sender", "created_at")
+
+@admin.register(MessageSegment)
+class MessageSegmentAdmin(admin.ModelAdmin):
+    list_display = ("id", "conversation", "first_at", "last_at", "count", "created_at")
+    exclude = ("data",)
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.chat"
+
+    def ready(self):
+        from django.db.models.signals import m2m_changed
+        from .models import Conversation
+        from . import inbox, membership
+
+        m2m_changed.connect(inbox.on_participants_changed, sender=Conversation.participants.through)
+        m2m_changed.connect(membership.on_participants_changed, sender=Conversation.participants.through)
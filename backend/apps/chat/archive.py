@@ -0,0 +1,247 @@
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import msgpack
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import Conversation, InboxEntry, Message, MessageSegment
+
+# Cold tier for chat history. tier() moves the oldest messages of a
+# conversation out of the Message table into MessageSegment rows of up to
+# CHAT_ARCHIVE_SEGMENT_SIZE messages each: msgpack, then zlib. The archive of
+# a conversation is always a prefix of its history, so the hot table holds
+# everything after Conversation.archive_last_(at|id) and readers
+# (apps.chat.history) only open segments when a page reaches past that point.
+# Only messages every participant has read are archived; unread counts and
+# read cursors never have to look at the cold tier.
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _micros(ts):
+    return (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(n):
+    return _EPOCH + timedelta(microseconds=n)
+
+
+def encode(rows):
+    """[(id, sender_id, ciphertext, created_at)] -> compressed segment bytes"""
+    return zlib.compress(msgpack.packb([[mid, sender, text, _micros(ts)] for mid, sender, text, ts in rows]))
+
+
+def decode(data):
+    return [(mid, sender, text, _from_micros(ts)) for mid, sender, text, ts in msgpack.unpackb(zlib.decompress(data))]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at values we set instead of stamping now()"""
+    fields = [m._meta.get_field("created_at") for m in models]
+    saved = [f.auto_now_add for f in fields]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, value in zip(fields, saved):
+            f.auto_now_add = value
+
+
+def _key(ts, mid):
+    return (ts, mid if mid is not None else -1)
+
+
+def _after(cursor):
+    """Python twin of history._after for decoded rows"""
+    ts, mid = cursor
+    if mid is None:
+        return lambda row: row[3] > ts
+    return lambda row: (row[3], row[0]) > (ts, mid)
+
+
+def _before(cursor):
+    ts, mid = cursor
+    if mid is None:
+        return lambda row: row[3] < ts
+    return lambda row: (row[3], row[0]) < (ts, mid)
+
+
+def _segments_before(conv, cursor):
+    """Segments starting before the cursor, newest first"""
+    qs = MessageSegment.objects.filter(conversation=conv)
+    if cursor is not None:
+        ts, mid = cursor
+        starts_before = Q(first_at__lt=ts)
+        if mid is not None:
+            starts_before |= Q(first_at=ts, first_id__lt=mid)
+        qs = qs.filter(starts_before)
+    return qs.order_by("-first_at", "-first_id")
+
+
+def _segments_after(conv, cursor):
+    """Segments ending after the cursor, oldest first"""
+    ts, mid = cursor
+    ends_after = Q(last_at__gt=ts)
+    if mid is not None:
+        ends_after |= Q(last_at=ts, last_id__gt=mid)
+    return MessageSegment.objects.filter(conversation=conv).filter(ends_after).order_by("first_at", "first_id")
+
+
+def reaches(conv, cursor):
+    """Could messages after `cursor` be archived?"""
+    if conv.archive_last_id is None:
+        return False
+    return _key(*cursor) < _key(conv.archive_last_at, conv.archive_last_id)
+
+
+def _live(rows):
+    """Drop rows whose sender has been deleted since archiving, as the hot
+    table's cascade would have; one query per segment"""
+    ids = {sender for _, sender, _, _ in rows}
+    live = set(User.objects.filter(id__in=ids).values_list("id", flat=True)) if ids else set()
+    return [row for row in rows if row[1] in live]
+
+
+def rows_before(conv, before, n):
+    """Up to n archived rows before the cursor (None = from the newest), newest first"""
+    keep = _before(before) if before is not None else (lambda row: True)
+    out = []
+    for data in _segments_before(conv, before).values_list("data", flat=True).iterator(chunk_size=8):
+        out += _live([row for row in reversed(decode(data)) if keep(row)])
+        if len(out) >= n:
+            break
+    return out[:n]
+
+
+def rows_after(conv, after, before, n):
+    """Up to n archived rows after `after` (and before `before`, if given), oldest first"""
+    keep_after = _after(after)
+    keep_before = _before(before) if before is not None else (lambda row: True)
+    out = []
+    for data in _segments_after(conv, after).values_list("data", flat=True).iterator(chunk_size=8):
+        rows = [row for row in decode(data) if keep_after(row)]
+        end = next((i for i, row in enumerate(rows) if not keep_before(row)), None)
+        out += _live(rows[:end])
+        if end is not None or len(out) >= n:
+            break
+    return out[:n]
+
+
+def iter_segments(conv, after=None):
+    """Archived rows after the cursor (None = all of them), oldest first, one decoded segment at a time.
+
+    Segments are fetched one per query: a chunked iterator would still be
+    buffered whole by MySQLdb's default cursor.
+    """
+    if conv.archive_last_id is None or (after is not None and not reaches(conv, after)):
+        return
+    qs = _segments_after(conv, after) if after is not None else (
+        MessageSegment.objects.filter(conversation=conv).order_by("first_at", "first_id"))
+    keep = _after(after) if after is not None else None
+    for segment_id in list(qs.values_list("id", flat=True)):
+        rows = decode(MessageSegment.objects.filter(id=segment_id).values_list("data", flat=True).get())
+        yield [row for row in rows if keep(row)] if keep else rows
+
+
+def find(conv, message_id):
+    """(created_at, id) of an archived message, or None"""
+    if conv.archive_last_id is None:
+        return None
+    segments = MessageSegment.objects.filter(conversation=conv, min_id__lte=message_id, max_id__gte=message_id)
+    for data in segments.values_list("data", flat=True):
+        for mid, _, _, ts in decode(data):
+            if mid == message_id:
+                return ts, mid
+    return None
+
+
+def usernames(rows):
+    ids = {sender for _, sender, _, _ in rows}
+    return dict(User.objects.filter(id__in=ids).values_list("id", "username")) if ids else {}
+
+
+def _read_through(conv_id):
+    """Highest message id every participant has read, or None"""
+    read = InboxEntry.objects.filter(conversation_id=conv_id).aggregate(
+        n=Min("last_read_id"), unset=Min("id", filter=Q(last_read_id__isnull=True)))
+    if read["n"] is None or read["unset"] is not None:
+        return None
+    return read["n"]
+
+
+def tier_conversation(conv_id, cutoff, segment_size):
+    """Archive one conversation's old, fully read prefix; returns messages archived"""
+    read_through = _read_through(conv_id)
+    if read_through is None:
+        return 0
+    moved = 0
+    while True:
+        with transaction.atomic():
+            conv = Conversation.objects.select_for_update().get(id=conv_id)
+            rows = list(Message.objects.filter(conversation_id=conv_id, created_at__lt=cutoff)
+                        .order_by("created_at", "id")
+                        .values_list("id", "sender_id", "ciphertext", "created_at")[:segment_size])
+            # stop at the first message someone hasn't read, so the archive stays a prefix
+            cut = next((i for i, row in enumerate(rows) if row[0] > read_through), len(rows))
+            rows = rows[:cut]
+            if not rows:
+                return moved
+            ids = [row[0] for row in rows]
+            MessageSegment.objects.create(
+                conversation_id=conv_id, data=encode(rows), count=len(rows),
+                first_at=rows[0][3], first_id=rows[0][0], last_at=rows[-1][3], last_id=rows[-1][0],
+                min_id=min(ids), max_id=max(ids),
+            )
+            Message.objects.filter(id__in=ids).delete()
+            conv.archive_last_at, conv.archive_last_id = rows[-1][3], rows[-1][0]
+            conv.save(update_fields=["archive_last_at", "archive_last_id"])
+            moved += len(rows)
+        if cut < segment_size:
+            return moved
+
+
+def tier(older_than_days=None, segment_size=None, stdout=None):
+    """Archive, conversation by conversation, every fully read message older than the cutoff"""
+    days = settings.CHAT_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    segment_size = segment_size or settings.CHAT_ARCHIVE_SEGMENT_SIZE
+    cutoff = timezone.now() - timedelta(days=days)
+    # order_by() drops Message.Meta.ordering, which would otherwise leak into the DISTINCT
+    conv_ids = list(Message.objects.filter(created_at__lt=cutoff).order_by()
+                    .values_list("conversation_id", flat=True).distinct())
+    total = 0
+    for conv_id in conv_ids:
+        n = tier_conversation(conv_id, cutoff, segment_size)
+        total += n
+        if n and stdout is not None:
+            stdout.write(f"{conv_id}: {n} messages archived")
+    return total
+
+
+def restore(conv_id):
+    """Move a conversation's archive back into the Message table; returns messages restored.
+
+    Rows of senders deleted since archiving are dropped rather than restored
+    (their foreign key has nothing to point at).
+    """
+    restored = 0
+    with transaction.atomic():
+        conv = Conversation.objects.select_for_update().get(id=conv_id)
+        segments = list(MessageSegment.objects.filter(conversation=conv).order_by("first_at", "first_id"))
+        with explicit_timestamps(Message):
+            for segment in segments:
+                rows = _live(decode(segment.data))
+                Message.objects.bulk_create(
+                    Message(id=mid, conversation_id=conv.id, sender_id=sender, ciphertext=text, created_at=ts)
+                    for mid, sender, text, ts in rows)
+                restored += len(rows)
+        MessageSegment.objects.filter(id__in=[s.id for s in segments]).delete()
+        conv.archive_last_at = conv.archive_last_id = None
+        conv.save(update_fields=["archive_last_at", "archive_last_id"])
+    return restored
@@ -0,0 +1,72 @@
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+# Inbound sends are metered by a token bucket per socket and one per user
+# (shared by that user's sockets in this worker). Outbound, every socket has
+# a bounded outbox; CHAT_SLOW_CONSUMER_POLICY decides what happens to a
+# socket whose outbox overflows: "close" it, or "resync" (drop the backlog
+# and tell the client to refetch over REST).
+
+stats = Counter()  # throttled / queued / dropped / slow_closed / slow_resynced
+
+MAX_USER_BUCKETS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def ready(self):
+        self._refill()
+        return self.tokens >= 1
+
+    def take(self):
+        if not self.ready():
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self):
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def take_all(*buckets):
+    """Spend one token from every bucket, or from none of them.
+
+    Returns the first bucket that refused (its retry_after is the one to
+    report), or None once all were charged.
+    """
+    for bucket in buckets:
+        if not bucket.ready():
+            return bucket
+    for bucket in buckets:
+        bucket.take()
+    return None
+
+
+_user_buckets = OrderedDict()
+
+
+def connection_bucket():
+    return TokenBucket(settings.CHAT_SEND_RATE, settings.CHAT_SEND_BURST)
+
+
+def user_bucket(user_key):
+    """The worker-wide bucket for a user, LRU-bounded to MAX_USER_BUCKETS"""
+    bucket = _user_buckets.pop(user_key, None)
+    if bucket is None:
+        bucket = TokenBucket(settings.CHAT_USER_SEND_RATE, settings.CHAT_USER_SEND_BURST)
+    _user_buckets[user_key] = bucket
+    while len(_user_buckets) > MAX_USER_BUCKETS:
+        _user_buckets.popitem(last=False)
+    return bucket
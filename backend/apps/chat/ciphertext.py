@@ -0,0 +1,33 @@
+import base64
+import binascii
+
+from .models import CIPHERTEXT_MAX_BYTES
+
+# Message.ciphertext holds the raw bytes of the client's RSA-OAEP block.
+# JSON clients (REST and text sockets) still send and receive base64, and
+# these two functions are the only place that crosses that edge; the msgpack
+# socket subprotocol carries the bytes untouched in both directions.
+
+
+class CiphertextError(ValueError):
+    pass
+
+
+def from_wire(value):
+    """base64 text (JSON) or bytes (msgpack) -> validated raw ciphertext"""
+    if isinstance(value, str):
+        try:
+            value = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            raise CiphertextError("ciphertext must be base64")
+    elif not isinstance(value, bytes):
+        raise CiphertextError("ciphertext required")
+    if not value:
+        raise CiphertextError("ciphertext required")
+    if len(value) > CIPHERTEXT_MAX_BYTES:
+        raise CiphertextError(f"ciphertext over {CIPHERTEXT_MAX_BYTES} bytes")
+    return value
+
+
+def to_wire(data):
+    return base64.b64encode(data).decode("ascii")
@@ -1,38 +1,355 @@
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qs
+
+import msgpack
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from .models import Conversation, Message
+from .ciphertext import CiphertextError, from_wire
+from .pipeline import get_writer
+from django.conf import settings
+from . import backpressure, framing, inbox, live, membership, presence
+from .history import CursorError, page_messages, resolve_cursor
+from apps.accounts import blocks
+from apps.metrics import scope as metrics
+from apps.metrics.consumers import MeteredConsumer
+
+log = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One conversation a socket follows.
+
+    While `replaying`, live fan-out is parked in `pending`; when the replay
+    ends, parked messages the replay already delivered (by id) are dropped
+    and the rest are sent, so the boundary has neither gap nor duplicate.
+    """
+
+    def __init__(self, conversation):
+        self.conversation = conversation
+        self.group = live.group_name(conversation.id)
+        self.replaying = False
+        self.pending = []
+        self.overflow = False
+        self.replayed = set()
+        self.task = None
+
+
+class ChatConsumer(MeteredConsumer, AsyncJsonWebsocketConsumer):
+    ACTIONS = frozenset({"send", "subscribe", "unsubscribe", "read", "heartbeat", "typing"})
 
-class ChatConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
-      self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
-      self.group_name = f"conv_{self.conversation_id}"
-      await self.channel_layer.group_add(self.group_name, self.channel_name)
-      await self.accept()
+      # ws/chat/<uuid>/ follows one conversation from the start (resuming from
+      # ?last_id=); ws/chat/ is a multiplexed socket driven by "subscribe"
+      # identity comes from the session (AuthMiddlewareStack), never from the client
+      self.subs = {}
+      self.presence_name = None
+      self.default_id = None
+      self.block_group = None
+      conversation_id = self.scope['url_route']['kwargs'].get('conversation_id')
+      self.user = user = self.scope.get("user")
+      if user is None or not user.is_authenticated or await sync_to_async(blocks.is_blocked)(user.id):
+        await self.close()
+        return
+      conversation = None
+      if conversation_id is not None:
+        conversation = await self._load_member_conversation(conversation_id)
+        if conversation is None:
+          await self.close()
+          return
+        self.default_id = str(conversation.id)
+      self.binary = framing.SUBPROTOCOL in self.scope.get("subprotocols", [])
+      self.outbox = []
+      self.flusher = None
+      self.last_sent = float("-inf")
+      self.slow_closed = False
+      self.send_bucket = backpressure.connection_bucket()
+      self.user_bucket_key = user.id
+      await self.accept(subprotocol=framing.SUBPROTOCOL if self.binary else None)
+      # the per-user group: a block closes the socket at once (account_blocked),
+      # and peers' presence arrives here whatever the socket is subscribed to
+      self.block_group = blocks.group_name(user.id)
+      await self.channel_layer.group_add(self.block_group, self.channel_name)
+      if conversation is not None:
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        await self._subscribe(conversation, (query.get("last_id") or [None])[0])
+      self.presence_name = user.username
+      self.heartbeats = presence.Throttle(presence.HEARTBEAT_INTERVAL)
+      self.typing = presence.Throttle(presence.TYPING_INTERVAL)
+      self.typing_active = None
+      if await sync_to_async(presence.connected)(self.presence_name):
+        await self._broadcast_presence(True, None)
 
     async def disconnect(self, close_code):
-      await self.channel_layer.group_discard(self.group_name, self.channel_name)
+      if getattr(self, "block_group", None):
+        await self.channel_layer.group_discard(self.block_group, self.channel_name)
+      for sub in getattr(self, "subs", {}).values():
+        if sub.task is not None:
+          sub.task.cancel()
+        await self.channel_layer.group_discard(sub.group, self.channel_name)
+      if getattr(self, "presence_name", None):
+        if self.typing_active:
+          await self._broadcast_typing(self.typing_active, False)
+        if await sync_to_async(presence.disconnected)(self.presence_name):
+          state = await sync_to_async(presence.bulk)([self.presence_name])
+          await self._broadcast_presence(False, state[self.presence_name]["last_seen"])
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+      if bytes_data is None:
+        return await super().receive(text_data=text_data, **kwargs)
+      # binary subprotocol: msgpack in, ciphertext as raw bytes
+      try:
+        content = msgpack.unpackb(bytes_data)
+      except ValueError:
+        return
+      if not isinstance(content, dict):
+        return
+      await self.receive_json(content)
 
     async def receive_json(self, content, **kwargs):
       action = content.get("action")
+      metrics.relabel(f"action:{action}" if action in self.ACTIONS else "action:unknown")
       if action == "send":
-        ciphertext = content.get("ciphertext")
-        username = content.get("username")
-        if not isinstance(ciphertext, str) or not isinstance(username, str):
-          return
-        message = await self._save_message(username, str(self.conversation_id), ciphertext)
-        await self.channel_layer.group_send(self.group_name, {"type": "chat.message", "message": {
-          "id": str(message.id),
-          "ciphertext": message.ciphertext,
-          "sender": message.sender.username,
-          "created_at": message.created_at.isoformat(),
-        }})
+        sub = self._target(content)
+        if sub is None:
+          return
+        # base64 from JSON sockets, raw bytes from msgpack ones
+        try:
+          ciphertext = from_wire(content.get("ciphertext"))
+        except CiphertextError as e:
+          await self._send_event({"event": "error", "conversation": str(sub.conversation.id), "error": str(e)})
+          return
+        refused = backpressure.take_all(self.send_bucket, backpressure.user_bucket(self.user_bucket_key))
+        if refused is not None:
+          backpressure.stats["throttled"] += 1
+          await self._send_event({"event": "throttled", "conversation": str(sub.conversation.id),
+                                  "retry_after": round(refused.retry_after(), 2)})
+          return
+        # re-checked per send so a removed participant stops at once; normally
+        # answered by the worker's membership LRU without I/O
+        if not await sync_to_async(membership.is_member)(sub.conversation.id, self.user.id):
+          await self._send_event({"event": "error", "conversation": str(sub.conversation.id), "error": "forbidden"})
+          return
+        message = await get_writer().submit(Message(conversation=sub.conversation, sender=self.user, ciphertext=ciphertext))
+        # encoded once here; every receiving socket just forwards the bytes
+        await self.channel_layer.group_send(sub.group, live.message_event(message))
+
+      elif action == "subscribe":
+        # (re)subscribing with last_id resumes: replay what was missed, then go live
+        conversation_id = str(content.get("conversation_id", ""))
+        sub = self.subs.get(conversation_id)
+        conversation = sub.conversation if sub else await self._load_member_conversation(conversation_id)
+        if conversation is None:
+          await self._send_event({"event": "error", "conversation": conversation_id, "error": "forbidden"})
+          return
+        await self._subscribe(conversation, content.get("last_id"))
+      elif action == "unsubscribe":
+        await self._drop(str(content.get("conversation_id", "")))
+      elif action == "read":
+        sub = self._target(content)
+        message_id = content.get("message_id")
+        if sub is None or not str(message_id).isdigit():
+          return
+        unread = await database_sync_to_async(inbox.mark_read)(self.user, sub.conversation.id, int(message_id))
+        if unread is not None:
+          await self._send_event({"event": "unread", "conversation": str(sub.conversation.id), "unread": unread})
+      elif action == "heartbeat" and self.presence_name:
+        # coalesced: refresh the TTL at most once per interval, never broadcast
+        if self.heartbeats.allow():
+          await sync_to_async(presence.heartbeat)(self.presence_name)
+      elif action == "typing" and self.presence_name:
+        sub = self._target(content)
+        if sub is None:
+          return
+        if content.get("state", True):
+          if self.typing.allow():
+            self.typing_active = sub
+            await self._broadcast_typing(sub, True)
+        elif self.typing_active:
+          self.typing.reset()
+          await self._broadcast_typing(self.typing_active, False)
+          self.typing_active = None
+
+    async def _drop(self, conversation_id):
+      sub = self.subs.pop(conversation_id, None)
+      if sub is None:
+        return None
+      if sub.task is not None:
+        sub.task.cancel()
+      if self.typing_active is sub:
+        self.typing_active = None
+      await self.channel_layer.group_discard(sub.group, self.channel_name)
+      return sub
+
+    def _target(self, content):
+      """The subscription an action is for: its conversation_id, else the URL's conversation"""
+      return self.subs.get(str(content.get("conversation_id") or self.default_id))
+
+    async def _subscribe(self, conversation, last_id):
+      key = str(conversation.id)
+      sub = self.subs.get(key)
+      if sub is None:
+        sub = self.subs[key] = Subscription(conversation)
+        # join before reading history: anything committed after the replay's
+        # snapshot is then guaranteed to arrive through the group
+        await self.channel_layer.group_add(sub.group, self.channel_name)
+      if last_id is None or last_id == "" or sub.replaying:
+        return
+      sub.replaying = True
+      sub.task = asyncio.ensure_future(self._replay(sub, str(last_id)))
+
+    async def _replay(self, sub, last_id):
+      # runs beside the dispatch loop, so live events keep being taken off the
+      # channel layer (and parked) instead of piling up against its capacity
+      limit = settings.CHAT_REPLAY_PAGE
+      replayed = set()
+      try:
+        # the archive boundary may have moved since subscribe loaded the row
+        await database_sync_to_async(sub.conversation.refresh_from_db)(fields=["archive_last_at", "archive_last_id"])
+        try:
+          cursor = await database_sync_to_async(resolve_cursor)(sub.conversation, last_id)
+        except CursorError:
+          cursor = None
+        if cursor is None:
+          await self._send_event({"event": "resync", "conversation": str(sub.conversation.id)})
+        while cursor is not None:
+          rows, has_more = await database_sync_to_async(page_messages)(sub.conversation, after=cursor, limit=limit)
+          if rows:
+            frames = [framing.encode_message(framing.message_payload(m)) for m in rows]
+            if self.binary:
+              await self.send(bytes_data=framing.batch_packed([p for _, p in frames]))
+            else:
+              await self.send(text_data=framing.batch_text([t for t, _ in frames]))
+            replayed.update(m.id for m in rows)
+            backpressure.stats["replayed"] += len(rows)
+            cursor = (rows[-1].created_at, rows[-1].id)
+          if not has_more:
+            break
+          if len(replayed) >= settings.CHAT_REPLAY_MAX:
+            # too far behind to stream; the client reloads the latest page over REST
+            await self._send_event({"event": "resync", "conversation": str(sub.conversation.id)})
+            break
+      except Exception:
+        # the replay left a gap: have the client reload over REST, but still
+        # hand over what arrived live meanwhile instead of dropping it
+        log.exception("replay of conversation %s failed", sub.conversation.id)
+        sub.overflow = True
+      finally:
+        pending, sub.pending = sub.pending, []
+        sub.replayed = replayed
+        sub.replaying = False
+        sub.task = None
+      if sub.overflow:
+        sub.overflow = False
+        await self._send_event({"event": "resync", "conversation": str(sub.conversation.id)})
+      for event in pending:
+        await self.chat_message(event)
 
     async def chat_message(self, event):
-      await self.send_json(event["message"])  # fan out
+      if self.slow_closed:
+        return
+      sub = self.subs.get(event.get("conversation"))
+      if sub is None:
+        # unsubscribed or removed (_drop) after the frame was already on its way
+        return
+      if sub.replaying:
+        if len(sub.pending) >= settings.CHAT_OUTBOX_LIMIT:
+          sub.pending.clear()
+          sub.overflow = True
+        if not sub.overflow:
+          sub.pending.append(event)
+        return
+      if event.get("id") in sub.replayed:
+        backpressure.stats["deduped"] += 1
+        return
+      if len(self.outbox) >= settings.CHAT_OUTBOX_LIMIT:
+        await self._slow_consumer()
+        if self.slow_closed:
+          return
+      backpressure.stats["queued"] += 1
+      self.outbox.append(event["packed"] if self.binary else event["text"])
+      if self.flusher is None:
+        self.flusher = asyncio.ensure_future(self._flush_outbox())
+
+    async def _send_event(self, event):
+      if self.binary:
+        await self.send(bytes_data=msgpack.packb(event))
+      else:
+        await self.send_json(event)
+
+    async def _slow_consumer(self):
+      backpressure.stats["dropped"] += len(self.outbox)
+      self.outbox.clear()
+      if settings.CHAT_SLOW_CONSUMER_POLICY == "close":
+        backpressure.stats["slow_closed"] += 1
+        self.slow_closed = True
+        await self.close(code=4008)
+      else:
+        # keep the socket, lose the backlog; the client refetches history over
+        # REST for every conversation the dropped frames could have been for
+        backpressure.stats["slow_resynced"] += 1
+        for key in self.subs:
+          resync = {"event": "resync", "conversation": key}
+          self.outbox.append(framing.msgpack.packb(resync) if self.binary else framing.json.dumps(resync))
+
+    async def _flush_outbox(self):
+      # a socket that got a frame less than BATCH_WINDOW ago is in a burst: hold
+      # back until the window closes and send whatever queued up as one batch frame
+      try:
+        while self.outbox:
+          wait = self.last_sent + framing.BATCH_WINDOW - time.monotonic()
+          if wait > 0:
+            await asyncio.sleep(wait)
+          frames, self.outbox = self.outbox, []
+          if self.binary:
+            await self.send(bytes_data=frames[0] if len(frames) == 1 else framing.batch_packed(frames))
+          else:
+            await self.send(text_data=frames[0] if len(frames) == 1 else framing.batch_text(frames))
+          self.last_sent = time.monotonic()
+      finally:
+        self.flusher = None
+
+    async def account_blocked(self, event):
+      await self.close(code=blocks.CLOSE_CODE)
+
+    async def chat_removed(self, event):
+      # taken out of the conversation (membership.removed): stop its fan-out
+      if await self._drop(event["conversation"]) is not None:
+        await self._send_event({"event": "error", "conversation": event["conversation"], "error": "forbidden"})
+
+    async def chat_presence(self, event):
+      await self._send_event(event["event"])
+
+    async def chat_typing(self, event):
+      if event["channel"] != self.channel_name:
+        await self._send_event(event["event"])
+
+    async def _broadcast_presence(self, online, last_seen):
+      # presence belongs to the user, not to a conversation: it goes to every
+      # peer's per-user group, whichever conversations their sockets follow
+      peers = list(await database_sync_to_async(inbox.peer_ids)(self.user.id))
+      event = {"type": "chat.presence", "event": {
+        "event": "presence", "user": self.presence_name, "online": online, "last_seen": last_seen,
+      }}
+      for i in range(0, len(peers), blocks.BROADCAST_BATCH):
+        await asyncio.gather(*(self.channel_layer.group_send(blocks.group_name(peer), event)
+                               for peer in peers[i:i + blocks.BROADCAST_BATCH]))
+
+    async def _broadcast_typing(self, sub, state):
+      await self.channel_layer.group_send(sub.group, {"type": "chat.typing", "channel": self.channel_name, "event": {
+        "event": "typing", "conversation": str(sub.conversation.id), "user": self.presence_name, "typing": state,
+      }})
 
     @database_sync_to_async
-    def _save_message(self, username, conversation_id, ciphertext):
-      conv = Conversation.objects.get(id=conversation_id)
-      user = User.objects.get(username=username)
-      return Message.objects.create(conversation=conv, sender=user, ciphertext=ciphertext)
+    def _load_member_conversation(self, conversation_id):
+      """The conversation, if it exists and the socket's user is in it"""
+      try:
+        if not membership.is_member(conversation_id, self.user.id):
+          return None
+        return Conversation.objects.filter(id=conversation_id).first()
+      except ValidationError:  # not a UUID
+        return None
@@ -0,0 +1,47 @@
+import zlib
+
+import orjson
+from asgiref.sync import sync_to_async
+
+from .history import iter_message_data
+
+# Whole-conversation dumps as NDJSON: one MessageSerializer-shaped object per
+# line, oldest first, so a client that lost the connection resumes with
+# ?after=<last id it got>. Rows come from history.iter_message_data in
+# bounded chunks and each chunk becomes one write, optionally through a
+# streaming gzip compressor, so memory stays flat for any history length.
+
+_DONE = object()
+
+
+def ndjson(chunks):
+    for chunk in chunks:
+        yield b"".join(orjson.dumps(row) + b"\n" for row in chunk)
+
+
+def gzipped(parts, level=6):
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip header and trailer
+    for part in parts:
+        out = z.compress(part)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def export(conv, after=None, gzip=False):
+    """bytes for a conversation's history after the cursor, as NDJSON (gzip-compressed if asked)"""
+    parts = ndjson(iter_message_data(conv, after))
+    return gzipped(parts) if gzip else parts
+
+
+async def stream(conv, after=None, gzip=False):
+    """export() for StreamingHttpResponse under ASGI.
+
+    Django buffers a sync iterator whole before sending it from an async
+    server, so each part is produced (queries, encoding and compression) on
+    the sync thread and handed to the event loop one at a time.
+    """
+    parts = export(conv, after, gzip)
+    step = sync_to_async(next)
+    while (part := await step(parts, _DONE)) is not _DONE:
+        yield part
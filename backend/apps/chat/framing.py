@@ -0,0 +1,40 @@
+import json
+
+import msgpack
+
+from .ciphertext import to_wire
+
+# Chat fan-out frames are encoded once per group_send, not once per socket.
+# Sockets that negotiate SUBPROTOCOL get MessagePack frames carrying the raw
+# ciphertext bytes instead of JSON with base64 text (about 25% smaller).
+
+SUBPROTOCOL = "pookie.msgpack.v1"
+BATCH_WINDOW = 0.005  # seconds a lagging socket waits to gather its backlog into one frame
+
+
+def message_payload(message):
+    """Wire shape of a Message for socket frames (live fan-out and replay alike), ciphertext still raw"""
+    return {
+        "id": str(message.id),
+        "conversation": str(message.conversation_id),
+        "ciphertext": message.ciphertext,
+        "sender": message.sender.username,
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def encode_message(message):
+    """(json text, msgpack bytes) for one chat message dict"""
+    text = json.dumps({**message, "ciphertext": to_wire(message["ciphertext"])}, separators=(",", ":"))
+    packed = msgpack.packb(message)
+    return text, packed
+
+
+def batch_text(texts):
+    """Several pre-encoded JSON messages as one {"batch": [...]} frame, without re-encoding"""
+    return '{"batch":[' + ",".join(texts) + "]}"
+
+
+def batch_packed(frames):
+    """Several pre-encoded msgpack messages as one msgpack array frame"""
+    return msgpack.Packer().pack_array_header(len(frames)) + b"".join(frames)
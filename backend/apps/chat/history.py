@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+from pookiechat.pagination import DEFAULT_LIMIT
+from . import archive
+from .ciphertext import to_wire
+from .models import Message
+
+MESSAGE_COLUMNS = ("id", "conversation_id", "sender__username", "ciphertext", "created_at")
+
+_datetime_field = serializers.DateTimeField()
+
+
+class CursorError(ValueError):
+    pass
+
+
+def resolve_cursor(conv, raw):
+    """Turn a message id or ISO timestamp into a (created_at, id) keyset position.
+
+    Timestamps resolve to (ts, None), meaning "anything at or past ts on that side".
+    """
+    if raw is None or raw == "":
+        return None
+    if str(raw).isdigit():
+        row = conv.messages.filter(id=int(raw)).values_list("created_at", "id").first() or archive.find(conv, int(raw))
+        if row is None:
+            raise CursorError("unknown message id")
+        return row
+    ts = parse_datetime(str(raw))
+    if ts is None:
+        raise CursorError("cursor must be a message id or ISO timestamp")
+    return ts, None
+
+
+def _after(cursor):
+    ts, mid = cursor
+    if mid is None:
+        return Q(created_at__gt=ts)
+    # the redundant >= bound gives the planner a range to seek on the index
+    return Q(created_at__gte=ts) & (Q(created_at__gt=ts) | Q(id__gt=mid))
+
+
+def _before(cursor):
+    ts, mid = cursor
+    if mid is None:
+        return Q(created_at__lt=ts)
+    return Q(created_at__lte=ts) & (Q(created_at__lt=ts) | Q(id__lt=mid))
+
+
+def _page(conv, qs, before, after, limit, from_archive):
+    """Keyset page over both tiers. Archived messages all precede the hot
+    table, so the cold tier is only read when a page runs past the start of
+    the hot rows; from_archive turns decoded archive rows into qs's row type.
+    """
+    if before is not None:
+        qs = qs.filter(_before(before))
+    if after is not None:
+        qs = qs.filter(_after(after)).order_by("created_at", "id")
+        rows = []
+        if archive.reaches(conv, after):
+            rows = from_archive(archive.rows_after(conv, after, before, limit + 1))
+        if len(rows) <= limit:
+            rows += list(qs[:limit + 1 - len(rows)])
+        return rows[:limit], len(rows) > limit
+    rows = list(qs.order_by("-created_at", "-id")[:limit + 1])
+    if len(rows) <= limit and conv.archive_last_id is not None:
+        rows += from_archive(archive.rows_before(conv, before, limit + 1 - len(rows)))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def page_messages(conv, before=None, after=None, limit=DEFAULT_LIMIT):
+    """One keyset page of a conversation's messages, oldest first.
+
+    - after: messages newer than the cursor (delta / "since last seen" mode)
+    - before: the `limit` messages right before the cursor (scrolling back)
+    - neither: the latest `limit` messages
+    Both cursors together bound a window and page forward from `after`.
+
+    Returns (rows, has_more). Each page is a single range scan on
+    chat_msg_conv_created_idx, so its cost does not depend on history length,
+    plus a few segment reads when it reaches into the archive.
+    """
+    def from_archive(rows):
+        names = archive.usernames(rows)
+        return [Message(id=mid, conversation=conv, sender=User(id=sender, username=names[sender]),
+                        ciphertext=text, created_at=ts)
+                for mid, sender, text, ts in rows if sender in names]
+
+    return _page(conv, conv.messages.select_related("sender"), before, after, limit, from_archive)
+
+
+def page_message_data(conv, before=None, after=None, limit=DEFAULT_LIMIT):
+    """page_messages as MessageSerializer-shaped dicts, read as plain tuples of the needed columns"""
+    def from_archive(rows):
+        names = archive.usernames(rows)
+        return [(mid, conv.id, names[sender], text, ts) for mid, sender, text, ts in rows if sender in names]
+
+    rows, has_more = _page(conv, conv.messages.values_list(*MESSAGE_COLUMNS), before, after, limit, from_archive)
+    dt = _datetime_field.to_representation
+    return [
+        {"id": mid, "conversation": cid, "sender": sender, "ciphertext": to_wire(ciphertext), "created_at": dt(ts)}
+        for mid, cid, sender, ciphertext, ts in rows
+    ], has_more
+
+
+def iter_message_data(conv, after=None, chunk_size=None):
+    """Every message after the cursor (None = the whole history), oldest first,
+    as lists of MessageSerializer-shaped dicts.
+
+    Archive segments are decoded one at a time, then the hot table is read in
+    keyset chunks of CHAT_EXPORT_CHUNK rows, so memory stays at one chunk
+    however long the history is.
+    """
+    chunk_size = chunk_size or settings.CHAT_EXPORT_CHUNK
+    dt = _datetime_field.to_representation
+    names = {}
+    for rows in archive.iter_segments(conv, after):
+        missing = {sender for _, sender, _, _ in rows} - names.keys()
+        if missing:
+            names.update(dict.fromkeys(missing))  # senders deleted since archiving stay None and are skipped
+            names.update(User.objects.filter(id__in=missing).values_list("id", "username"))
+        chunk = [
+            {"id": mid, "conversation": conv.id, "sender": names[sender], "ciphertext": to_wire(text),
+             "created_at": dt(ts)}
+            for mid, sender, text, ts in rows if names[sender] is not None
+        ]
+        if chunk:
+            yield chunk
+    qs = conv.messages.values_list(*MESSAGE_COLUMNS).order_by("created_at", "id")
+    cursor = after
+    while True:
+        rows = list((qs.filter(_after(cursor)) if cursor is not None else qs)[:chunk_size])
+        if not rows:
+            return
+        yield [
+            {"id": mid, "conversation": cid, "sender": sender, "ciphertext": to_wire(ciphertext), "created_at": dt(ts)}
+            for mid, cid, sender, ciphertext, ts in rows
+        ]
+        if len(rows) < chunk_size:
+            return
+        cursor = (rows[-1][4], rows[-1][0])
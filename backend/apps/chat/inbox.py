@@ -0,0 +1,194 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from rest_framework import serializers
+
+from pookiechat import versions
+from pookiechat.pagination import DEFAULT_LIMIT
+from .models import Conversation, InboxEntry, Message
+
+_datetime_field = serializers.DateTimeField()
+ENTRY_COLUMNS = ("conversation_id", "participant_ids", "peers", "last_at", "conversation_created_at")
+
+
+def sync_entries(conv):
+    """(Re)build the inbox rows of a conversation after its participants change"""
+    members = list(conv.participants.values_list("id", "username"))
+    ids = [uid for uid, _ in members]
+    last = conv.messages.order_by("-created_at", "-id").values_list("id", "created_at").first()
+    last_id, last_at = last if last else (conv.archive_last_id, conv.archive_last_at)
+    with transaction.atomic():
+        existing = set(InboxEntry.objects.filter(conversation=conv).values_list("user_id", flat=True))
+        InboxEntry.objects.filter(conversation=conv).exclude(user_id__in=ids).delete()
+        versions.bump_on_commit([conv.id], existing | set(ids))
+        for uid, _ in members:
+            peers = [name for other, name in members if other != uid]
+            fields = {
+                "participant_ids": ids,
+                "peers": peers,
+                "last_message_id": last_id,
+                "last_at": last_at,
+                "activity_at": last_at or conv.created_at,
+                "conversation_created_at": conv.created_at,
+            }
+            if uid in existing:
+                InboxEntry.objects.filter(conversation=conv, user_id=uid).update(**fields)
+            else:
+                # a new participant starts with the existing history read
+                InboxEntry.objects.create(conversation=conv, user_id=uid, last_read_id=last_id, **fields)
+
+
+def bump(conversation_id, message_id, created_at):
+    """Point every participant's inbox row at a new message (one UPDATE)"""
+    InboxEntry.objects.filter(conversation_id=conversation_id).filter(
+        Q(last_message_id__isnull=True) | Q(last_message_id__lt=message_id)
+    ).update(last_message_id=message_id, last_at=created_at, activity_at=created_at)
+
+
+def count_unread(conversation_id, new):
+    """Add new messages, [(id, sender id)], to the other participants' unread counts.
+
+    Increments are applied in SQL (F()), so concurrent inserts can't lose
+    updates, and only to rows whose read cursor is still below the message:
+    a reader that already moved past an in-flight message never counts it.
+    """
+    senders = Counter(sender_id for _, sender_id in new)
+    total = len(new)
+    lo, hi = min(mid for mid, _ in new), max(mid for mid, _ in new)
+    rows = InboxEntry.objects.filter(conversation_id=conversation_id)
+    rows.filter(Q(last_read_id__isnull=True) | Q(last_read_id__lt=lo)).update(unread_count=F("unread_count") + Case(
+        *[When(user_id=uid, then=Value(total - n)) for uid, n in senders.items()],
+        default=Value(total), output_field=IntegerField(),
+    ))
+    if hi > lo:
+        # cursors that landed inside this batch (rare): count message by message
+        straddling = rows.select_for_update().filter(last_read_id__gte=lo, last_read_id__lt=hi)
+        for eid, uid, cursor in straddling.values_list("id", "user_id", "last_read_id"):
+            n = sum(1 for mid, sender_id in new if mid > cursor and sender_id != uid)
+            if n:
+                InboxEntry.objects.filter(id=eid).update(unread_count=F("unread_count") + n)
+
+
+def _bump_versions(conversation_ids):
+    members = InboxEntry.objects.filter(conversation_id__in=conversation_ids).values_list("user_id", flat=True)
+    versions.bump_on_commit(conversation_ids, set(members))
+
+
+def record_message(conv, sender, ciphertext):
+    """Create a message and advance the inbox rows in the same transaction"""
+    with transaction.atomic():
+        m = Message.objects.create(conversation=conv, sender=sender, ciphertext=ciphertext)
+        bump(m.conversation_id, m.id, m.created_at)
+        count_unread(m.conversation_id, [(m.id, sender.id)])
+        _bump_versions([m.conversation_id])
+    return m
+
+
+def record_messages(messages):
+    """Batch counterpart of record_message: insert unsaved Message objects in order.
+
+    Ids are assigned in list order. Backends that cannot return ids from a
+    bulk INSERT (MySQL) fall back to per-row INSERTs, still in one transaction.
+    """
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Message.objects.bulk_create(messages)
+        else:
+            for m in messages:
+                m.save(force_insert=True)
+        newest, new = {}, {}
+        for m in messages:
+            newest[m.conversation_id] = m
+            new.setdefault(m.conversation_id, []).append((m.id, m.sender_id))
+        for m in newest.values():
+            bump(m.conversation_id, m.id, m.created_at)
+            count_unread(m.conversation_id, new[m.conversation_id])
+        _bump_versions(list(newest))
+    return messages
+
+
+def mark_read(user, conversation_id, message_id):
+    """Advance the user's read cursor to message_id; returns the new unread count.
+
+    The cursor only moves forward and is clamped to the newest message the
+    inbox row knows of. The row is locked first, so an insert that already
+    counted a message has committed before the messages being read are
+    counted, and a message still in flight below the new cursor is skipped
+    by count_unread when its insert gets to the row.
+    Returns None if the user is not in the conversation.
+    """
+    with transaction.atomic():
+        entry = (InboxEntry.objects.select_for_update()
+                 .filter(user=user, conversation_id=conversation_id).first())
+        if entry is None:
+            return None
+        target = min(message_id, entry.last_message_id or 0)
+        if entry.last_read_id is not None and target <= entry.last_read_id:
+            return entry.unread_count
+        if target == entry.last_message_id:
+            unread = 0
+        else:
+            read = Message.objects.filter(conversation_id=conversation_id, id__lte=target).exclude(sender=user)
+            if entry.last_read_id is not None:
+                read = read.filter(id__gt=entry.last_read_id)
+            unread = max(0, entry.unread_count - read.count())
+        InboxEntry.objects.filter(id=entry.id).update(last_read_id=target, unread_count=unread)
+        versions.bump_on_commit(user_ids=[user.id])
+    return unread
+
+
+def unread_counts(user):
+    """{conversation id: unread} for every conversation with unread messages; one query"""
+    return {str(cid): n for cid, n in InboxEntry.objects.filter(user=user, unread_count__gt=0)
+            .values_list("conversation_id", "unread_count")}
+
+
+def peer_ids(user_id):
+    """Everyone the user shares a conversation with, read from their own inbox rows"""
+    ids = set()
+    for participants in InboxEntry.objects.filter(user_id=user_id).values_list("participant_ids", flat=True):
+        ids.update(participants)
+    ids.discard(user_id)
+    return ids
+
+
+def page_inbox(user, before=None, limit=DEFAULT_LIMIT):
+    """A page of the user's inbox, most recent activity first.
+
+    `before` is the conversation id of the last row of the previous page.
+    Returns (rows, has_more), rows being dicts of ENTRY_COLUMNS; one range
+    scan on chat_inbox_user_activity_idx.
+    """
+    qs = InboxEntry.objects.filter(user=user)
+    if before is not None:
+        cursor = qs.filter(conversation_id=before).values_list("activity_at", "id").first()
+        if cursor is None:
+            return [], False
+        ts, eid = cursor
+        qs = qs.filter(Q(activity_at__lte=ts) & (Q(activity_at__lt=ts) | Q(id__lt=eid)))
+    rows = list(qs.order_by("-activity_at", "-id").values(*ENTRY_COLUMNS)[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def entry_data(e):
+    """Same shape list_conversations has always returned, from a page_inbox row"""
+    return {
+        "id": str(e["conversation_id"]),
+        "participants": e["participant_ids"],
+        "created_at": _datetime_field.to_representation(e["conversation_created_at"]),
+        "peers": e["peers"],
+        "last_at": e["last_at"].isoformat() if e["last_at"] else None,
+    }
+
+
+def on_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        sync_entries(instance)
+        return
+    # user.conversations.add(...) and friends: instance is the user
+    ids = pk_set if pk_set is not None else InboxEntry.objects.filter(user=instance).values_list("conversation_id", flat=True)
+    for conv in Conversation.objects.filter(id__in=list(ids)):
+        sync_entries(conv)
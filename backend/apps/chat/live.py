@@ -0,0 +1,33 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from . import framing
+
+# Live fan-out of new messages to the conversation's channel group. Both the
+# WebSocket send path and the REST post endpoint publish here, so a socket
+# that is subscribed to a conversation sees every message exactly once.
+
+
+def group_name(conversation_id):
+    return f"conv_{conversation_id}"
+
+
+def message_event(message):
+    """The group_send event for a saved message, encoded once for every receiver"""
+    text, packed = framing.encode_message(framing.message_payload(message))
+    return {
+        "type": "chat.message",
+        "conversation": str(message.conversation_id),
+        "id": message.id,
+        "text": text,
+        "packed": packed,
+    }
+
+
+def publish_on_commit(message):
+    """Fan a message written outside a consumer (REST) out once it is committed"""
+    event = message_event(message)
+    layer = get_channel_layer()
+    if layer is not None:
+        transaction.on_commit(lambda: async_to_sync(layer.group_send)(group_name(message.conversation_id), event))
@@ -0,0 +1,100 @@
+import base64
+import os
+import time
+import uuid
+from datetime import timedelta
+
+import msgpack
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from apps.chat.ciphertext import from_wire, to_wire
+from apps.metrics.tables import mib, table_bytes
+
+
+def _table(name, ciphertext):
+    """A throwaway copy of chat_message's layout with the given ciphertext column"""
+    meta = type("Meta", (), {
+        "app_label": "chat",
+        "db_table": f"bench_ciphertext_{name}",
+        "indexes": [models.Index(fields=["conversation_id", "created_at", "id"], name=f"bench_ct_{name}_idx")],
+    })
+    return type(f"BenchCiphertext{name.title()}", (models.Model,), {
+        "__module__": __name__,
+        "conversation_id": models.UUIDField(),
+        "sender_id": models.IntegerField(),
+        "ciphertext": ciphertext,
+        "created_at": models.DateTimeField(),
+        "Meta": meta,
+    })
+
+
+class Command(BaseCommand):
+    help = ("Message storage with base64 text vs raw bytes ciphertext: table size, insert and read rows/s, "
+            "and what each costs at the JSON/msgpack edge (scratch tables, dropped afterwards)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--block", type=int, default=256, help="ciphertext bytes per message (RSA-2048 OAEP)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        n, size = options["rows"], options["block"]
+        blocks = [os.urandom(size) for _ in range(256)]
+        text, binary = _table("text", models.TextField()), _table("binary", models.BinaryField())
+        layouts = [
+            ("base64 text", text, lambda raw: base64.b64encode(raw).decode(),
+             lambda value: value, lambda value: base64.b64decode(value)),
+            ("raw bytes", binary, lambda raw: raw, to_wire, lambda value: value),
+        ]
+        with connection.schema_editor() as editor:
+            editor.create_model(text)
+            editor.create_model(binary)
+        try:
+            self.stdout.write(f"{n} messages, {size}-byte ciphertext")
+            self.stdout.write(f"{'storage':<12}{'size':>10}{'insert/s':>11}{'read/s':>10}"
+                              f"{'read+json/s':>13}{'read+msgpack/s':>16}")
+            for label, model, store, as_json, as_msgpack in layouts:
+                insert = self._insert(model, n, blocks, store, options["batch_size"])
+                read = self._read(model, n, lambda value: value)
+                read_json = self._read(model, n, as_json)
+                read_packed = self._read(model, n, lambda value: msgpack.packb(as_msgpack(value)))
+                self.stdout.write(f"{label:<12}{mib(table_bytes(model._meta.db_table)):>10}{insert:>11.0f}"
+                                  f"{read:>10.0f}{read_json:>13.0f}{read_packed:>16.0f}")
+            wire = to_wire(blocks[0])
+            t0 = time.perf_counter()
+            for _ in range(n):
+                from_wire(wire)
+            self.stdout.write(f"base64 decode of incoming JSON ciphertext: {(time.perf_counter() - t0) / n * 1e6:.2f}us")
+        finally:
+            with connection.schema_editor() as editor:
+                editor.delete_model(text)
+                editor.delete_model(binary)
+
+    @staticmethod
+    def _insert(model, n, blocks, store, batch_size):
+        conv, start = uuid.uuid4(), timezone.now()
+        stored = [store(b) for b in blocks]
+        t0 = time.perf_counter()
+        for lo in range(0, n, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    model(conversation_id=conv, sender_id=i % 7, ciphertext=stored[i % len(stored)],
+                          created_at=start + timedelta(microseconds=i))
+                    for i in range(lo, min(n, lo + batch_size)))
+        return n / (time.perf_counter() - t0)
+
+    @staticmethod
+    def _read(model, n, convert, chunk=2000):
+        """Full keyset scan of the ciphertext column, converting each value for the wire"""
+        t0 = time.perf_counter()
+        last = 0
+        while True:
+            rows = list(model.objects.filter(id__gt=last).order_by("id").values_list("id", "ciphertext")[:chunk])
+            if not rows:
+                break
+            for _, value in rows:
+                convert(value)
+            last = rows[-1][0]
+        return n / (time.perf_counter() - t0)
@@ -0,0 +1,95 @@
+import asyncio
+import base64
+import json
+import os
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import path
+
+from apps.chat import framing
+from apps.chat.consumers import ChatConsumer
+from apps.chat.models import Conversation
+
+
+class Command(BaseCommand):
+    help = "CPU per delivered message and bytes on the wire for chat fan-out: per-socket send_json vs encode-once/msgpack"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=500, help="members of the group conversation")
+        parser.add_argument("--messages", type=int, default=100)
+        parser.add_argument("--live-sockets", type=int, default=50)
+
+    def handle(self, *args, **options):
+        n, m = options["sockets"], options["messages"]
+        messages = [{
+            "id": str(100000 + i),
+            "ciphertext": os.urandom(256),  # RSA-2048 OAEP block
+            "sender": "someone",
+            "created_at": "2026-01-01T00:00:00.000000+00:00",
+        } for i in range(m)]
+
+        t0 = time.process_time()
+        legacy_bytes = 0
+        for msg in messages:
+            for _ in range(n):
+                # what send_json did for every socket
+                legacy_bytes += len(json.dumps({**msg, "ciphertext": base64.b64encode(msg["ciphertext"]).decode()}))
+        legacy = time.process_time() - t0
+
+        t0 = time.process_time()
+        text_bytes = packed_bytes = 0
+        for msg in messages:
+            text, packed = framing.encode_message(msg)
+            for _ in range(n):
+                text_bytes += len(text)
+                packed_bytes += len(packed)
+        once = time.process_time() - t0
+
+        deliveries = n * m
+        self.stdout.write(f"{n} sockets x {m} messages = {deliveries} deliveries")
+        self.stdout.write(f"per-socket send_json : {legacy / deliveries * 1e6:7.2f} us CPU/delivery, {legacy_bytes / deliveries:6.0f} B/frame")
+        self.stdout.write(f"encode once (json)   : {once / deliveries * 1e6:7.2f} us CPU/delivery, {text_bytes / deliveries:6.0f} B/frame")
+        self.stdout.write(f"encode once (msgpack): {'':>7}   same encode,      {packed_bytes / deliveries:6.0f} B/frame")
+
+        conv = Conversation.objects.create()
+        user = User.objects.create(username="bench_fanout_reader")
+        conv.participants.add(user)
+        try:
+            frames, delivered = async_to_sync(self._live)(conv, user, messages, options["live_sockets"])
+            self.stdout.write(f"live burst: {delivered} messages reached {options['live_sockets']} sockets in {frames} frames")
+        finally:
+            conv.delete()
+            user.delete()
+
+    async def _live(self, conv, user, messages, count):
+        app = URLRouter([path("ws/chat/<uuid:conversation_id>/", ChatConsumer.as_asgi())])
+        sockets = []
+        for i in range(count):
+            c = WebsocketCommunicator(app, f"/ws/chat/{conv.id}/", subprotocols=[framing.SUBPROTOCOL] if i % 2 else [])
+            c.scope["user"] = user
+            await c.connect()
+            sockets.append(c)
+        layer = get_channel_layer()
+        for msg in messages:  # a burst: sockets fall behind and get batch frames
+            text, packed = framing.encode_message(msg)
+            await layer.group_send(f"conv_{conv.id}", {"type": "chat.message", "text": text, "packed": packed})
+        await asyncio.sleep(0.5)
+        frames = delivered = 0
+        for c in sockets:
+            while not await c.receive_nothing(timeout=0.01):
+                out = await c.receive_output()
+                frames += 1
+                if out.get("bytes") is not None:
+                    body = framing.msgpack.unpackb(out["bytes"])
+                    delivered += len(body) if isinstance(body, list) else 1
+                else:
+                    body = json.loads(out["text"])
+                    delivered += len(body["batch"]) if "batch" in body else 1
+            await c.disconnect()
+        return frames, delivered
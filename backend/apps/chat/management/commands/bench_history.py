@@ -0,0 +1,69 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.chat.models import Conversation, Message
+from apps.chat.serializers import MessageSerializer
+from apps.chat import views
+
+# the sync DRF view under @versions.long_poll (see bench_inbox)
+list_messages = views.list_messages.__wrapped__
+
+
+class Command(BaseCommand):
+    help = "Benchmark list_messages latency/payload as a conversation grows (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,1000,10000,100000,1000000")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--legacy-max", type=int, default=10000,
+                            help="also time the old serialize-everything path up to this size")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options["sizes"].split(","))
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            a = User.objects.create_user("bench_hist_a")
+            b = User.objects.create_user("bench_hist_b")
+            conv = Conversation.objects.create()
+            conv.participants.add(a, b)
+            count = 0
+            self.stdout.write(f"{'messages':>10} {'mode':>8} {'ms/req':>9} {'bytes':>10}")
+            for size in sizes:
+                self._grow(conv, a, b, size - count)
+                count = size
+                tail_id = conv.messages.order_by("-id").values_list("id", flat=True)[5]
+                for mode, params in (("latest", {}), ("delta", {"after": tail_id})):
+                    ms, nbytes = self._time(factory, a, conv, params, options["repeat"])
+                    self.stdout.write(f"{size:>10} {mode:>8} {ms:>9.2f} {nbytes:>10}")
+                if size <= options["legacy_max"]:
+                    t0 = time.perf_counter()
+                    body = json.dumps(MessageSerializer(conv.messages.all(), many=True).data, default=str)
+                    ms = (time.perf_counter() - t0) * 1000
+                    self.stdout.write(f"{size:>10} {'legacy':>8} {ms:>9.2f} {len(body):>10}")
+            transaction.set_rollback(True)
+
+    def _grow(self, conv, a, b, n, batch=5000):
+        while n > 0:
+            k = min(n, batch)
+            Message.objects.bulk_create(
+                Message(conversation=conv, sender=(a if i % 2 else b), ciphertext=b"x" * 256)
+                for i in range(k)
+            )
+            n -= k
+
+    def _time(self, factory, user, conv, params, repeat):
+        url = f"/api/conversations/{conv.id}/messages/"
+        nbytes = 0
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            req = factory.get(url, params)
+            force_authenticate(req, user=user)
+            resp = list_messages(req, conversation_id=conv.id)
+            resp.render()
+            nbytes = len(resp.content)
+        return (time.perf_counter() - t0) * 1000 / repeat, nbytes
@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.chat.inbox import record_message
+from apps.chat.models import Conversation
+from apps.chat import views
+
+# the sync DRF view under @versions.long_poll; without ?wait the async wrapper
+# only hands the request to a thread, which is not what is measured here
+list_conversations = views.list_conversations.__wrapped__
+
+
+class Command(BaseCommand):
+    help = "Time list_conversations and count its queries as the inbox grows (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,10,100,1000")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options["sizes"].split(","))
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            me = User.objects.create_user("bench_inbox_me")
+            have = 0
+            self.stdout.write(f"{'inbox':>8} {'queries':>8} {'ms/req':>9}")
+            for size in sizes:
+                for i in range(have, size):
+                    peer = User.objects.create_user(f"bench_inbox_{i}")
+                    conv = Conversation.objects.create()
+                    conv.participants.add(me, peer)
+                    record_message(conv, peer, b"x")
+                have = size
+                req = factory.get("/api/conversations/list/")
+                force_authenticate(req, user=me)
+                with CaptureQueriesContext(connection) as ctx:
+                    list_conversations(req).render()
+                t0 = time.perf_counter()
+                for _ in range(options["repeat"]):
+                    req = factory.get("/api/conversations/list/")
+                    force_authenticate(req, user=me)
+                    list_conversations(req).render()
+                ms = (time.perf_counter() - t0) * 1000 / options["repeat"]
+                self.stdout.write(f"{size:>8} {len(ctx.captured_queries):>8} {ms:>9.2f}")
+            transaction.set_rollback(True)
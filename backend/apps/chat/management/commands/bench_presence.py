@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.urls import path
+
+from apps.chat.consumers import ChatConsumer
+from apps.chat.models import Conversation
+
+
+class Command(BaseCommand):
+    help = "Presence/typing fan-out cost with thousands of sockets on one conversation (use the in-memory channel layer)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=1000)
+        parser.add_argument("--heartbeats", type=int, default=5, help="heartbeats sent by every socket")
+        parser.add_argument("--typists", type=int, default=10)
+
+    def handle(self, *args, **options):
+        users = User.objects.bulk_create(User(username=f"bench_presence_{i}") for i in range(options["sockets"]))
+        if users[0].id is None:
+            users = list(User.objects.filter(username__startswith="bench_presence_").order_by("id"))
+        conv = Conversation.objects.create()
+        conv.participants.add(*users)
+        try:
+            async_to_sync(self._run)(conv, users, options)
+        finally:
+            conv.delete()
+            User.objects.filter(username__startswith="bench_presence_").delete()
+
+    async def _run(self, conv, users, options):
+        layer = get_channel_layer()
+        sends = {"calls": 0}
+        group_send = layer.group_send
+
+        async def counting_group_send(group, message):
+            sends["calls"] += 1
+            await group_send(group, message)
+
+        layer.group_send = counting_group_send
+        app = URLRouter([path("ws/chat/<uuid:conversation_id>/", ChatConsumer.as_asgi())])
+        n = len(users)
+        sockets = []
+        t0 = time.perf_counter()
+        for u in users:
+            c = WebsocketCommunicator(app, f"/ws/chat/{conv.id}/")
+            c.scope["user"] = u
+            await c.connect()
+            sockets.append(c)
+        self.stdout.write(f"connect {n} sockets: {time.perf_counter() - t0:.2f}s, presence broadcasts {sends['calls']}")
+        await self._drain(sockets)
+
+        sends["calls"] = 0
+        t0 = time.perf_counter()
+        for _ in range(options["heartbeats"]):
+            await asyncio.gather(*(c.send_json_to({"action": "heartbeat"}) for c in sockets))
+        await asyncio.sleep(0.2)
+        hb = options["heartbeats"] * n
+        self.stdout.write(
+            f"{hb} heartbeats: {time.perf_counter() - t0:.2f}s, group_send calls {sends['calls']}"
+            f" (uncoalesced would be {hb} calls / {hb * n} deliveries)"
+        )
+
+        sends["calls"] = 0
+        typists = sockets[:options["typists"]]
+        t0 = time.perf_counter()
+        for _ in range(20):  # keystroke bursts
+            await asyncio.gather(*(c.send_json_to({"action": "typing", "state": True}) for c in typists))
+        await asyncio.sleep(0.2)
+        delivered = await self._drain(sockets)
+        self.stdout.write(
+            f"{20 * len(typists)} typing events: {time.perf_counter() - t0:.2f}s, group_send calls {sends['calls']},"
+            f" frames delivered {delivered} ({delivered / max(sends['calls'], 1):.0f} per broadcast)"
+        )
+        for c in sockets:
+            await c.disconnect()
+        layer.group_send = group_send
+
+    async def _drain(self, sockets):
+        delivered = 0
+        for c in sockets:
+            while not await c.receive_nothing(timeout=0.001):
+                await c.receive_output()
+                delivered += 1
+        return delivered
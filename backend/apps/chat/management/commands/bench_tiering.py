@@ -0,0 +1,80 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.chat import archive
+from apps.chat.history import page_message_data
+from apps.chat.inbox import record_message
+from apps.chat.models import Conversation, InboxEntry, Message, MessageSegment
+from apps.metrics.tables import mib, table_bytes
+
+
+class Command(BaseCommand):
+    help = ("Hot-table size and insert latency for an active conversation before and after tiering "
+            "old history into archive segments (fixture deleted afterwards)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--conversations", type=int, default=200)
+        parser.add_argument("--messages", type=int, default=2000, help="old messages per conversation")
+        parser.add_argument("--inserts", type=int, default=500)
+
+    def handle(self, *args, **options):
+        a = User.objects.create_user("bench_tier_a")
+        b = User.objects.create_user("bench_tier_b")
+        convs = []
+        try:
+            old = timezone.now() - timedelta(days=365)
+            with archive.explicit_timestamps(Message):
+                for _ in range(options["conversations"]):
+                    conv = Conversation.objects.create()
+                    conv.participants.add(a, b)
+                    Message.objects.bulk_create(
+                        (Message(conversation=conv, sender=a if i % 2 else b, ciphertext=b"x" * 256,
+                                 created_at=old + timedelta(seconds=i)) for i in range(options["messages"])),
+                        batch_size=5000)
+                    convs.append(conv)
+            active = Conversation.objects.create()
+            active.participants.add(a, b)
+            convs.append(active)
+            last = dict(Message.objects.filter(conversation__in=convs).values("conversation_id")
+                        .annotate(n=Max("id")).values_list("conversation_id", "n"))
+            for conv in convs:
+                InboxEntry.objects.filter(conversation=conv).update(last_read_id=last.get(conv.id))
+
+            probe = convs[0]
+            before_page = page_message_data(probe, limit=120)[0]
+            self._report("before", active, a, options["inserts"])
+            t0 = time.perf_counter()
+            # only the fixture: tier() would archive every eligible conversation in the database
+            cutoff = timezone.now() - timedelta(days=settings.CHAT_ARCHIVE_AFTER_DAYS)
+            moved = sum(archive.tier_conversation(c.id, cutoff, settings.CHAT_ARCHIVE_SEGMENT_SIZE) for c in convs)
+            self.stdout.write(f"tiered {moved} messages in {time.perf_counter() - t0:.1f}s")
+            self._report("after", active, a, options["inserts"])
+            probe.refresh_from_db()
+            same = page_message_data(probe, limit=120)[0] == before_page
+            self.stdout.write(f"latest page identical after tiering: {'yes' if same else 'NO'}")
+        finally:
+            Conversation.objects.filter(id__in=[c.id for c in convs]).delete()
+            a.delete()
+            b.delete()
+
+    def _report(self, label, active, sender, inserts):
+        rows = Message.objects.count()
+        size = table_bytes(Message._meta.db_table)
+        cold = table_bytes(MessageSegment._meta.db_table)
+        latencies = []
+        for i in range(inserts):
+            t0 = time.perf_counter()
+            record_message(active, sender, f"{label}-{i}".encode())
+            latencies.append(time.perf_counter() - t0)
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{label:<7} hot rows {rows:>9}  hot {mib(size):>9}  archive {mib(cold):>9}  "
+            f"insert p50 {statistics.median(latencies) * 1000:.2f}ms p95 {p95 * 1000:.2f}ms")
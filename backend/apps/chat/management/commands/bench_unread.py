@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.db.models import Count, F, Q
+from django.test.utils import CaptureQueriesContext
+
+from apps.chat import inbox
+from apps.chat.models import Conversation, InboxEntry, Message
+
+
+class Command(BaseCommand):
+    help = "Bulk unread counts from the maintained column vs counting messages at read time (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,1000,5000")
+        parser.add_argument("--messages", type=int, default=20, help="messages per conversation")
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def _timed(self, fn):
+        reset_queries()  # setup overflows the query log, which would skew the capture
+        with CaptureQueriesContext(connection) as ctx:
+            result = fn()
+        t0 = time.perf_counter()
+        for _ in range(self.repeat):
+            fn()
+        return result, len(ctx.captured_queries), (time.perf_counter() - t0) * 1000 / self.repeat
+
+    def handle(self, *args, **options):
+        self.repeat = options["repeat"]
+        sizes = sorted(int(s) for s in options["sizes"].split(","))
+        with transaction.atomic():
+            me = User.objects.create_user("bench_unread_me")
+            peer = User.objects.create_user("bench_unread_peer")
+            have = 0
+            self.stdout.write(f"{'inbox':>8} {'column q':>9} {'ms':>8} {'count q':>8} {'ms':>8}")
+            for size in sizes:
+                for _ in range(have, size):
+                    conv = Conversation.objects.create()
+                    conv.participants.add(me, peer)
+                    inbox.record_messages([Message(conversation=conv, sender=peer, ciphertext=b"x")
+                                           for _ in range(options["messages"])])
+                    # read half of them
+                    mid = conv.messages.order_by("id").values_list("id", flat=True)[options["messages"] // 2]
+                    inbox.mark_read(me, conv.id, mid)
+                have = size
+
+                fast, fast_q, fast_ms = self._timed(lambda: inbox.unread_counts(me))
+
+                def counted():
+                    # what read-time counting costs: join every conversation to its messages
+                    rows = (InboxEntry.objects.filter(user=me)
+                            .annotate(n=Count("conversation__messages", filter=~Q(conversation__messages__sender=me)
+                                              & Q(conversation__messages__id__gt=F("last_read_id"))))
+                            .filter(n__gt=0).values_list("conversation_id", "n"))
+                    return {str(c): n for c, n in rows}
+
+                slow, slow_q, slow_ms = self._timed(counted)
+                assert fast == slow, "maintained counts disagree with counted ones"
+                self.stdout.write(f"{size:>8} {fast_q:>9} {fast_ms:>8.2f} {slow_q:>8} {slow_ms:>8.2f}")
+            transaction.set_rollback(True)
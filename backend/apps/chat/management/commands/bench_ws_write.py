@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from apps.chat.inbox import record_message
+from apps.chat.models import Conversation, Message
+from apps.chat.pipeline import MessageWriter
+
+
+class Command(BaseCommand):
+    help = "Messages/sec persisted per worker: per-message thread hop vs the write-behind MessageWriter"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumers", type=int, default=50)
+        parser.add_argument("--messages", type=int, default=40, help="messages per consumer")
+        parser.add_argument("--flush-ms", type=float, default=5)
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        a = User.objects.create_user("bench_ws_write_a")
+        b = User.objects.create_user("bench_ws_write_b")
+        conv = Conversation.objects.create()
+        conv.participants.add(a, b)
+        try:
+            total = options["consumers"] * options["messages"]
+            before = async_to_sync(self._before)(conv, options)
+            after = async_to_sync(self._after)(conv, a, options)
+            self.stdout.write(f"per-message hop : {total / before:>9.0f} msg/s")
+            self.stdout.write(f"write-behind    : {total / after:>9.0f} msg/s")
+            ids = list(conv.messages.order_by("created_at", "id").values_list("id", flat=True))
+            self.stdout.write(f"ids ascending   : {ids == sorted(ids)}")
+        finally:
+            conv.delete()
+            a.delete()
+            b.delete()
+
+    async def _before(self, conv, options):
+        # what ChatConsumer._save_message used to do for every send
+        @database_sync_to_async
+        def save(i):
+            c = Conversation.objects.get(id=conv.id)
+            u = User.objects.get(username="bench_ws_write_a")
+            return record_message(c, u, f"before-{i}".encode())
+
+        async def consumer():
+            for i in range(options["messages"]):
+                await save(i)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(consumer() for _ in range(options["consumers"])))
+        return time.perf_counter() - t0
+
+    async def _after(self, conv, sender, options):
+        writer = MessageWriter(options["flush_ms"] / 1000, options["batch_size"])
+
+        async def consumer(n):
+            for i in range(options["messages"]):
+                m = await writer.submit(Message(conversation=conv, sender=sender, ciphertext=f"after-{n}-{i}".encode()))
+                assert m.id is not None
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(consumer(n) for n in range(options["consumers"])))
+        return time.perf_counter() - t0
@@ -0,0 +1,35 @@
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat import export
+from apps.chat.history import CursorError, resolve_cursor
+from apps.chat.models import Conversation
+
+
+class Command(BaseCommand):
+    help = "Write a conversation's full history (both tiers) as NDJSON, optionally gzip-compressed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("conversation", help="conversation id")
+        parser.add_argument("--after", help="resume after this message id")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--output", default="-", help="file to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            conv = Conversation.objects.get(id=options["conversation"])
+        except (Conversation.DoesNotExist, ValidationError):
+            raise CommandError(f"no conversation {options['conversation']}")
+        try:
+            after = resolve_cursor(conv, options["after"])
+        except CursorError as e:
+            raise CommandError(str(e))
+        out = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for part in export.export(conv, after, options["gzip"]):
+                out.write(part)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
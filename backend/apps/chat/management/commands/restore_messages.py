@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.chat import archive
+from apps.chat.models import Conversation
+
+
+class Command(BaseCommand):
+    help = "Move archived messages back into the Message table"
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument("--conversation", help="conversation id")
+        target.add_argument("--all", action="store_true")
+
+    def handle(self, *args, **options):
+        convs = Conversation.objects.filter(archive_last_id__isnull=False)
+        if options["conversation"]:
+            convs = convs.filter(id=options["conversation"])
+            if not convs.exists():
+                raise CommandError(f"conversation {options['conversation']} has no archive")
+        total = 0
+        for conv_id in list(convs.values_list("id", flat=True)):
+            n = archive.restore(conv_id)
+            total += n
+            self.stdout.write(f"{conv_id}: {n} messages restored")
+        self.stdout.write(f"{total} messages restored")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.chat import archive
+
+
+class Command(BaseCommand):
+    help = "Move fully read messages older than CHAT_ARCHIVE_AFTER_DAYS into compressed archive segments"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=None)
+        parser.add_argument("--segment-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        total = archive.tier(options["older_than_days"], options["segment_size"], stdout=self.stdout)
+        self.stdout.write(f"{total} messages archived")
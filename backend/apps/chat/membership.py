@@ -0,0 +1,123 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.accounts import blocks
+from pookiechat import versions
+from .models import Conversation
+
+# "Is user U in conversation C", answered without a query. Member sets live
+# in the shared cache keyed by a per-conversation generation (as in the
+# social follow graph: a racing reader can only store a stale set under a
+# superseded generation). A small in-process LRU sits in front so repeated
+# checks from one worker, e.g. every send on a socket, cost no round trip;
+# its TTL bounds how long another worker may act on a superseded set.
+#
+# Removing a participant also ends their live fan-out: after commit, REMOVED
+# goes to the user's per-user group and each of their sockets drops that
+# conversation's subscription (ChatConsumer.chat_removed).
+
+TTL = 60 * 60
+REMOVED = "chat.removed"
+
+_local = OrderedDict()  # conversation id -> (expires, frozenset of user ids)
+_lock = threading.Lock()
+
+
+def _gen_key(conversation_id):
+    return f"chat:m:gen:{conversation_id}"
+
+
+def _key(conversation_id):
+    return f"chat:m:{versions.get_version(_gen_key(conversation_id))}:{conversation_id}"
+
+
+def _load(conversation_id):
+    return frozenset(Conversation.participants.through.objects
+                     .filter(conversation_id=conversation_id).values_list("user_id", flat=True))
+
+
+def members(conversation_id):
+    conversation_id = str(conversation_id)
+    now = time.monotonic()
+    with _lock:
+        hit = _local.get(conversation_id)
+        if hit is not None and hit[0] > now:
+            _local.move_to_end(conversation_id)
+            return hit[1]
+    key = _key(conversation_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = _load(conversation_id)
+        cache.set(key, ids, TTL)
+    with _lock:
+        _local[conversation_id] = (now + settings.CHAT_MEMBERSHIP_LOCAL_TTL, ids)
+        _local.move_to_end(conversation_id)
+        while len(_local) > settings.CHAT_MEMBERSHIP_LOCAL_SIZE:
+            _local.popitem(last=False)
+    return ids
+
+
+def is_member(conversation_id, user_id):
+    return user_id in members(conversation_id)
+
+
+def local_size():
+    return len(_local)
+
+
+def _evict(conversation_ids):
+    versions.bump(*(_gen_key(c) for c in conversation_ids))
+    with _lock:
+        for c in conversation_ids:
+            _local.pop(c, None)
+
+
+def invalidate(conversation_ids):
+    conversation_ids = [str(c) for c in conversation_ids]
+    transaction.on_commit(lambda: _evict(conversation_ids))
+
+
+def _notify_removed(pairs):
+    layer = get_channel_layer()
+    if layer is None or not pairs:
+        return
+
+    async def broadcast():
+        for i in range(0, len(pairs), blocks.BROADCAST_BATCH):
+            await asyncio.gather(*(layer.group_send(blocks.group_name(u), {"type": REMOVED, "conversation": c})
+                                   for c, u in pairs[i:i + blocks.BROADCAST_BATCH]))
+
+    async_to_sync(broadcast)()
+
+
+def removed(pairs):
+    """[(conversation id, user id)] taken out: after commit, their sockets stop following those conversations"""
+    pairs = [(str(c), u) for c, u in pairs]
+    transaction.on_commit(lambda: _notify_removed(pairs))
+
+
+def on_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            invalidate([instance.pk])
+        if action == "post_remove":
+            removed((instance.pk, u) for u in pk_set)
+        elif action == "pre_clear":
+            removed((instance.pk, u) for u in instance.participants.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove"):
+        invalidate(pk_set)
+        if action == "post_remove":
+            removed((c, instance.pk) for c in pk_set)
+    elif action == "pre_clear":
+        # instance is a user; after the clear we could no longer tell which conversations
+        conversation_ids = list(instance.conversations.values_list("id", flat=True))
+        invalidate(conversation_ids)
+        removed((c, instance.pk) for c in conversation_ids)
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    Conversation = apps.get_model("chat", "Conversation")
+    InboxEntry = apps.get_model("chat", "InboxEntry")
+    Message = apps.get_model("chat", "Message")
+    batch = []
+    for conv in Conversation.objects.prefetch_related("participants").iterator(chunk_size=500):
+        members = [(u.id, u.username) for u in conv.participants.all()]
+        last = Message.objects.filter(conversation=conv).order_by("-created_at", "-id").values_list("id", "created_at").first()
+        last_id, last_at = last if last else (None, None)
+        for uid, _ in members:
+            batch.append(InboxEntry(
+                user_id=uid,
+                conversation=conv,
+                participant_ids=[m for m, _ in members],
+                peers=[name for other, name in members if other != uid],
+                last_message_id=last_id,
+                last_at=last_at,
+                activity_at=last_at or conv.created_at,
+                conversation_created_at=conv.created_at,
+            ))
+        if len(batch) >= 1000:
+            InboxEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        InboxEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0003_inboxentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
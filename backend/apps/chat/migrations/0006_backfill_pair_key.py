@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    Conversation = apps.get_model("chat", "Conversation")
+    Message = apps.get_model("chat", "Message")
+    InboxEntry = apps.get_model("chat", "InboxEntry")
+    Through = Conversation.participants.through
+
+    members = defaultdict(list)
+    for conv_id, user_id in Through.objects.values_list("conversation_id", "user_id").iterator(chunk_size=2000):
+        members[conv_id].append(user_id)
+
+    by_pair = defaultdict(list)
+    for conv_id, created_at in Conversation.objects.filter(pair_key__isnull=True).values_list("id", "created_at").iterator(chunk_size=2000):
+        users = members.get(conv_id, [])
+        if len(users) == 2:
+            lo, hi = sorted(users)
+            by_pair[f"{lo}:{hi}"].append((created_at, str(conv_id), conv_id))
+
+    for key, convs in by_pair.items():
+        convs.sort()
+        keeper = convs[0][2]
+        dupes = [c[2] for c in convs[1:]]
+        if dupes:
+            # fold the duplicates' history into the oldest conversation
+            Message.objects.filter(conversation_id__in=dupes).update(conversation_id=keeper)
+            Conversation.objects.filter(id__in=dupes).delete()
+            last = Message.objects.filter(conversation_id=keeper).order_by("-created_at", "-id").values_list("id", "created_at").first()
+            if last:
+                InboxEntry.objects.filter(conversation_id=keeper).update(
+                    last_message_id=last[0], last_at=last[1], activity_at=last[1],
+                )
+        Conversation.objects.filter(id=keeper).update(pair_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0005_conversation_pair_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_read(apps, schema_editor):
+    # existing history counts as read; unread tracking starts with the next message
+    InboxEntry = apps.get_model("chat", "InboxEntry")
+    InboxEntry.objects.update(last_read_id=F("last_message_id"), unread_count=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0006_backfill_pair_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inboxentry",
+            name="last_read_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="inboxentry",
+            name="unread_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(start_read, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_inbox_read_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='archive_last_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='archive_last_id',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='MessageSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_at', models.DateTimeField()),
+                ('first_id', models.BigIntegerField()),
+                ('last_at', models.DateTimeField()),
+                ('last_id', models.BigIntegerField()),
+                ('min_id', models.BigIntegerField()),
+                ('max_id', models.BigIntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='chat.conversation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['conversation', 'first_at', 'first_id'], name='chat_segment_conv_first_idx'), models.Index(fields=['conversation', 'last_at', 'last_id'], name='chat_segment_conv_last_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0008_message_archive"),
+    ]
+
+    operations = [
+        # filled by 0010 while the old column keeps serving; swapped in by 0011
+        migrations.AddField(
+            model_name="message",
+            name="ciphertext_bin",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+import zlib
+
+import msgpack
+from django.db import migrations, transaction
+
+CHUNK = 2000
+MAX_BYTES = 1024  # models.CIPHERTEXT_MAX_BYTES when this was written
+
+
+def _raw(mid, text):
+    raw = text.encode()
+    if len(raw) > MAX_BYTES:
+        raise RuntimeError(f"message {mid}: ciphertext is {len(raw)} bytes, over {MAX_BYTES}; "
+                           "fix or delete it and run migrate again")
+    return raw
+
+
+def convert(apps, schema_editor):
+    """Copy the text ciphertext into ciphertext_bin as its UTF-8 bytes, CHUNK rows per transaction.
+
+    Clients before this change stored the typed text unchanged, never base64,
+    so every row is encoded as it stands: guessing base64 from the content
+    would turn plain messages such as "okay" into garbage bytes.
+
+    Not atomic as a whole: progress is committed chunk by chunk and only rows
+    with ciphertext_bin still null are read, so an interrupted run (or one
+    started early with `migrate chat 0010` while the old code serves traffic)
+    picks up where it stopped when migrate runs again.
+    """
+    Message = apps.get_model("chat", "Message")
+    MessageSegment = apps.get_model("chat", "MessageSegment")
+    last = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Message.objects.filter(ciphertext_bin__isnull=True, id__gt=last)
+                        .order_by("id").values_list("id", "ciphertext")[:CHUNK])
+            if not rows:
+                break
+            Message.objects.bulk_update(
+                [Message(id=mid, ciphertext_bin=_raw(mid, text)) for mid, text in rows], ["ciphertext_bin"])
+        last = rows[-1][0]
+    # archive segments carry [id, sender_id, ciphertext, micros] rows (apps.chat.archive)
+    for segment_id in list(MessageSegment.objects.values_list("id", flat=True)):
+        with transaction.atomic():
+            segment = MessageSegment.objects.select_for_update().get(id=segment_id)
+            rows = msgpack.unpackb(zlib.decompress(segment.data))
+            if rows and isinstance(rows[0][2], str):
+                rows = [[mid, sender, _raw(mid, text), ts] for mid, sender, text, ts in rows]
+                segment.data = zlib.compress(msgpack.packb(rows))
+                segment.save(update_fields=["data"])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("chat", "0009_message_ciphertext_bin"),
+    ]
+
+    operations = [
+        migrations.RunPython(convert, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+import base64
+import importlib
+import zlib
+
+import msgpack
+from django.db import migrations, models, transaction
+from django.db.models.functions import Length
+from django.db.models.lookups import LessThanOrEqual
+
+CHUNK = 2000
+
+# rows written by the old code since 0010 ran (it can be applied well before deploying)
+convert_rest = importlib.import_module("apps.chat.migrations.0010_convert_ciphertext").convert
+
+
+def to_text(apps, schema_editor):
+    """Backwards only: refill the restored text column with base64"""
+    Message = apps.get_model("chat", "Message")
+    MessageSegment = apps.get_model("chat", "MessageSegment")
+    last = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Message.objects.filter(id__gt=last).order_by("id").values_list("id", "ciphertext_bin")[:CHUNK])
+            if not rows:
+                break
+            Message.objects.bulk_update(
+                [Message(id=mid, ciphertext=base64.b64encode(raw).decode()) for mid, raw in rows], ["ciphertext"])
+        last = rows[-1][0]
+    for segment in MessageSegment.objects.all():
+        rows = msgpack.unpackb(zlib.decompress(segment.data))
+        rows = [[mid, sender, base64.b64encode(raw).decode(), ts] for mid, sender, raw, ts in rows]
+        segment.data = zlib.compress(msgpack.packb(rows))
+        segment.save(update_fields=["data"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0010_convert_ciphertext"),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_rest, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="message",
+            name="ciphertext",
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, to_text),
+        migrations.RemoveField(
+            model_name="message",
+            name="ciphertext",
+        ),
+        migrations.RenameField(
+            model_name="message",
+            old_name="ciphertext_bin",
+            new_name="ciphertext",
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="ciphertext",
+            field=models.BinaryField(),
+        ),
+        migrations.AddConstraint(
+            model_name="message",
+            constraint=models.CheckConstraint(
+                check=LessThanOrEqual(Length("ciphertext"), 1024), name="chat_msg_ciphertext_size"),
+        ),
+    ]
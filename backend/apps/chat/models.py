@@ -1,17 +1,86 @@
 from django.db import models
+from django.db.models.functions import Length
+from django.db.models.lookups import LessThanOrEqual
 from django.contrib.auth.models import User
 from uuid import uuid4
 
+# one RSA-OAEP block from the client's encryptFor is 256 bytes (RSA-2048) or 512 (RSA-4096)
+CIPHERTEXT_MAX_BYTES = 1024
+
 class Conversation(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     participants = models.ManyToManyField(User, related_name="conversations")
+    # "<low user id>:<high user id>" for 1:1 chats, so lookup is a single unique-index hit
+    pair_key = models.CharField(max_length=41, unique=True, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # newest (created_at, id) moved to the cold archive; null while nothing is archived.
+    # Archived messages always precede every message still in the Message table.
+    archive_last_at = models.DateTimeField(null=True, blank=True, editable=False)
+    archive_last_id = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    @staticmethod
+    def pair_key_for(a_id, b_id):
+        lo, hi = sorted((int(a_id), int(b_id)))
+        return f"{lo}:{hi}"
 
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
-    ciphertext = models.TextField()  # store encrypted
+    ciphertext = models.BinaryField()  # raw encrypted bytes; base64 only on the wire (apps.chat.ciphertext)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # keyset paging over a conversation's history: (created_at, id) is the cursor
+            models.Index(fields=["conversation", "created_at", "id"], name="chat_msg_conv_created_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(check=LessThanOrEqual(Length("ciphertext"), CIPHERTEXT_MAX_BYTES),
+                                   name="chat_msg_ciphertext_size"),
+        ]
+
+class InboxEntry(models.Model):
+    """Per-participant inbox row, kept current by apps.chat.inbox so listing needs no joins"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="inbox")
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="inbox_entries")
+    participant_ids = models.JSONField(default=list)
+    peers = models.JSONField(default=list)  # usernames of the other participants
+    last_message_id = models.BigIntegerField(null=True, blank=True)
+    last_at = models.DateTimeField(null=True, blank=True)
+    activity_at = models.DateTimeField()  # last_at, or conversation.created_at before any message
+    conversation_created_at = models.DateTimeField()
+    # read cursor: messages past last_read_id from others are unread; the
+    # count is kept up to date on insert and on cursor moves, never counted on read
+    last_read_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "conversation"], name="chat_inbox_user_conv_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-activity_at", "-id"], name="chat_inbox_user_activity_idx"),
+        ]
+
+
+class MessageSegment(models.Model):
+    """A run of consecutive archived messages of one conversation, compressed (see apps.chat.archive)"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="segments")
+    # (created_at, id) of the first and last message, in history order
+    first_at = models.DateTimeField()
+    first_id = models.BigIntegerField()
+    last_at = models.DateTimeField()
+    last_id = models.BigIntegerField()
+    # id range, for resolving a message id cursor
+    min_id = models.BigIntegerField()
+    max_id = models.BigIntegerField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation", "first_at", "first_id"], name="chat_segment_conv_first_idx"),
+            models.Index(fields=["conversation", "last_at", "last_id"], name="chat_segment_conv_last_idx"),
+        ]
@@ -0,0 +1,78 @@
+import asyncio
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from apps.metrics.consumers import measure
+from apps.metrics.scope import detached
+from .inbox import record_messages
+
+
+class MessageWriter:
+    """Write-behind group commit for chat messages.
+
+    Consumers submit unsaved Message objects and await the saved row. Pending
+    messages from every consumer on the event loop are flushed together, in
+    submission order, once `batch_size` are queued or `flush_interval` seconds
+    have passed since the first one. Each flush is one thread hop and one
+    transaction instead of one per message.
+    """
+
+    def __init__(self, flush_interval, batch_size):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = []
+        self._full = asyncio.Event()
+        self._task = None
+
+    async def submit(self, message):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((message, future))
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+        if self._task is None:
+            # shared by every consumer: don't inherit the submitting event's metrics scope
+            with detached():
+                self._task = asyncio.get_running_loop().create_task(self._run())
+        return await future
+
+    async def _run(self):
+        try:
+            while self._pending:
+                if len(self._pending) < self.batch_size:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                self._full.clear()
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                try:
+                    with measure("MessageWriter", "flush"):
+                        await database_sync_to_async(record_messages)([m for m, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for m, future in batch:
+                        if not future.done():
+                            future.set_result(m)
+        finally:
+            self._task = None
+
+
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_writer():
+    """The MessageWriter shared by all consumers on the running event loop"""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = MessageWriter(
+            flush_interval=settings.CHAT_WRITE_FLUSH_MS / 1000,
+            batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+        )
+    return writer
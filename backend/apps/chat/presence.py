@@ -0,0 +1,84 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+# Presence lives in the cache (Redis, the channel layer's backend) under TTLs:
+# a per-user open-socket count that heartbeats keep alive, and a last-seen
+# stamp. Only transitions (first socket opened, last socket closed) are
+# broadcast; heartbeats refresh the TTL at most once per HEARTBEAT_INTERVAL
+# per socket and never reach group_send.
+
+PRESENCE_TTL = 60
+HEARTBEAT_INTERVAL = 20
+TYPING_INTERVAL = 3
+LAST_SEEN_TTL = 60 * 60 * 24 * 30
+
+
+def _conns_key(username):
+    return f"presence:conns:{username}"
+
+
+def _seen_key(username):
+    return f"presence:seen:{username}"
+
+
+def connected(username):
+    """Count a new socket; True if the user just came online"""
+    key = _conns_key(username)
+    if cache.add(key, 1, PRESENCE_TTL):
+        return True
+    try:
+        n = cache.incr(key)
+    except ValueError:  # expired between add and incr
+        cache.add(key, 1, PRESENCE_TTL)
+        return True
+    cache.touch(key, PRESENCE_TTL)
+    return n == 1
+
+
+def disconnected(username):
+    """Drop a socket; True if that was the user's last one"""
+    cache.set(_seen_key(username), timezone.now().isoformat(), LAST_SEEN_TTL)
+    try:
+        n = cache.decr(_conns_key(username))
+    except ValueError:
+        return True
+    if n <= 0:
+        cache.delete(_conns_key(username))
+        return True
+    return False
+
+
+def heartbeat(username):
+    cache.touch(_conns_key(username), PRESENCE_TTL)
+    cache.set(_seen_key(username), timezone.now().isoformat(), LAST_SEEN_TTL)
+
+
+def bulk(usernames):
+    """{username: {"online": bool, "last_seen": iso or None}} in two cache round trips"""
+    usernames = list(usernames)
+    conns = cache.get_many([_conns_key(u) for u in usernames])
+    seen = cache.get_many([_seen_key(u) for u in usernames])
+    return {
+        u: {"online": (conns.get(_conns_key(u)) or 0) > 0, "last_seen": seen.get(_seen_key(u))}
+        for u in usernames
+    }
+
+
+class Throttle:
+    """Per-socket gate: allow() is True at most once per `interval` seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._last = float("-inf")
+
+    def allow(self):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return False
+        self._last = now
+        return True
+
+    def reset(self):
+        self._last = float("-inf")
@@ -1,7 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .ciphertext import CiphertextError, from_wire, to_wire
 from .models import Conversation, Message
 
+class CiphertextField(serializers.Field):
+    """Raw bytes in the model, base64 in JSON"""
+
+    def to_representation(self, value):
+        return to_wire(value)
+
+    def to_internal_value(self, data):
+        try:
+            return from_wire(data)
+        except CiphertextError as e:
+            raise serializers.ValidationError(str(e))
+
 class ConversationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conversation
@@ -9,6 +22,7 @@ class ConversationSerializer(serializers.ModelSerializer):
 
 class MessageSerializer(serializers.ModelSerializer):
     sender = serializers.CharField(source="sender.username", read_only=True)
+    ciphertext = CiphertextField()
 
     class Meta:
         model = Message
@@ -0,0 +1,470 @@
+import asyncio
+import importlib
+import json
+import random
+import threading
+import tracemalloc
+import uuid
+import zlib
+from datetime import timedelta
+from unittest import mock
+
+import msgpack
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models import Max
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.accounts import blocks
+
+from . import archive, backpressure, export, framing, history, inbox, live, membership, views
+from .backpressure import TokenBucket
+from .consumers import ChatConsumer
+from .models import Conversation, InboxEntry, Message
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "chat-tests"}}
+
+
+async def connect(user, conversation, query="", subprotocols=None):
+    app = URLRouter([path("ws/chat/<uuid:conversation_id>/", ChatConsumer.as_asgi())])
+    ws = WebsocketCommunicator(app, f"/ws/chat/{conversation.id}/{query}", subprotocols=subprotocols)
+    ws.scope["user"] = user
+    connected, _ = await ws.connect()
+    assert connected
+    return ws
+
+
+async def frames(ws, timeout=0.2):
+    """Everything the socket sends until it goes quiet"""
+    out = []
+    while not await ws.receive_nothing(timeout):
+        out.append(await ws.receive_json_from())
+    return out
+
+
+class TakeAllTests(SimpleTestCase):
+    def test_refused_by_second_bucket_spends_nothing(self):
+        socket, user = TokenBucket(rate=5, burst=3), TokenBucket(rate=2, burst=1)
+        user.tokens = 0
+        self.assertIs(backpressure.take_all(socket, user), user)
+        self.assertGreaterEqual(socket.tokens, 3)
+        self.assertAlmostEqual(user.retry_after(), 0.5, places=1)
+
+    def test_charges_every_bucket(self):
+        socket, user = TokenBucket(rate=5, burst=3), TokenBucket(rate=2, burst=2)
+        self.assertIsNone(backpressure.take_all(socket, user))
+        self.assertLess(socket.tokens, 3)
+        self.assertLess(user.tokens, 2)
+
+
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class BinaryFramingTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("binary_me")
+        self.conv = Conversation.objects.create()
+        self.conv.participants.add(self.user)
+
+    def test_send_errors_use_the_negotiated_framing(self):
+        async def run():
+            ws = await connect(self.user, self.conv, subprotocols=[framing.SUBPROTOCOL])
+            await ws.send_to(bytes_data=msgpack.packb({"action": "send", "ciphertext": b""}))
+            out = await ws.receive_output(timeout=1)
+            await ws.disconnect()
+            return out
+
+        out = asyncio.run(run())
+        self.assertIn("bytes", out)
+        self.assertEqual(msgpack.unpackb(out["bytes"]),
+                         {"event": "error", "conversation": str(self.conv.id), "error": "ciphertext required"})
+
+
+class CiphertextMigrationTests(SimpleTestCase):
+    def test_old_rows_keep_their_text_even_when_it_looks_like_base64(self):
+        raw = importlib.import_module("apps.chat.migrations.0010_convert_ciphertext")._raw
+        for text in ("okay", "haha", "hello123", "héllo"):
+            self.assertEqual(raw(1, text), text.encode())
+
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class InboxQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.me = User.objects.create_user("inbox_me")
+
+    def _grow(self, n):
+        for i in range(Conversation.objects.count(), n):
+            peer = User.objects.create_user(f"inbox_peer_{i}")
+            conv = Conversation.objects.create()
+            conv.participants.add(self.me, peer)
+            inbox.record_message(conv, peer, b"x")
+
+    def test_inbox_page_is_one_query_whatever_the_inbox_size(self):
+        for n in (1, 10, 60):
+            self._grow(n)
+            request = APIRequestFactory().get("/api/conversations/list/")
+            force_authenticate(request, user=self.me)
+            with self.assertNumQueries(1):
+                response = async_to_sync(views.list_conversations)(request)
+                response.render()
+            self.assertEqual(len(response.data), min(n, 50))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CHAT_USER_SEND_RATE=2)
+class SendThrottleTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("throttle_me")
+        self.conv = Conversation.objects.create()
+        self.conv.participants.add(self.user)
+
+    def test_user_bucket_refusal_reports_its_own_wait(self):
+        async def run():
+            ws = await connect(self.user, self.conv)
+            await frames(ws)
+            backpressure.user_bucket(self.user.id).tokens = 0
+            await ws.send_json_to({"action": "send", "ciphertext": "aGk="})
+            out = await frames(ws)
+            await ws.disconnect()
+            return out
+
+        throttled = [f for f in asyncio.run(run()) if f.get("event") == "throttled"]
+        self.assertEqual(len(throttled), 1)
+        # the socket's own bucket is full; the wait is the user bucket's (1 token at 2/s)
+        self.assertGreater(throttled[0]["retry_after"], 0.3)
+        # tied to the conversation, so the client can hand the draft back
+        self.assertEqual(throttled[0]["conversation"], str(self.conv.id))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CHAT_OUTBOX_LIMIT=2, CHAT_SLOW_CONSUMER_POLICY="resync")
+class SlowConsumerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("slow_me")
+        self.conv = Conversation.objects.create()
+        self.conv.participants.add(self.user)
+        self.messages = [Message.objects.create(conversation=self.conv, sender=self.user, ciphertext=b"x")
+                         for _ in range(5)]
+
+    def test_dropped_backlog_resyncs_the_conversation(self):
+        async def run():
+            ws = await connect(self.user, self.conv)
+            await frames(ws)
+            layer = get_channel_layer()
+            for message in self.messages:
+                await layer.group_send(live.group_name(self.conv.id), live.message_event(message))
+            out = await frames(ws, timeout=0.5)
+            await ws.disconnect()
+            return [f for frame in out for f in frame.get("batch", [frame])]
+
+        # the first frame goes out at once; the rest wait out the batch window and overflow the outbox
+        with mock.patch.object(framing, "BATCH_WINDOW", 0.3):
+            out = asyncio.run(run())
+        self.assertIn({"event": "resync", "conversation": str(self.conv.id)}, out)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER)
+class ReplayFailureTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("replay_me")
+        self.conv = Conversation.objects.create()
+        self.conv.participants.add(self.user)
+        self.seen = Message.objects.create(conversation=self.conv, sender=self.user, ciphertext=b"a")
+        self.live = Message.objects.create(conversation=self.conv, sender=self.user, ciphertext=b"b")
+
+    def test_failed_replay_resyncs_and_delivers_parked_messages(self):
+        release = threading.Event()
+
+        def broken_page(*args, **kwargs):
+            release.wait(5)
+            raise RuntimeError("database went away")
+
+        async def run():
+            ws = await connect(self.user, self.conv, f"?last_id={self.seen.id}")
+            # arrives mid-replay, so it is parked until the replay ends
+            await get_channel_layer().group_send(live.group_name(self.conv.id), live.message_event(self.live))
+            await frames(ws)
+            release.set()
+            out = await frames(ws)
+            await ws.disconnect()
+            return out
+
+        with mock.patch("apps.chat.consumers.page_messages", broken_page), self.assertLogs("apps.chat.consumers"):
+            out = asyncio.run(run())
+        self.assertIn({"event": "resync", "conversation": str(self.conv.id)}, out)
+        self.assertEqual([f["id"] for f in out if "id" in f], [str(self.live.id)])
+
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CACHES=LOCAL_CACHE)
+class PresenceTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("presence_alice")
+        self.bob = User.objects.create_user("presence_bob")
+        self.carol = User.objects.create_user("presence_carol")
+        self.shared = Conversation.objects.create()
+        self.shared.participants.add(self.alice, self.bob)
+        self.elsewhere = Conversation.objects.create()
+        self.elsewhere.participants.add(self.bob, self.carol)
+
+    def test_peers_hear_presence_whatever_their_sockets_follow(self):
+        async def run():
+            bob = await connect(self.bob, self.elsewhere)  # not following the shared conversation
+            carol = await connect(self.carol, self.elsewhere)
+            await frames(bob)
+            await frames(carol)
+            alice = await connect(self.alice, self.shared)
+            heard = await frames(bob), await frames(carol)
+            await alice.disconnect()
+            heard += (await frames(bob),)
+            await bob.disconnect()
+            await carol.disconnect()
+            return heard
+
+        online, carol_heard, offline = asyncio.run(run())
+        self.assertEqual([(f["user"], f["online"]) for f in online], [("presence_alice", True)])
+        self.assertEqual([f for f in carol_heard if f.get("user") == "presence_alice"], [])
+        self.assertEqual([(f["user"], f["online"]) for f in offline], [("presence_alice", False)])
+
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, CACHES=LOCAL_CACHE)
+class RemovedParticipantTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user("removed_alice")
+        self.bob = User.objects.create_user("removed_bob")
+        self.conv = Conversation.objects.create()
+        self.conv.participants.add(self.alice, self.bob)
+
+    def _run(self, remove):
+        async def run():
+            alice = await connect(self.alice, self.conv)
+            bob = await connect(self.bob, self.conv)
+            await frames(alice)
+            await frames(bob)
+            await sync_to_async(remove)()
+            dropped = await frames(bob)
+            await alice.send_json_to({"action": "send", "ciphertext": "aGk="})
+            after = await frames(bob)
+            await alice.disconnect()
+            await bob.disconnect()
+            return dropped, after
+
+        return asyncio.run(run())
+
+    def test_removed_participant_stops_receiving(self):
+        dropped, after = self._run(lambda: self.conv.participants.remove(self.bob))
+        self.assertEqual(dropped, [{"event": "error", "conversation": str(self.conv.id), "error": "forbidden"}])
+        self.assertEqual(after, [])
+
+    def test_message_already_in_flight_at_removal_is_not_delivered(self):
+        message = Message.objects.create(conversation=self.conv, sender=self.alice, ciphertext=b"x")
+
+        async def run():
+            bob = await connect(self.bob, self.conv)
+            await frames(bob)
+            layer = get_channel_layer()
+            # both land in bob's channel before he handles either: the removal,
+            # then a message fanned out before he left the group
+            await layer.group_send(blocks.group_name(self.bob.id),
+                                   {"type": membership.REMOVED, "conversation": str(self.conv.id)})
+            await layer.group_send(live.group_name(self.conv.id), live.message_event(message))
+            out = await frames(bob)
+            await bob.disconnect()
+            return out
+
+        self.assertEqual(asyncio.run(run()),
+                         [{"event": "error", "conversation": str(self.conv.id), "error": "forbidden"}])
+
+    def test_clearing_from_the_user_side_stops_it_too(self):
+        dropped, after = self._run(lambda: self.bob.conversations.clear())
+        self.assertEqual([f["error"] for f in dropped], ["forbidden"])
+        self.assertEqual(after, [])
+
+
+class DeletedSenderArchiveTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("arch_alice")
+        self.bob = User.objects.create_user("arch_bob")
+        self.conv = Conversation.objects.create()
+        self.conv.participants.add(self.alice, self.bob)
+        # alternating senders, then all of it read and archived in segments of 4
+        self.ids = [Message.objects.create(conversation=self.conv, sender=(self.alice, self.bob)[i % 2],
+                                           ciphertext=b"x").id for i in range(12)]
+        InboxEntry.objects.filter(conversation=self.conv).update(last_read_id=self.ids[-1])
+        self.assertEqual(archive.tier_conversation(self.conv.id, Message.objects.latest("id").created_at, 4), 11)
+        self.bob.delete()
+        self.conv.refresh_from_db()
+
+    def test_pages_count_only_surviving_rows(self):
+        # bob's archived rows are gone (his hot one went with him); alice's six remain
+        rows, has_more = history.page_message_data(self.conv, limit=4)
+        self.assertEqual([r["sender"] for r in rows], ["arch_alice"] * 4)
+        self.assertTrue(has_more)
+        oldest = history.resolve_cursor(self.conv, self.ids[0])
+        rows, has_more = history.page_message_data(self.conv, after=oldest, limit=4)
+        self.assertEqual((len(rows), has_more), (4, True))
+        rows, has_more = history.page_message_data(self.conv, after=oldest, limit=5)
+        self.assertEqual((len(rows), has_more), (5, False))
+
+    def test_restore_skips_rows_of_deleted_senders(self):
+        self.assertEqual(archive.restore(self.conv.id), 6)
+        connection.check_constraints()
+        self.assertEqual(Message.objects.filter(conversation=self.conv).count(), 6)
+
+
+class UnreadCountTests(TransactionTestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(f"unread_{i}") for i in range(4)]
+        self.convs = []
+        for _ in range(3):
+            conv = Conversation.objects.create()
+            conv.participants.add(*self.users)
+            self.convs.append(conv)
+
+    def _worker(self, seed, ops, errors):
+        rng = random.Random(seed)
+        try:
+            for _ in range(ops):
+                conv, user = rng.choice(self.convs), rng.choice(self.users)
+                op = rng.random()
+                for attempt in range(20):
+                    try:
+                        if op < 0.4:
+                            inbox.record_message(conv, user, b"x")
+                        elif op < 0.6:
+                            batch = [Message(conversation=rng.choice(self.convs), sender=rng.choice(self.users),
+                                             ciphertext=b"x") for _ in range(rng.randint(2, 5))]
+                            inbox.record_messages(batch)
+                        else:
+                            last = conv.messages.order_by("-id").values_list("id", flat=True).first()
+                            if last:
+                                inbox.mark_read(user, conv.id, rng.randint(max(1, last - 10), last + 2))
+                        break
+                    except OperationalError:  # sqlite: database is locked
+                        pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close_old_connections()
+
+    def test_counts_stay_exact_under_concurrent_sends_and_reads(self):
+        errors = []
+        threads = [threading.Thread(target=self._worker, args=(n, 40, errors)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertGreater(Message.objects.count(), 0)
+        for e in InboxEntry.objects.filter(conversation__in=self.convs):
+            msgs = Message.objects.filter(conversation_id=e.conversation_id).exclude(sender_id=e.user_id)
+            if e.last_read_id is not None:
+                msgs = msgs.filter(id__gt=e.last_read_id)
+            self.assertEqual(e.unread_count, msgs.count(), f"user {e.user_id} conv {e.conversation_id}")
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class MarkReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.member, self.peer, self.outsider = (User.objects.create_user(f"read_{i}") for i in range(3))
+        self.conv = Conversation.objects.create()
+        self.conv.participants.add(self.member, self.peer)
+        self.msg = inbox.record_message(self.conv, self.peer, b"x")
+
+    def _read(self, user, conversation_id):
+        self.client.force_login(user)
+        return self.client.post(f"/api/conversations/{conversation_id}/read/", {"message_id": self.msg.id},
+                                content_type="application/json")
+
+    def test_member_non_member_and_missing_conversation(self):
+        resp = self._read(self.member, self.conv.id)
+        self.assertEqual((resp.status_code, resp.json()["unread"]), (200, 0))
+        self.assertEqual(self._read(self.outsider, self.conv.id).status_code, 403)
+        self.assertEqual(self._read(self.member, uuid.uuid4()).status_code, 404)
+
+
+@override_settings(CHAT_EXPORT_CHUNK=200)
+class ExportTests(TestCase):
+    SEGMENT = 100
+
+    def setUp(self):
+        self.a = User.objects.create_user("export_a")
+        self.b = User.objects.create_user("export_b")
+
+    def _conversation(self, n):
+        """n messages, the oldest tenth of them archived; returns (conversation, messages archived)"""
+        conv = Conversation.objects.create()
+        conv.participants.add(self.a, self.b)
+        cutoff = timezone.now() - timedelta(days=1)
+        old, recent = cutoff - timedelta(days=30), timezone.now() - timedelta(hours=1)
+        with archive.explicit_timestamps(Message):
+            Message.objects.bulk_create(
+                (Message(conversation=conv, sender=self.a if i % 2 else self.b, ciphertext=b"x" * 256,
+                         created_at=(old if i < n // 10 else recent) + timedelta(milliseconds=i))
+                 for i in range(n)), batch_size=1000)
+        InboxEntry.objects.filter(conversation=conv).update(last_read_id=conv.messages.aggregate(n=Max("id"))["n"])
+        archived = archive.tier_conversation(conv.id, cutoff, self.SEGMENT)
+        conv.refresh_from_db()
+        return conv, archived
+
+    @staticmethod
+    async def _consume(conv, after, gz):
+        """Drain export.stream as the ASGI server would; returns the exported ids"""
+        ids, pending = [], b""
+        d = zlib.decompressobj(31) if gz else None
+        async for part in export.stream(conv, after, gz):
+            lines = (pending + (d.decompress(part) if d else part)).split(b"\n")
+            pending = lines.pop()
+            ids += [json.loads(line)["id"] for line in lines]
+        return ids
+
+    @staticmethod
+    def _peak(conv):
+        """Peak Python memory of streaming a gzipped export; the parts are only counted,
+        since decompressing them here would measure the reader, not the server"""
+        async def drain():
+            async for _ in export.stream(conv, None, True):
+                pass
+
+        tracemalloc.start()
+        try:
+            async_to_sync(drain)()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_every_message_once_in_order_from_both_tiers(self):
+        conv, archived = self._conversation(1000)
+        self.assertEqual(archived, 100)
+        ids = list(Message.objects.order_by().values_list("id", flat=True))
+        for gz in (False, True):
+            exported = async_to_sync(self._consume)(conv, None, gz)
+            self.assertEqual(len(exported), 1000)
+            self.assertEqual(exported, sorted(exported))
+            self.assertEqual(exported[archived:], sorted(ids))
+
+    def test_resumes_from_inside_either_tier(self):
+        conv, archived = self._conversation(1000)
+        full = async_to_sync(self._consume)(conv, None, False)
+        for k in (archived // 2, (archived + 1000) // 2):
+            after = history.resolve_cursor(conv, str(full[k]))
+            self.assertEqual(async_to_sync(self._consume)(conv, after, False), full[k + 1:])
+
+    def test_memory_does_not_grow_with_history(self):
+        small, _ = self._conversation(1000)
+        large, _ = self._conversation(10000)
+        self._peak(small)  # first-use allocations (imports, compiled queries) out of the way
+        self.assertLess(self._peak(large), 2 * self._peak(small))
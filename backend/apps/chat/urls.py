@@ -3,7 +3,11 @@ from . import views
 
 urlpatterns = [
     path("conversations/list/", views.list_conversations),
+    path("conversations/presence/", views.conversation_presence),
+    path("conversations/unread/", views.unread_counts),
     path("conversations/", views.get_or_create_conversation),
     path("conversations/<uuid:conversation_id>/messages/", views.list_messages),
     path("conversations/<uuid:conversation_id>/messages/post/", views.post_message),
+    path("conversations/<uuid:conversation_id>/messages/export/", views.export_messages),
+    path("conversations/<uuid:conversation_id>/read/", views.mark_read),
 ]
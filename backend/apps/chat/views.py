@@ -1,24 +1,71 @@
+from uuid import UUID
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Conversation, Message
+from pookiechat import versions
+from pookiechat.pagination import parse_limit
+from .models import Conversation
 from .serializers import ConversationSerializer, MessageSerializer
+from . import export, inbox, live, membership, presence
+from .ciphertext import CiphertextError, from_wire
+from .history import CursorError, page_message_data, resolve_cursor
 
-@api_view(["GET"])  # list my conversations
+@versions.long_poll(lambda request, user: versions.user_key(user.id))
+@api_view(["GET"])  # list my conversations, most recent activity first: ?before=<conversation id>&limit=
 @permission_classes([IsAuthenticated])
 def list_conversations(request):
-    convs = Conversation.objects.filter(participants=request.user).order_by("-created_at")
-    data = [
-        {
-            **ConversationSerializer(c).data,
-            "peers": [u.username for u in c.participants.all() if u != request.user],
-            "last_at": c.messages.last().created_at.isoformat() if c.messages.exists() else None,
-        }
-        for c in convs
-    ]
-    return Response(data)
+    tag = versions.etag(versions.user_key(request.user.id))
+    if versions.not_modified(request, tag):
+        return versions.conditional(Response(status=304), tag)
+    before = request.query_params.get("before") or None
+    if before is not None:
+        try:
+            before = UUID(before)
+        except ValueError:
+            return Response({"error": "before must be a conversation id"}, status=400)
+    entries, has_more = inbox.page_inbox(request.user, before=before, limit=parse_limit(request.query_params.get("limit")))
+    resp = Response([inbox.entry_data(e) for e in entries])
+    resp["X-Has-More"] = "1" if has_more else "0"
+    return versions.conditional(resp, tag)
+
+def _check_member(conversation_id, user):
+    """403/404 response unless user is in the conversation; the allowed path costs no query"""
+    if membership.is_member(conversation_id, user.id):
+        return None
+    get_object_or_404(Conversation, id=conversation_id)
+    return Response({"error": "forbidden"}, status=403)
+
+@api_view(["GET"])  # online / last seen for the peers of my most recent conversations
+@permission_classes([IsAuthenticated])
+def conversation_presence(request):
+    entries, _ = inbox.page_inbox(request.user, limit=parse_limit(request.query_params.get("limit")))
+    return Response(presence.bulk({peer for e in entries for peer in e["peers"]}))
+
+@api_view(["GET"])  # {conversation id: unread count} for all my conversations with unread messages
+@permission_classes([IsAuthenticated])
+def unread_counts(request):
+    tag = versions.etag(versions.user_key(request.user.id))
+    if versions.not_modified(request, tag):
+        return versions.conditional(Response(status=304), tag)
+    return versions.conditional(Response(inbox.unread_counts(request.user)), tag)
+
+@api_view(["POST"])  # advance my read cursor: {"message_id": <id>}
+@permission_classes([IsAuthenticated])
+def mark_read(request, conversation_id):
+    message_id = request.data.get("message_id")
+    if isinstance(message_id, str) and message_id.isdigit():
+        message_id = int(message_id)
+    if not isinstance(message_id, int) or isinstance(message_id, bool):
+        return Response({"error": "message_id required"}, status=400)
+    unread = inbox.mark_read(request.user, conversation_id, message_id)
+    if unread is None:
+        get_object_or_404(Conversation, id=conversation_id)
+        return Response({"error": "forbidden"}, status=403)
+    return Response({"conversation": str(conversation_id), "unread": unread})
 
 @api_view(["POST"])  # create/get conversation between two usernames
 @permission_classes([IsAuthenticated])
@@ -29,30 +76,67 @@ def get_or_create_conversation(request):
     users = list(User.objects.filter(username__in=usernames))
     if len(users) != 2:
         return Response({"error": "users not found"}, status=404)
-    # naive conversation fetch
-    conv = Conversation.objects.filter(participants=users[0]).filter(participants=users[1]).first()
+    key = Conversation.pair_key_for(users[0].id, users[1].id)
+    conv = Conversation.objects.filter(pair_key=key).first()
     if not conv:
-        conv = Conversation.objects.create()
-        conv.participants.add(*users)
+        try:
+            with transaction.atomic():
+                conv = Conversation.objects.create(pair_key=key)
+                conv.participants.add(*users)
+        except IntegrityError:
+            # lost the race to a concurrent request; its row is committed by now
+            conv = Conversation.objects.get(pair_key=key)
     return Response(ConversationSerializer(conv).data)
 
-@api_view(["GET"])  # list messages
+@versions.long_poll(lambda request, user, conversation_id: versions.conversation_key(conversation_id))
+@api_view(["GET"])  # list messages, keyset paged: ?before=|after=<id or iso ts>&limit=
 @permission_classes([IsAuthenticated])
 def list_messages(request, conversation_id):
+    denied = _check_member(conversation_id, request.user)
+    if denied:
+        return denied
+    tag = versions.etag(versions.conversation_key(conversation_id))
+    if versions.not_modified(request, tag):
+        return versions.conditional(Response(status=304), tag)
     conv = get_object_or_404(Conversation, id=conversation_id)
-    if not conv.participants.filter(id=request.user.id).exists():
-        return Response({"error": "forbidden"}, status=403)
-    data = MessageSerializer(conv.messages.all(), many=True).data
-    return Response(data)
+    try:
+        before = resolve_cursor(conv, request.query_params.get("before"))
+        after = resolve_cursor(conv, request.query_params.get("after"))
+    except CursorError as e:
+        return Response({"error": str(e)}, status=400)
+    data, has_more = page_message_data(conv, before=before, after=after, limit=parse_limit(request.query_params.get("limit")))
+    resp = Response(data)
+    resp["X-Has-More"] = "1" if has_more else "0"
+    return versions.conditional(resp, tag)
+
+@api_view(["GET"])  # whole history as NDJSON, oldest first: ?after=<message id> resumes, ?gzip=1 compresses
+@permission_classes([IsAuthenticated])
+def export_messages(request, conversation_id):
+    denied = _check_member(conversation_id, request.user)
+    if denied:
+        return denied
+    conv = get_object_or_404(Conversation, id=conversation_id)
+    try:
+        after = resolve_cursor(conv, request.query_params.get("after"))
+    except CursorError as e:
+        return Response({"error": str(e)}, status=400)
+    gzip = request.query_params.get("gzip") in ("1", "true")
+    resp = StreamingHttpResponse(
+        export.stream(conv, after, gzip), content_type="application/gzip" if gzip else "application/x-ndjson")
+    resp["Content-Disposition"] = f'attachment; filename="conversation-{conv.id}.ndjson{".gz" if gzip else ""}"'
+    return resp
 
 @api_view(["POST"])  # post encrypted message
 @permission_classes([IsAuthenticated])
 def post_message(request, conversation_id):
+    denied = _check_member(conversation_id, request.user)
+    if denied:
+        return denied
     conv = get_object_or_404(Conversation, id=conversation_id)
-    if not conv.participants.filter(id=request.user.id).exists():
-        return Response({"error": "forbidden"}, status=403)
-    ciphertext = request.data.get("ciphertext")
-    if not isinstance(ciphertext, str):
-        return Response({"error": "ciphertext required"}, status=400)
-    m = Message.objects.create(conversation=conv, sender=request.user, ciphertext=ciphertext)
+    try:
+        ciphertext = from_wire(request.data.get("ciphertext"))
+    except CiphertextError as e:
+        return Response({"error": str(e)}, status=400)
+    m = inbox.record_message(conv, request.user, ciphertext)
+    live.publish_on_commit(m)
     return Response(MessageSerializer(m).data)
@@ -0,0 +1,142 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Uploaded images are stored as sent, then resized off the request path in
+# a process pool: one WebP per size in MEDIA_IMAGE_SIZES, EXIF orientation
+# applied and all metadata (EXIF, GPS, ICC, XMP) dropped. The variant names
+# land on the owning row when the job finishes; until then the API keeps
+# serving the original.
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+WEBP_QUALITY = 80
+
+log = logging.getLogger(__name__)
+
+# sent with sender=model, pk=... once a row's variants are written; that
+# write is a queryset update, so post_save listeners never see it
+variants_recorded = Signal()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def probe(upload):
+    """Reject non-images and decompression bombs from the header alone (no decode)"""
+    try:
+        with Image.open(upload) as im:
+            fmt, (w, h) = im.format, im.size
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidImage("not an image")
+    finally:
+        upload.seek(0)
+    if fmt not in ALLOWED_FORMATS:
+        raise InvalidImage(f"unsupported image format {fmt}")
+    if w * h > settings.MEDIA_IMAGE_MAX_PIXELS:
+        raise InvalidImage("image dimensions too large")
+
+
+def _variant_name(name, size):
+    return f"{os.path.splitext(name)[0]}_{size}.webp"
+
+
+def render_variants(src, sizes):
+    """Worker side: write <src stem>_<size>.webp next to src for each size.
+
+    Pure Pillow, no Django, so it runs in a spawned process. Returns the sizes written.
+    """
+    if all(os.path.exists(_variant_name(src, size)) for size in sizes):
+        return list(sizes)  # same bytes uploaded before (content-addressed): nothing to redo
+    out = []
+    with Image.open(src) as im:
+        # JPEGs decode straight at a reduced scale (DCT scaling), still >= the largest variant
+        im.draft("RGB", (max(sizes), max(sizes)))
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") else "RGB")
+        for size in sorted(sizes, reverse=True):
+            im.thumbnail((size, size), Image.LANCZOS)  # never upscales; shrinks from the previous size
+            # no exif/icc args: metadata is dropped; written aside, renamed into place
+            path = _variant_name(src, size)
+            part = f"{path}.{uuid4().hex}.part"
+            im.save(part, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(part, path)
+            out.append(size)
+    return out
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the web process has threads (reach flusher, channels)
+            _pool = ProcessPoolExecutor(settings.MEDIA_IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def _record(model, pk, field, name, sizes):
+    variants = {str(size): _variant_name(name, size) for size in sizes}
+    # only if the row still points at the same upload; a newer one has its own job
+    if model.objects.filter(pk=pk, **{field: name}).update(**{f"{field}_variants": variants}):
+        variants_recorded.send(sender=model, pk=pk)
+
+
+def process(instance, field):
+    """Queue variant generation for instance.<field> once the surrounding transaction commits"""
+    name = getattr(instance, field).name
+    model, pk = type(instance), instance.pk
+    sizes = settings.MEDIA_IMAGE_SIZES
+
+    def run():
+        src = default_storage.path(name)
+        if not settings.MEDIA_IMAGE_WORKERS:  # inline, for dev and management commands
+            try:
+                written = render_variants(src, sizes)
+            except Exception:
+                log.exception("image variants failed for %s", name)
+                return
+            _record(model, pk, field, name, written)
+            return
+
+        def done(future):
+            try:
+                written = future.result()
+            except Exception:
+                log.exception("image variants failed for %s", name)
+                return
+            try:
+                _record(model, pk, field, name, written)
+            finally:
+                close_old_connections()
+
+        _get_pool().submit(render_variants, src, sizes).add_done_callback(done)
+
+    transaction.on_commit(run)
+
+
+def variant_url(request, file, variants, want):
+    """URL of the smallest variant at least `want` px (else the largest), or the original.
+
+    `file` is a FieldFile or, from values() rows, the stored name.
+    """
+    if not file:
+        return ""
+    if variants:
+        sizes = sorted(int(s) for s in variants)
+        pick = next((s for s in sizes if s >= want), sizes[-1])
+        return request.build_absolute_uri(default_storage.url(variants[str(pick)]))
+    return request.build_absolute_uri(default_storage.url(file) if isinstance(file, str) else file.url)
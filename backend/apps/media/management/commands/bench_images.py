@@ -0,0 +1,81 @@
+import contextlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from apps.media.images import render_variants
+
+
+class Command(BaseCommand):
+    help = "Variant generation throughput: inline vs the process pool at several worker counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=48)
+        parser.add_argument("--size", default="3000x2000", help="source photo dimensions")
+        parser.add_argument("--workers", default="1,2,4",
+                            help="pool sizes to try; 0 is the inline path (MEDIA_IMAGE_WORKERS=0), always timed")
+
+    def handle(self, *args, **options):
+        w, h = (int(v) for v in options["size"].split("x"))
+        n = options["images"]
+        pools = [int(v) for v in options["workers"].split(",")]
+        if any(workers < 0 for workers in pools):
+            raise CommandError("--workers takes pool sizes of 0 or more")
+        sizes = settings.MEDIA_IMAGE_SIZES
+        tmp = tempfile.mkdtemp(prefix="bench_images_")
+        try:
+            # a photo-like source: noise over a gradient, saved as a JPEG with EXIF
+            base = Image.merge("RGB", [Image.linear_gradient("L").resize((w, h)),
+                                       Image.effect_noise((w, h), 40), Image.radial_gradient("L").resize((w, h))])
+            exif = Image.Exif()
+            exif[0x0112] = 6  # orientation: rotate 90
+            sources = []
+            for i in range(n):
+                path = os.path.join(tmp, f"src_{i}.jpg")
+                base.save(path, "JPEG", quality=90, exif=exif)
+                sources.append(path)
+            src_kb = os.path.getsize(sources[0]) / 1024
+            self.stdout.write(f"{n} images, {w}x{h} JPEG ({src_kb:.0f} KB), variants {sizes}, {os.cpu_count()} CPUs")
+
+            t0 = time.perf_counter()
+            for path in sources:
+                render_variants(path, sizes)
+            inline = time.perf_counter() - t0
+            self.stdout.write(f"{'inline':>10}: {n / inline:6.1f} images/s")
+
+            for workers in pools:
+                if workers == 0:
+                    continue  # inline, timed above
+                with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    list(pool.map(render_variants, sources[:workers], [sizes] * workers))  # warm up the workers
+                    self._clear(sources, sizes)
+                    t0 = time.perf_counter()
+                    list(pool.map(render_variants, sources, [sizes] * n))
+                    took = time.perf_counter() - t0
+                self.stdout.write(f"{f'{workers} worker' + ('s' if workers > 1 else ''):>10}: {n / took:6.1f} images/s")
+
+            stem = os.path.splitext(sources[0])[0]
+            out = []
+            for size in sizes:
+                with Image.open(f"{stem}_{size}.webp") as im:
+                    out.append(f"{size}: {im.size[0]}x{im.size[1]} {os.path.getsize(f'{stem}_{size}.webp') / 1024:.0f} KB"
+                               f"{' exif!' if im.getexif() else ''}")
+            self.stdout.write("variants  " + ", ".join(out))
+        finally:
+            shutil.rmtree(tmp)
+
+    @staticmethod
+    def _clear(sources, sizes):
+        """render_variants skips sources whose variants all exist; remove them so the next run renders"""
+        for path in sources:
+            stem = os.path.splitext(path)[0]
+            for size in sizes:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(f"{stem}_{size}.webp")
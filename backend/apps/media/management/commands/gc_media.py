@@ -0,0 +1,95 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.media import refs
+from apps.media.models import Blob
+from apps.media.storage import BLOB_DIR, digest_of
+
+
+class Command(BaseCommand):
+    help = "Recount blob references from the tables and delete blobs (and their variants) nothing points at"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=float, default=24,
+                            help="keep unreferenced blobs this young (uploads still being saved)")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        dry = options["dry_run"]
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+
+        live = {}
+        for model, field in refs.tracked():
+            for name in model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).values_list(field, flat=True).iterator():
+                digest = digest_of(name)
+                if digest:
+                    live[digest] = live.get(digest, 0) + 1
+
+        fixed = 0
+        for blob in Blob.objects.only("sha256", "refs").iterator():
+            actual = live.get(blob.sha256, 0)
+            if blob.refs != actual:
+                fixed += 1
+                if not dry:
+                    Blob.objects.filter(sha256=blob.sha256).update(refs=actual)
+
+        # group every file under blobs/ by the digest it belongs to (original + variants)
+        files = {}
+        root = os.path.join(settings.MEDIA_ROOT, BLOB_DIR)
+        for dirpath, _, names in os.walk(root):
+            for n in names:
+                full = os.path.join(dirpath, n)
+                digest = digest_of(os.path.relpath(full, settings.MEDIA_ROOT).replace(os.sep, "/"))
+                if digest:
+                    files.setdefault(digest, []).append(full)
+
+        # the recount, not the stored refs, decides what is dead
+        dead = set(Blob.objects.filter(last_used_at__lt=cutoff).exclude(sha256__in=live).values_list("sha256", flat=True))
+        known = set(Blob.objects.filter(sha256__in=list(files)).values_list("sha256", flat=True))
+        old = cutoff.timestamp()
+        orphans = {d for d, paths in files.items()
+                   if d not in known and d not in live and all(os.path.getmtime(p) < old for p in paths)}
+
+        removed = freed = deleted = 0
+        for digest in dead | orphans:
+            paths = files.get(digest, [])
+            size = sum(os.path.getsize(p) for p in paths)
+            if not dry and not self._delete_blob(digest, cutoff, paths, orphan=digest not in dead):
+                continue  # reused since the recount
+            deleted += digest in dead
+            removed += len(paths)
+            freed += size
+        verb = "would remove" if dry else "removed"
+        self.stdout.write(f"{len(live)} referenced blobs, {fixed} refcount(s) corrected; "
+                          f"{verb} {deleted} unreferenced + {len(orphans)} orphaned blobs "
+                          f"({removed} files, {freed / 1024 / 1024:.1f} MB)")
+
+    @classmethod
+    def _delete_blob(cls, digest, cutoff, paths, orphan=False):
+        """Delete the row only if it is still unreferenced and unused, and the files only with it.
+
+        An upload may have reused the blob since the recount. Its write to the
+        row waits on this transaction's lock, and it rewrites the files if it
+        then finds them gone (see ContentAddressedStorage._save). Orphaned files
+        get a placeholder row first, so the same lock covers them.
+        """
+        with transaction.atomic():
+            if orphan:
+                _, created = Blob.objects.get_or_create(
+                    sha256=digest, defaults={"name": "", "size": 0, "last_used_at": cutoff - timedelta(seconds=1)})
+                if not created:
+                    return False
+            if not Blob.objects.filter(sha256=digest, refs=0, last_used_at__lt=cutoff).delete()[0]:
+                return False
+            cls._unlink(paths)
+        return True
+
+    @staticmethod
+    def _unlink(paths):
+        for path in paths:
+            os.remove(path)
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-18 07:42
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def from_created_at(apps, schema_editor):
+    # existing blobs were last used no later than they were stored
+    apps.get_model("media", "Blob").objects.update(last_used_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='blob',
+            name='media_blob_refs_idx',
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(from_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['refs', 'last_used_at'], name='media_blob_refs_used_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import models
+from django.utils import timezone
+
+class Blob(models.Model):
+    """One stored file, named by the SHA-256 of its bytes (see apps.media.storage).
+
+    `refs` counts the model fields pointing at it; unreferenced blobs are
+    removed by the gc_media command once `last_used_at` (bumped whenever an
+    upload resolves to this blob) is past its grace period.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)  # storage name: blobs/ab/cd/<sha256><ext>
+    size = models.BigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["refs", "last_used_at"], name="media_blob_refs_used_idx"),
+        ]
@@ -0,0 +1,63 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+from .models import Blob
+from .storage import digest_of
+
+# Blob refcounts, kept by signals on each file field that stores blobs. The
+# name a row was loaded with is remembered at post_init, so a save only
+# touches Blob when the field actually changed. Queryset .update()/.delete()
+# bypass this; gc_media recounts from the tables before deleting anything.
+
+_UNKNOWN = object()
+_tracked = []
+
+
+def _adjust(name, delta):
+    digest = digest_of(name)
+    if digest is None:
+        return
+    qs = Blob.objects.filter(sha256=digest)
+    if delta < 0:
+        qs = qs.filter(refs__gt=0)
+    qs.update(refs=F("refs") + delta)
+
+
+def _name(value):
+    return getattr(value, "name", value) or ""
+
+
+def track(model, field):
+    attr = f"_media_{field}_name"
+
+    def loaded(sender, instance, **kwargs):
+        value = instance.__dict__.get(field, _UNKNOWN)
+        instance.__dict__[attr] = value if value is _UNKNOWN else _name(value)
+
+    def saving(sender, instance, **kwargs):
+        if instance.__dict__.get(attr, _UNKNOWN) is _UNKNOWN and not instance._state.adding:
+            # the field was deferred when loaded: read what the row holds now
+            instance.__dict__[attr] = _name(model.objects.filter(pk=instance.pk).values_list(field, flat=True).first())
+
+    def saved(sender, instance, created, **kwargs):
+        new = _name(getattr(instance, field))
+        old = "" if created else instance.__dict__.get(attr, "")
+        if new != old:
+            _adjust(new, 1)
+            _adjust(old, -1)
+        instance.__dict__[attr] = new
+
+    def deleted(sender, instance, **kwargs):
+        _adjust(_name(getattr(instance, field)), -1)
+
+    uid = f"media-refs:{model._meta.label}.{field}"
+    post_init.connect(loaded, sender=model, weak=False, dispatch_uid=uid)
+    pre_save.connect(saving, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
+    _tracked.append((model, field))
+
+
+def tracked():
+    """(model, field) pairs whose values reference blobs"""
+    return list(_tracked)
@@ -0,0 +1,64 @@
+import hashlib
+import os
+import re
+from uuid import uuid4
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+# Files are stored under the hash of their content, so identical uploads
+# share one file, a stored name never changes meaning, and it can be cached
+# forever. Each blob gets a Blob row; apps.media.refs keeps its refcount.
+
+BLOB_DIR = "blobs"
+EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+_BLOB_RE = re.compile(rf"^{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})[^/]*$")
+
+
+def blob_name(digest, ext=""):
+    return f"{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def digest_of(name):
+    """SHA-256 behind a blob (or blob variant) name, None for legacy user-named files"""
+    m = _BLOB_RE.match(name or "")
+    return m.group(1) if m else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        return name  # the real name is picked from the content in _save
+
+    def _save(self, name, content):
+        sha = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            sha.update(chunk)
+            size += len(chunk)
+        content.seek(0)
+        ext = os.path.splitext(name)[1].lower()
+        digest = sha.hexdigest()
+        name = blob_name(digest, ext if ext in EXTENSIONS else "")
+        # claim the Blob row before looking at the file: gc_media only removes files
+        # together with a row it could still delete, so after this either the file
+        # is kept or it is already gone and gets written again below
+        from .models import Blob
+
+        if not Blob.objects.filter(sha256=digest).update(last_used_at=timezone.now()):
+            Blob.objects.get_or_create(sha256=digest, defaults={"name": name, "size": size})
+        full_path = self.path(name)
+        if not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # write aside and rename into place: a blob is never visible half-written
+            part = f"{full_path}.{uuid4().hex}.part"
+            if hasattr(content, "temporary_file_path"):
+                file_move_safe(content.temporary_file_path(), part)
+            else:
+                with open(part, "wb") as f:
+                    for chunk in content.chunks():
+                        f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(part, self.file_permissions_mode)
+            os.replace(part, full_path)  # a racing identical upload replaces equal bytes
+        return name
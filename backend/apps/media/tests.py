@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .management.commands.gc_media import Command as GcMedia
+from .models import Blob
+
+DATA = b"same bytes every time"
+
+
+class GcReuseTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.enterContext(override_settings(MEDIA_ROOT=root))
+        self.name = default_storage.save("avatars/a.png", ContentFile(DATA))
+        Blob.objects.filter(name=self.name).update(last_used_at=timezone.now() - timedelta(days=2))
+
+    def _gc(self):
+        call_command("gc_media", stdout=StringIO())
+
+    def test_unused_blob_is_collected(self):
+        self._gc()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(self.name))
+
+    def test_reuse_refreshes_last_used(self):
+        self.assertEqual(default_storage.save("posts/b.png", ContentFile(DATA)), self.name)
+        self._gc()
+        self.assertTrue(default_storage.exists(self.name))
+
+    def test_reuse_during_a_run_keeps_the_file(self):
+        delete_blob = GcMedia._delete_blob.__func__
+
+        def reused_meanwhile(cls, *args, **kwargs):
+            default_storage.save("posts/b.png", ContentFile(DATA))  # after the recount, before the delete
+            return delete_blob(cls, *args, **kwargs)
+
+        with mock.patch.object(GcMedia, "_delete_blob", classmethod(reused_meanwhile)):
+            self._gc()
+        self.assertTrue(Blob.objects.filter(name=self.name).exists())
+        self.assertTrue(os.path.exists(default_storage.path(self.name)))
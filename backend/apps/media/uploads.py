@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Stream every upload to a temp file, never memory, and cap its size.
+
+    An upload past MEDIA_UPLOAD_MAX_BYTES is abandoned (before reading the
+    body when Content-Length already says so); the view sees
+    `request.upload_too_large` and answers 413.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > settings.MEDIA_UPLOAD_MAX_BYTES + 64 * 1024:  # + form overhead
+            self.request.upload_too_large = True
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MEDIA_UPLOAD_MAX_BYTES:
+            self.request.upload_too_large = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
@@ -0,0 +1,46 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+
+from .storage import digest_of
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+LEGACY = "public, max-age=3600"  # user-named files from before content addressing can change
+
+
+@require_safe
+def serve(request, path):
+    """Media files. Blobs are immutable, so they're cached forever and revalidated by hash.
+
+    With MEDIA_ACCEL_REDIRECT (nginx internal location) or MEDIA_SENDFILE
+    (Apache/lighttpd) set, only headers are produced and the web server
+    sends the bytes; otherwise the file is streamed from disk.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    digest = digest_of(path)
+    etag = f'"{os.path.basename(path)}"' if digest else None
+    if etag and etag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]:
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_ACCEL_REDIRECT or settings.MEDIA_SENDFILE:
+        response = HttpResponse(content_type=mimetypes.guess_type(path)[0] or "application/octet-stream")
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT.rstrip("/") + "/" + path
+        else:
+            response["X-Sendfile"] = full_path
+    else:
+        response = FileResponse(open(full_path, "rb"))
+    if etag:
+        response["ETag"] = etag
+    response["Cache-Control"] = IMMUTABLE if digest else LEGACY
+    response["X-Content-Type-Options"] = "nosniff"
+    return response
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+
+class MetricsConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "apps.metrics"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from apps.chat import backpressure, membership
+        from apps.social import graph, reach
+        from . import consumers, registry
+        from .scope import install
+
+        connection_created.connect(install)
+        # counters the chat and social modules already keep for themselves
+        registry.register(registry.StatsCounter("pookie_chat_backpressure_total", "Socket backpressure events", backpressure.stats))
+        registry.register(registry.StatsCounter("pookie_social_graph_cache_total", "Follow graph cache lookups", graph.stats, label="result"))
+        registry.register(registry.Gauge("pookie_social_reach_pending", "Posts with reach counts waiting to flush", reach.buffer.pending))
+        registry.register(registry.Gauge("pookie_chat_membership_local", "Conversations in this worker's membership LRU", membership.local_size))
+        registry.register(registry.Gauge("pookie_ws_open_sockets", "Sockets open in this worker", consumers.open_sockets))
@@ -0,0 +1,54 @@
+import time
+from contextlib import contextmanager
+
+from . import registry
+from .scope import Scope, report_nplusone
+
+_open = {}  # consumer class name -> sockets open in this process
+
+
+class MeteredConsumer:
+    """Mix in ahead of a channels consumer to time every event it handles.
+
+    Events are labelled by channel message type (websocket.connect,
+    chat.message, ...); a receive handler can call scope.relabel(action) to
+    charge the frame to the action it carried instead.
+    """
+
+    async def dispatch(self, message):
+        consumer = type(self).__name__
+        event = message["type"]
+        if event == "websocket.connect":
+            _open[consumer] = _open.get(consumer, 0) + 1
+        elif event == "websocket.disconnect":  # its handler ends by raising StopConsumer
+            _open[consumer] = _open.get(consumer, 0) - 1
+        with measure(consumer, event):
+            await super().dispatch(message)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        data = text_data if text_data is not None else bytes_data
+        if data is not None:
+            consumer = type(self).__name__
+            registry.ws_frames.inc(consumer=consumer)
+            registry.ws_bytes.inc(len(data), consumer=consumer)
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+
+@contextmanager
+def measure(consumer, event):
+    """Time a block (which may await) and charge its DB queries to consumer/event"""
+    t0 = time.perf_counter()
+    with Scope(event) as scope:
+        try:
+            yield scope
+        finally:
+            label = scope.label
+            registry.ws_seconds.observe(time.perf_counter() - t0, consumer=consumer, event=label)
+            registry.ws_queries.observe(scope.queries, consumer=consumer, event=label)
+            if scope.queries:
+                registry.ws_db_seconds.inc(scope.db_seconds, consumer=consumer, event=label)
+                report_nplusone(scope, f"{consumer}:{label}")
+
+
+def open_sockets():
+    return sum(_open.values())
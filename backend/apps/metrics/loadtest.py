@@ -0,0 +1,205 @@
+import asyncio
+import base64
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import close_old_connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import path
+
+from apps.chat.consumers import ChatConsumer
+from apps.chat.models import InboxEntry
+from apps.social.models import Follow
+
+from . import registry
+from .scope import Scope
+from .synthetic import synthetic_users
+
+# Load harness over the synthetic data set (see seed_synthetic). REST
+# scenarios run on threads through the full middleware stack; socket clients
+# run on an asyncio loop against ChatConsumer with the in-memory channel
+# layer, at the same time. Every sample records latency and the DB queries
+# it ran, and summaries can be saved as a baseline and compared later.
+
+REST_SCENARIOS = ("conversations", "messages", "unread", "posts", "feed", "me")
+WS_SCENARIO = "ws_send"
+
+
+class Samples:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, queries):
+        with self._lock:
+            self.latency[name].append(seconds)
+            self.queries[name].append(queries)
+
+    def error(self, name):
+        with self._lock:
+            self.errors[name] += 1
+
+    def summary(self, wall):
+        out = {}
+        for name in sorted(set(self.latency) | set(self.errors)):
+            lat = sorted(self.latency[name])
+            q = self.queries[name]
+            out[name] = {
+                "count": len(lat),
+                "errors": self.errors[name],
+                "p50_ms": _pct(lat, 50) * 1000,
+                "p95_ms": _pct(lat, 95) * 1000,
+                "p99_ms": _pct(lat, 99) * 1000,
+                "rps": len(lat) / wall if wall else 0.0,
+                "queries": sum(q) / len(q) if q else 0.0,
+            }
+        return out
+
+
+def _pct(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+class Fixture:
+    """Who to log in as and what to read, picked once from the synthetic data"""
+
+    def __init__(self, prefix, n_users):
+        users = list(synthetic_users(prefix).order_by("id")[:n_users])
+        if len(users) < 2:
+            raise ValueError(f"no synthetic data for prefix {prefix!r}; run seed_synthetic first")
+        self.users = users
+        convs = defaultdict(list)
+        for uid, cid in InboxEntry.objects.filter(user__in=users).values_list("user_id", "conversation_id"):
+            convs[uid].append(str(cid))
+        self.conversations = convs
+        popular = (Follow.objects.filter(following__in=synthetic_users(prefix)).values("following__username")
+                   .annotate(n=Count("id")).order_by("-n").values_list("following__username", flat=True)[:50])
+        self.authors = list(popular) or [u.username for u in users]
+
+    def path(self, scenario, user, rng):
+        if scenario == "conversations":
+            return "/api/conversations/list/"
+        if scenario == "messages":
+            convs = self.conversations.get(user.id)
+            return f"/api/conversations/{rng.choice(convs)}/messages/" if convs else None
+        if scenario == "unread":
+            return "/api/conversations/unread/"
+        if scenario == "posts":
+            return f"/api/posts/?username={rng.choice(self.authors)}"
+        if scenario == "feed":
+            return "/api/feed/"
+        return "/api/me/"
+
+
+def run_rest(fixture, samples, threads, requests, scenarios):
+    def worker(user, seed):
+        rng = random.Random(seed)
+        client = Client()
+        client.force_login(user)
+        try:
+            for _ in range(requests):
+                scenario = rng.choice(scenarios)
+                url = fixture.path(scenario, user, rng)
+                if url is None:
+                    continue
+                t0 = time.perf_counter()
+                with Scope(scenario) as scope:
+                    resp = client.get(url)
+                elapsed = time.perf_counter() - t0
+                if resp.status_code >= 400:
+                    samples.error(scenario)
+                else:
+                    samples.add(scenario, elapsed, scope.queries)
+        finally:
+            close_old_connections()
+
+    pool = [threading.Thread(target=worker, args=(fixture.users[i % len(fixture.users)], i))
+            for i in range(threads)]
+    for t in pool:
+        t.start()
+    return pool
+
+
+async def run_ws(fixture, samples, sockets, messages, interval):
+    app = URLRouter([path("ws/chat/", ChatConsumer.as_asgi())])
+    users = [u for u in fixture.users if fixture.conversations.get(u.id)][:sockets]
+
+    async def client(i, user):
+        conv = fixture.conversations[user.id][0]
+        ws = WebsocketCommunicator(app, "/ws/chat/")
+        ws.scope["user"] = user
+        connected, _ = await ws.connect()
+        if not connected:
+            samples.error(WS_SCENARIO)
+            return
+        await ws.send_json_to({"action": "subscribe", "conversation_id": conv})
+        try:
+            for n in range(messages):
+                marker = base64.b64encode(f"lt-{i}-{n}".encode()).decode()
+                t0 = time.perf_counter()
+                await ws.send_json_to({"action": "send", "conversation_id": conv, "ciphertext": marker})
+                if not await _await_echo(ws, marker):
+                    samples.error(WS_SCENARIO)
+                    continue
+                samples.add(WS_SCENARIO, time.perf_counter() - t0, 0)
+                await asyncio.sleep(interval)
+        finally:
+            await ws.disconnect()
+
+    before = _send_queries()
+    await asyncio.gather(*(client(i, u) for i, u in enumerate(users)))
+    # the consumer runs in its own task, so its queries are read back from
+    # the metrics registry: send actions plus the group-commit flushes
+    sent = len(samples.latency[WS_SCENARIO])
+    samples.queries[WS_SCENARIO] = [(_send_queries() - before) / sent] * sent if sent else []
+
+
+def _send_queries():
+    return sum(value for name, labels, value in registry.ws_queries.samples()
+               if name.endswith("_sum") and dict(labels)["event"] in ("action:send", "flush"))
+
+
+async def _await_echo(ws, marker, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return False
+        try:
+            frame = json.loads(await ws.receive_from(timeout=left))
+        except asyncio.TimeoutError:
+            return False
+        for item in frame.get("batch", [frame]):
+            if item.get("ciphertext") == marker:
+                return True
+
+
+def compare(current, baseline, tolerance):
+    """Rows of (scenario, metric, baseline, current, regressed).
+
+    Only p95 latency and queries per request can fail a comparison; p50 and
+    p99 are shown for context (p99 over a few hundred samples is mostly noise).
+    """
+    rows = []
+    for name, now in current.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "queries"):
+            was, cur = base[metric], now[metric]
+            if metric == "queries":
+                regressed = cur > was + 0.5  # any extra query per request is a regression
+            else:
+                regressed = metric == "p95_ms" and was > 0 and cur > was * (1 + tolerance)
+            rows.append((name, metric, was, cur, regressed))
+    return rows
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+
+METRICS = "apps.metrics.middleware.MetricsMiddleware"
+
+
+class Command(BaseCommand):
+    help = ("Per-request cost of MetricsMiddleware and the query wrapper on a few read endpoints, "
+            "driven through the ASGI handler as in production")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user("bench_metrics")
+        try:
+            without = [m for m in settings.MIDDLEWARE if m != METRICS]
+            n = options["requests"]
+            for path in ("/api/me/", "/api/conversations/list/", "/api/feed/"):
+                with override_settings(MIDDLEWARE=without):
+                    off = asyncio.run(self._drive(user, path, n))
+                with override_settings(MIDDLEWARE=[METRICS] + without):
+                    on = asyncio.run(self._drive(user, path, n))
+                self.stdout.write(f"{path:<26} off {off * 1e6 / n:>7.1f} us/req   on {on * 1e6 / n:>7.1f} us/req"
+                                  f"   overhead {(on - off) * 1e6 / n:>6.1f} us")
+        finally:
+            user.delete()
+
+    async def _drive(self, user, path, n):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(user)
+        for _ in range(50):  # warm caches and the middleware chain
+            await client.get(path)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            await client.get(path)
+        return time.perf_counter() - t0
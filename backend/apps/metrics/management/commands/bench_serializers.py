@@ -0,0 +1,142 @@
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from apps.accounts import search
+from apps.accounts.models import Profile
+from apps.chat import inbox
+from apps.chat.history import page_message_data, page_messages
+from apps.chat.models import Conversation, InboxEntry, Message
+from apps.chat.serializers import MessageSerializer
+from apps.media import images
+from apps.social.posts import Post
+from apps.social.views import POST_IMAGE_PX
+from pookiechat.renderers import ORJSONRenderer
+
+
+class Command(BaseCommand):
+    help = ("CPU time and allocations per endpoint at N rows: model instances + DRF serializers/JSONRenderer "
+            "vs values() rows + ORJSONRenderer (checks the bodies are byte-identical)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        n = options["rows"]
+        with transaction.atomic():
+            cases = self._fixture(n)
+            self.stdout.write(f"{'endpoint':<20}{'path':<8}{'cpu ms':>9}{'peak alloc KiB':>16}")
+            for name, legacy, fast in cases:
+                same = legacy() == fast()
+                for label, fn in (("legacy", legacy), ("fast", fast)):
+                    cpu, peak = self._measure(fn, options["repeat"])
+                    self.stdout.write(f"{name:<20}{label:<8}{cpu * 1000:>9.1f}{peak / 1024:>16.0f}")
+                self.stdout.write(f"{name:<20}bodies identical: {'yes' if same else 'NO'}")
+            transaction.set_rollback(True)
+
+    def _measure(self, fn, repeat):
+        fn()  # warm up
+        cpu = min(self._cpu(fn) for _ in range(repeat))
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return cpu, peak
+
+    @staticmethod
+    def _cpu(fn):
+        t0 = time.process_time()
+        fn()
+        return time.process_time() - t0
+
+    def _fixture(self, n):
+        now = timezone.now()
+        me = User.objects.create_user("bench_ser_me")
+        peer = User.objects.create_user("bench_ser_peer")
+        request = APIRequestFactory().get("/")
+
+        conv = Conversation.objects.create()
+        Message.objects.bulk_create(
+            Message(conversation=conv, sender=me if i % 2 else peer, ciphertext=b"x" * 256) for i in range(n))
+
+        convs = Conversation.objects.bulk_create(Conversation() for _ in range(n))
+        InboxEntry.objects.bulk_create(InboxEntry(
+            user=me, conversation=c, participant_ids=[me.id, peer.id], peers=[peer.username],
+            last_at=now - timedelta(seconds=i), activity_at=now - timedelta(seconds=i), conversation_created_at=now,
+        ) for i, c in enumerate(convs))
+
+        Post.objects.bulk_create(Post(author=peer, text=f"post {i}") for i in range(n))
+        User.objects.bulk_create(User(username=f"bench_ser_{i}") for i in range(n))
+        user_ids = list(User.objects.filter(username__startswith="bench_ser_").exclude(profile__isnull=False)
+                        .values_list("id", flat=True))
+        Profile.objects.bulk_create(Profile(user_id=uid, first_name="first", last_name="last") for uid in user_ids)
+
+        legacy_json, fast_json = JSONRenderer(), ORJSONRenderer()
+
+        def messages_legacy():
+            rows, _ = page_messages(conv, limit=n)
+            return legacy_json.render(MessageSerializer(rows, many=True).data)
+
+        def messages_fast():
+            return fast_json.render(page_message_data(conv, limit=n)[0])
+
+        def conversations_legacy():
+            entries = InboxEntry.objects.filter(user=me).order_by("-activity_at", "-id")[:n]
+            return legacy_json.render([{
+                "id": str(e.conversation_id),
+                "participants": e.participant_ids,
+                "created_at": inbox._datetime_field.to_representation(e.conversation_created_at),
+                "peers": e.peers,
+                "last_at": e.last_at.isoformat() if e.last_at else None,
+            } for e in entries])
+
+        def conversations_fast():
+            return fast_json.render([inbox.entry_data(e) for e in inbox.page_inbox(me, limit=n)[0]])
+
+        def posts_legacy():
+            posts = list(Post.objects.filter(author=peer).order_by("-created_at"))
+            return legacy_json.render([{
+                "id": p.id, "author": peer.username, "text": p.text,
+                "imageUrl": images.variant_url(request, p.image, p.image_variants, POST_IMAGE_PX),
+                "visibility": p.visibility, "reach_count": p.reach_count, "created_at": p.created_at.isoformat(),
+            } for p in posts])
+
+        def posts_fast():
+            rows = Post.objects.filter(author=peer).order_by("-created_at").values_list(
+                "id", "text", "image", "image_variants", "visibility", "reach_count", "created_at")
+            return fast_json.render([{
+                "id": pid, "author": peer.username, "text": text,
+                "imageUrl": images.variant_url(request, image, variants, POST_IMAGE_PX),
+                "visibility": visibility, "reach_count": reach_count, "created_at": created_at.isoformat(),
+            } for pid, text, image, variants, visibility, reach_count, created_at in rows])
+
+        def search_legacy():
+            found = User.objects.select_related("profile").in_bulk(user_ids)
+            return legacy_json.render([{
+                "username": u.username, "is_staff": u.is_staff, "first_name": u.profile.first_name,
+                "last_name": u.profile.last_name, "profile_visibility": u.profile.profile_visibility,
+            } for u in (found[uid] for uid in user_ids if uid in found)])
+
+        def search_fast():
+            ranked, search.search = search.search, lambda q, limit: user_ids
+            try:
+                return fast_json.render(search.search_user_data("", n))
+            finally:
+                search.search = ranked
+
+        return [
+            ("list_messages", messages_legacy, messages_fast),
+            ("list_conversations", conversations_legacy, conversations_fast),
+            ("list_posts", posts_legacy, posts_fast),
+            ("search_users", search_legacy, search_fast),
+        ]
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from apps.metrics import loadtest
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class Command(BaseCommand):
+    help = ("Drive the REST endpoints and ChatConsumer concurrently over seed_synthetic data; "
+            "report p50/p95/p99, throughput and queries per request, and compare with a saved baseline")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="synth")
+        parser.add_argument("--users", type=int, default=200, help="synthetic users to log in as")
+        parser.add_argument("--threads", type=int, default=8, help="concurrent REST clients")
+        parser.add_argument("--requests", type=int, default=200, help="requests per REST client")
+        parser.add_argument("--scenarios", default=",".join(loadtest.REST_SCENARIOS))
+        parser.add_argument("--sockets", type=int, default=20, help="concurrent WebSocket clients (0 = none)")
+        parser.add_argument("--ws-messages", type=int, default=20, help="messages sent per socket")
+        parser.add_argument("--ws-interval", type=float, default=0.01, help="seconds between a socket's sends")
+        parser.add_argument("--save-baseline", metavar="FILE")
+        parser.add_argument("--baseline", metavar="FILE", help="fail if latency or queries regressed against FILE")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth (0.2 = +20%%)")
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options["scenarios"].split(",") if s]
+        unknown = set(scenarios) - set(loadtest.REST_SCENARIOS)
+        if unknown:
+            raise CommandError(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        try:
+            fixture = loadtest.Fixture(options["prefix"], options["users"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        samples = loadtest.Samples()
+        with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER):
+            t0 = time.perf_counter()
+            threads = loadtest.run_rest(fixture, samples, options["threads"], options["requests"], scenarios) \
+                if scenarios else []
+            if options["sockets"]:
+                asyncio.run(loadtest.run_ws(fixture, samples, options["sockets"],
+                                            options["ws_messages"], options["ws_interval"]))
+            for t in threads:
+                t.join()
+            wall = time.perf_counter() - t0
+        summary = samples.summary(wall)
+
+        self.stdout.write(f"{'scenario':<14}{'count':>7}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'req/s':>9}{'queries':>9}")
+        for name, s in summary.items():
+            self.stdout.write(f"{name:<14}{s['count']:>7}{s['errors']:>5}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+                              f"{s['p99_ms']:>9.1f}{s['rps']:>9.1f}{s['queries']:>9.1f}")
+        total = sum(s["count"] for s in summary.values())
+        self.stdout.write(f"{total} requests/messages in {wall:.1f}s ({total / wall:.0f}/s)")
+
+        if options["save_baseline"]:
+            Path(options["save_baseline"]).write_text(json.dumps(summary, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(f"baseline saved to {options['save_baseline']}")
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+            rows = loadtest.compare(summary, baseline, options["tolerance"])
+            for name, metric, was, cur, regressed in rows:
+                flag = "  REGRESSED" if regressed else ""
+                self.stdout.write(f"{name:<14}{metric:<8}{was:>9.1f} -> {cur:>9.1f}{flag}")
+            failed = [f"{name} {metric}" for name, metric, _, _, regressed in rows if regressed]
+            if failed:
+                raise CommandError(f"regressed against {options['baseline']}: {', '.join(failed)}")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.metrics import synthetic
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate skewed synthetic users, follows, conversations, messages and posts for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--follows", type=int, default=30, help="mean accounts followed per user")
+        parser.add_argument("--conversations", type=int, default=5000)
+        parser.add_argument("--group-ratio", type=float, default=0.1, help="share of conversations with 3-12 members")
+        parser.add_argument("--messages", type=int, default=200000)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--days", type=int, default=90, help="history spread over this many days")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="synth", help="usernames are <prefix>_<n>")
+        parser.add_argument("--reset", action="store_true", help="delete a previous run with the same prefix first")
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("--users must be at least 2")
+        if options["reset"]:
+            n = synthetic.reset(options["prefix"])
+            self.stdout.write(f"removed {n} synthetic users")
+        gen = synthetic.Generator(prefix=options["prefix"], seed=options["seed"],
+                                  batch_size=options["batch_size"], days=options["days"], stdout=self.stdout)
+        try:
+            gen.run(options["users"], options["follows"], options["conversations"],
+                    options["group_ratio"], options["messages"], options["posts"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"log in as {options['prefix']}_0 .. {options['prefix']}_{options['users'] - 1} "
+            f"(password: {synthetic.PASSWORD})"))
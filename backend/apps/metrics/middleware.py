@@ -0,0 +1,90 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import registry
+from .scope import Scope, report_nplusone
+
+
+class MetricsMiddleware:
+    """Per-route latency, status, DB queries/time, render time and response bytes.
+
+    Routes are labelled with the URL pattern (e.g. api/conversations/<uuid:conversation_id>/messages/),
+    never the raw path, to keep label cardinality bounded. Runs in whichever
+    mode the chain does: under ASGI it stays on the event loop, so long-polls
+    and streaming responses don't hold a thread for the request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django would run a sync hook through sync_to_async for every DRF response
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        t0 = time.perf_counter()
+        with Scope("") as scope:
+            response = self.get_response(request)
+        return self._record(request, response, scope, t0)
+
+    async def __acall__(self, request):
+        t0 = time.perf_counter()
+        with Scope("") as scope:
+            response = await self.get_response(request)
+        return self._record(request, response, scope, t0)
+
+    def _record(self, request, response, scope, t0):
+        match = getattr(request, "resolver_match", None)
+        route = match.route if match is not None else "unmatched"
+        elapsed = time.perf_counter() - t0
+        registry.http_seconds.observe(elapsed, route=route)
+        registry.http_requests.inc(route=route, method=request.method, status=response.status_code)
+        registry.http_queries.observe(scope.queries, route=route)
+        if scope.queries:
+            registry.http_db_seconds.inc(scope.db_seconds, route=route)
+            report_nplusone(scope, route)
+        render = getattr(response, "_metrics_render_seconds", None)
+        if render is not None:
+            registry.http_render_seconds.inc(render, route=route)
+        if response.streaming:
+            count = self._acount if response.is_async else self._count
+            response.streaming_content = count(response.streaming_content, route)
+        else:
+            registry.http_bytes.inc(len(response.content), route=route)
+        return response
+
+    def process_template_response(self, request, response):
+        return self._time_render(response)
+
+    async def _aprocess_template_response(self, request, response):
+        return self._time_render(response)
+
+    @staticmethod
+    def _time_render(response):
+        # DRF Responses render after the view returns; time that step on its own
+        t0 = time.perf_counter()
+
+        def rendered(r):
+            r._metrics_render_seconds = time.perf_counter() - t0
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def _count(chunks, route):
+        for chunk in chunks:
+            registry.http_bytes.inc(len(chunk), route=route)
+            yield chunk
+
+    @staticmethod
+    async def _acount(chunks, route):
+        # async streaming bodies must stay async, or Django buffers them whole under ASGI
+        async for chunk in chunks:
+            registry.http_bytes.inc(len(chunk), route=route)
+            yield chunk
@@ -0,0 +1,123 @@
+import bisect
+import threading
+from collections import defaultdict
+
+# A small in-process metrics registry rendered in the Prometheus text format.
+# Every worker process keeps its own numbers; Prometheus sums across targets.
+# Recording is a lock, a bisect and a few additions, cheap enough to leave on.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for k, v in labels)
+    return "{" + body + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name, self.help = name, help
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] += amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, key, value) for key, value in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+        out = []
+        for key, row in items:
+            running = 0
+            for bound, n in zip(self.buckets + ("+Inf",), row[:-1]):
+                running += n
+                out.append((f"{self.name}_bucket", key + (("le", bound),), running))
+            out.append((f"{self.name}_sum", key, row[-1]))
+            out.append((f"{self.name}_count", key, running))
+        return out
+
+
+class StatsCounter:
+    """Exposes an existing collections.Counter (e.g. apps.chat.backpressure.stats) as one labelled counter"""
+    kind = "counter"
+
+    def __init__(self, name, help, counter, label="kind"):
+        self.name, self.help, self.counter, self.label = name, help, counter, label
+
+    def samples(self):
+        return [(self.name, ((self.label, k),), v) for k, v in list(self.counter.items())]
+
+
+class Gauge:
+    """A value read from a callable at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.read = name, help, read
+
+    def samples(self):
+        return [(self.name, (), self.read())]
+
+
+_metrics = {}
+
+
+def register(metric):
+    return _metrics.setdefault(metric.name, metric)
+
+
+def render():
+    lines = []
+    for metric in list(_metrics.values()):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_labels(labels)} {value:g}" if isinstance(value, float) else f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+http_seconds = register(Histogram("pookie_http_request_duration_seconds", "Request latency by route"))
+http_requests = register(Counter("pookie_http_requests_total", "Requests by route, method and status"))
+http_queries = register(Histogram("pookie_http_db_queries", "DB queries per request by route", QUERY_BUCKETS))
+http_db_seconds = register(Counter("pookie_http_db_seconds_total", "Time spent in DB queries by route"))
+http_render_seconds = register(Counter("pookie_http_render_seconds_total", "Time spent rendering (serializing) responses by route"))
+http_bytes = register(Counter("pookie_http_response_bytes_total", "Response body bytes by route"))
+nplusone = register(Counter("pookie_nplusone_total", "Requests or socket events that repeated one query past the threshold"))
+ws_seconds = register(Histogram("pookie_ws_event_duration_seconds", "Consumer event handling time by consumer and event/action"))
+ws_queries = register(Histogram("pookie_ws_db_queries", "DB queries per consumer event", QUERY_BUCKETS))
+ws_db_seconds = register(Counter("pookie_ws_db_seconds_total", "Time spent in DB queries by consumer and event/action"))
+ws_frames = register(Counter("pookie_ws_frames_sent_total", "Frames sent to sockets by consumer"))
+ws_bytes = register(Counter("pookie_ws_bytes_sent_total", "Bytes sent to sockets by consumer"))
@@ -0,0 +1,95 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from . import registry
+
+# The unit of work being measured (a request or a consumer event) lives in
+# a ContextVar, so queries run through sync_to_async threads are still
+# charged to it. The DB execute wrapper adds a counter bump and a clock read
+# per query when a scope is active and nothing otherwise.
+
+log = logging.getLogger("pookie.nplusone")
+
+_current = ContextVar("pookie_metrics_scope", default=None)
+_reported = set()
+MAX_REPORTED = 1000
+
+
+class Scope:
+    __slots__ = ("label", "queries", "db_seconds", "sql", "_parent", "_token")
+
+    def __init__(self, label):
+        self.label = label
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.sql = Counter()
+
+    def __enter__(self):
+        self._parent = _current.get()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        if self._parent is not None:  # nested scopes also count toward the enclosing one
+            self._parent.queries += self.queries
+            self._parent.db_seconds += self.db_seconds
+            self._parent.sql.update(self.sql)
+
+    def repeated(self):
+        """SQL statements run at least METRICS_NPLUSONE_THRESHOLD times (same text, any params)"""
+        limit = settings.METRICS_NPLUSONE_THRESHOLD
+        return [(sql, n) for sql, n in self.sql.items() if n >= limit]
+
+
+def current():
+    return _current.get()
+
+
+def relabel(label):
+    """Name the running scope once the handler knows more (e.g. the socket action)"""
+    scope = _current.get()
+    if scope is not None:
+        scope.label = label
+
+
+@contextmanager
+def detached():
+    """Run with no scope, e.g. while starting a task shared by every consumer on the loop"""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _track(execute, sql, params, many, context):
+    scope = _current.get()
+    if scope is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        scope.db_seconds += time.perf_counter() - t0
+        scope.queries += 1
+        scope.sql[sql] += 1
+
+
+def install(sender, connection, **kwargs):
+    if _track not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track)
+
+
+def report_nplusone(scope, where):
+    for sql, n in scope.repeated():
+        registry.nplusone.inc(where=where)
+        key = (where, sql)
+        if key not in _reported and len(_reported) < MAX_REPORTED:
+            _reported.add(key)
+            log.warning("possible N+1 in %s: %d x %s", where, n, sql[:300])
@@ -0,0 +1,247 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+from uuid import UUID
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from apps.accounts import search
+from apps.accounts.models import Profile
+from apps.chat.archive import explicit_timestamps
+from apps.chat.models import Conversation, InboxEntry, Message
+from apps.social.models import Follow
+from apps.social.posts import FanInAuthor, FeedItem, Post
+
+# Synthetic data for benchmarks: users with profiles, a follow graph where a
+# few accounts have most of the followers, 1:1 and group conversations whose
+# traffic is just as skewed, and posts pushed into followers' feeds. Rows go
+# in with bulk_create in batches, so millions of messages take minutes on
+# SQLite or MySQL. Denormalized tables (inbox rows with unread counts, feed
+# items, the search index) are filled in the same run so every endpoint reads
+# what it would read in production. Everything is derived from --seed.
+
+PASSWORD = "synthetic"
+FIRST = ("ava", "ben", "chloe", "dev", "emma", "finn", "grace", "hugo", "isla", "jack",
+         "kira", "leo", "maya", "noah", "olive", "priya", "quinn", "ravi", "sofia", "theo")
+LAST = ("adams", "baker", "chen", "diaz", "evans", "fischer", "garcia", "haddad", "ito", "jones",
+        "khan", "lopez", "miller", "nguyen", "okafor", "patel", "rossi", "silva", "tanaka", "walsh")
+UNREAD_TAIL = 20  # unread counts are drawn from each conversation's newest messages
+
+
+def username(prefix, i):
+    return f"{prefix}_{i}"
+
+
+def synthetic_users(prefix):
+    return User.objects.filter(username__startswith=f"{prefix}_")
+
+
+class Zipf:
+    """Draws from a population with probability proportional to 1 / rank**s"""
+
+    def __init__(self, population, s, rng):
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum = list(accumulate(1 / (r + 1) ** s for r in range(len(self.population))))
+        self.rng = rng
+
+    def draw(self, k=1):
+        return self.rng.choices(self.population, cum_weights=self.cum, k=k)
+
+
+class Generator:
+    def __init__(self, prefix="synth", seed=42, batch_size=5000, days=90, stdout=None):
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        self.stdout = stdout
+        self.user_ids = []
+        self.followers = {}  # user id -> [follower ids]
+        self.names = {}  # user id -> username
+        self.members = {}  # conversation id -> [user ids]
+        self.created = {}  # conversation id -> created_at
+
+    def log(self, msg):
+        if self.stdout is not None:
+            self.stdout.write(msg)
+
+    def _bulk(self, model, rows):
+        """bulk_create a (possibly lazy) stream of rows in batches; returns the count"""
+        n, batch = 0, []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                n += self._flush(model, batch)
+                batch = []
+        if batch:
+            n += self._flush(model, batch)
+        return n
+
+    @staticmethod
+    def _flush(model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=model is Follow)
+        return len(batch)
+
+    def _timed(self, what, fn, *args):
+        t0 = time.perf_counter()
+        n = fn(*args)
+        self.log(f"{what:<14} {n:>10} rows in {time.perf_counter() - t0:6.1f}s")
+        return n
+
+    def run(self, users, follows, conversations, group_ratio, messages, posts):
+        if synthetic_users(self.prefix).exists():
+            raise ValueError(f"users named {self.prefix}_* already exist; pass --reset or another --prefix")
+        with explicit_timestamps(Conversation, Message, Post, Follow):
+            self._timed("users", self.users, users)
+            self._timed("follows", self.follows, follows)
+            self._timed("conversations", self.conversations, conversations, group_ratio)
+            self._timed("messages", self.messages, messages)
+            self._timed("inbox rows", self.inbox)
+            self._timed("posts", self.posts, posts)
+            self._timed("feed items", self.feed)
+        self._timed("search index", lambda: search.rebuild(chunk_size=self.batch_size))
+
+    def users(self, n):
+        password = make_password(PASSWORD)
+        self._bulk(User, (User(username=username(self.prefix, i), password=password,
+                               date_joined=self.start) for i in range(n)))
+        self.names = dict(synthetic_users(self.prefix).values_list("id", "username"))
+        self.user_ids = sorted(self.names)
+        rng = self.rng
+        self._bulk(Profile, (Profile(
+            user_id=uid,
+            first_name=rng.choice(FIRST),
+            last_name=rng.choice(LAST),
+            theme=rng.choice(("light", "dark")),
+            profile_visibility=rng.choices(("public", "followers", "private"), weights=(80, 15, 5))[0],
+        ) for uid in self.user_ids))
+        return n
+
+    def follows(self, mean):
+        """Each user follows ~mean accounts, picked by popularity (Zipf, s=1.1)"""
+        rng = self.rng
+        popular = Zipf(self.user_ids, 1.1, rng)
+        self.followers = {uid: [] for uid in self.user_ids}
+
+        def rows():
+            for uid in self.user_ids:
+                k = min(int(rng.expovariate(1 / mean)) if mean else 0, len(self.user_ids) - 1)
+                targets = set(popular.draw(k)) - {uid}
+                for target in targets:
+                    self.followers[target].append(uid)
+                    yield Follow(follower_id=uid, following_id=target,
+                                 created_at=self.start + (self.now - self.start) * rng.random())
+
+        return self._bulk(Follow, rows())
+
+    def conversations(self, n, group_ratio):
+        rng = self.rng
+        ids = self.user_ids
+        convs, links, pairs = [], [], set()
+        for _ in range(n):
+            if rng.random() < group_ratio:
+                members, pair_key = rng.sample(ids, min(len(ids), rng.randint(3, 12))), None
+            else:
+                members = rng.sample(ids, 2)
+                pair_key = Conversation.pair_key_for(*members)
+                if pair_key in pairs:
+                    continue
+                pairs.add(pair_key)
+            conv = Conversation(id=UUID(int=rng.getrandbits(128), version=4), pair_key=pair_key,
+                                created_at=self.start - timedelta(days=rng.random()))
+            convs.append(conv)
+            self.members[conv.id] = members
+            self.created[conv.id] = conv.created_at
+            links += [Conversation.participants.through(conversation_id=conv.id, user_id=uid) for uid in members]
+        self._bulk(Conversation, convs)
+        self._bulk(Conversation.participants.through, links)
+        return len(convs)
+
+    def messages(self, n):
+        """n messages in global time order; a few conversations carry most of the traffic"""
+        rng = self.rng
+        if not self.members or not n:
+            return 0
+        busy = Zipf(list(self.members), 1.0, rng)
+        # RSA-2048 OAEP blocks: what the client really sends, stored raw
+        pool = [rng.randbytes(256) for _ in range(512)]
+        span = (self.now - self.start) / n
+
+        def rows():
+            for i, conv_id in enumerate(busy.draw(n)):
+                yield Message(conversation_id=conv_id, sender_id=rng.choice(self.members[conv_id]),
+                              ciphertext=rng.choice(pool), created_at=self.start + span * i)
+
+        return self._bulk(Message, rows())
+
+    def inbox(self):
+        """One row per participant; ~30% have some of the newest messages unread"""
+        rng = self.rng
+
+        def rows():
+            for conv_id, members in self.members.items():
+                tail = list(Message.objects.filter(conversation_id=conv_id).order_by("-created_at", "-id")
+                            .values_list("id", "sender_id", "created_at")[:UNREAD_TAIL])
+                created = self.created[conv_id]
+                last_id, last_at = (tail[0][0], tail[0][2]) if tail else (None, None)
+                for uid in members:
+                    cursor, unread = last_id, 0
+                    if len(tail) > 1 and rng.random() < 0.3:
+                        k = rng.randint(1, len(tail) - 1)
+                        cursor = tail[k][0]
+                        unread = sum(1 for _, sender_id, _ in tail[:k] if sender_id != uid)
+                    yield InboxEntry(
+                        user_id=uid, conversation_id=conv_id,
+                        participant_ids=members,
+                        peers=[self.names[o] for o in members if o != uid],
+                        last_message_id=last_id, last_at=last_at, activity_at=last_at or created,
+                        conversation_created_at=created, last_read_id=cursor, unread_count=unread,
+                    )
+
+        return self._bulk(InboxEntry, rows())
+
+    def posts(self, n):
+        rng = self.rng
+        authors = Zipf(self.user_ids, 1.0, rng)
+        span = (self.now - self.start) / max(n, 1)
+        return self._bulk(Post, (Post(
+            author_id=author, text=f"synthetic post {i}", created_at=self.start + span * i,
+            visibility=rng.choices(("public", "followers", "private"), weights=(85, 10, 5))[0],
+        ) for i, author in enumerate(authors.draw(n))))
+
+    def feed(self):
+        """Push posts to followers the way apps.social.timeline does (fan-in past FEED_FANOUT_LIMIT)"""
+        limit = settings.FEED_FANOUT_LIMIT
+        fan_in = {uid for uid, f in self.followers.items() if len(f) > limit}
+        self._bulk(FanInAuthor, (FanInAuthor(user_id=uid) for uid in fan_in))
+        posts = (Post.objects.filter(author_id__in=self.user_ids)
+                 .values_list("id", "author_id", "created_at", "visibility"))
+
+        def rows():
+            for pid, author, created_at, visibility in posts.iterator(chunk_size=self.batch_size):
+                readers = [author]
+                if visibility in ("public", "followers") and author not in fan_in:
+                    readers += self.followers[author]
+                for uid in readers:
+                    yield FeedItem(user_id=uid, post_id=pid, author_id=author, created_at=created_at)
+
+        return self._bulk(FeedItem, rows())
+
+
+def reset(prefix):
+    """Delete a previous run; messages and inbox rows go first in plain bulk DELETEs"""
+    users = synthetic_users(prefix)
+    convs = Conversation.objects.filter(participants__in=users).values("id")
+    Message.objects.filter(conversation_id__in=convs).delete()
+    InboxEntry.objects.filter(conversation_id__in=convs).delete()
+    Conversation.objects.filter(id__in=list(convs.distinct().values_list("id", flat=True))).delete()
+    FeedItem.objects.filter(user__in=users).delete()
+    return users.delete()[1].get("auth.User", 0)
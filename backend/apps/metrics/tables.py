@@ -0,0 +1,29 @@
+from django.db import connection
+
+# On-disk size of a table for the bench_* commands: data plus indexes, from
+# SQLite's dbstat virtual table or MySQL's information_schema.
+
+
+def table_bytes(table):
+    """Table plus index bytes where the backend can tell us, else None"""
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute(f"ANALYZE TABLE {connection.ops.quote_name(table)}")  # refresh InnoDB's estimates
+            cursor.fetchall()
+            cursor.execute("SELECT data_length + index_length FROM information_schema.tables "
+                           "WHERE table_schema = DATABASE() AND table_name = %s", [table])
+            row = cursor.fetchone()
+            return row[0] if row else None
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                               "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                               [table, table])
+            except Exception:  # sqlite built without SQLITE_ENABLE_DBSTAT_VTAB
+                return None
+            return cursor.fetchone()[0]
+    return None
+
+
+def mib(n):
+    return "n/a" if n is None else f"{n / 1024 / 1024:.1f}MiB"
@@ -0,0 +1,25 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, override_settings
+
+from . import registry
+
+
+def _requests(route):
+    return sum(value for _, labels, value in registry.http_requests.samples() if dict(labels)["route"] == route)
+
+
+class MiddlewareModeTests(TestCase):
+    @override_settings(DEBUG=True)  # Django only logs handler adaptation in DEBUG
+    async def test_async_chain_is_not_adapted(self):
+        user = await User.objects.acreate(username="metrics_async")
+        client = AsyncClient()
+        await client.aforce_login(user)
+        before = _requests("api/me/")
+        with self.assertLogs("django.request", logging.DEBUG) as logs:
+            logging.getLogger("django.request").debug("start")
+            response = await client.get("/api/me/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([m for m in logs.output if "MetricsMiddleware" in m], logs.output)
+        self.assertEqual(_requests("api/me/"), before + 1)
@@ -0,0 +1,24 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+
+from . import registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _allowed(request):
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+@require_safe
+def metrics(request):
+    # staff session, or the scraper's bearer token (METRICS_TOKEN)
+    if not _allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
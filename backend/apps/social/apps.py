@@ -3,3 +3,9 @@ from django.apps import AppConfig
 class SocialConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.social"
+
+    def ready(self):
+        from apps.media import refs
+        from .posts import Post
+
+        refs.track(Post, "image")
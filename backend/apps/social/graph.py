@@ -0,0 +1,96 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from pookiechat import versions
+from .models import Follow
+
+# Cached follow graph. Every user has a generation counter; cached sets and
+# counts are keyed by it and follow/unfollow bump it after commit. A reader
+# that raced a write can only store its stale result under the superseded
+# generation, where nobody will look it up again.
+
+TTL = 60 * 60
+MAX_CACHED_FOLLOWERS = 10000  # bigger follower sets are queried, only their count is cached
+
+stats = Counter()
+
+
+def _gen_key(user_id):
+    return f"social:g:gen:{user_id}"
+
+
+def _key(user_id, kind):
+    return f"social:g:{versions.get_version(_gen_key(user_id))}:{kind}:{user_id}"
+
+
+def _cached(key, load):
+    value = cache.get(key)
+    if value is None:
+        stats["miss"] += 1
+        value = load()
+        cache.set(key, value, TTL)
+    else:
+        stats["hit"] += 1
+    return value
+
+
+def following_ids(user_id):
+    return _cached(_key(user_id, "following"), lambda: frozenset(
+        Follow.objects.filter(follower_id=user_id).values_list("following_id", flat=True)))
+
+
+def follower_count(user_id):
+    return _cached(_key(user_id, "followers_n"), lambda: Follow.objects.filter(following_id=user_id).count())
+
+
+def following_count(user_id):
+    return len(following_ids(user_id))
+
+
+def follower_ids(user_id):
+    if follower_count(user_id) > MAX_CACHED_FOLLOWERS:
+        stats["uncached"] += 1
+        return frozenset(Follow.objects.filter(following_id=user_id).values_list("follower_id", flat=True))
+    return _cached(_key(user_id, "followers"), lambda: frozenset(
+        Follow.objects.filter(following_id=user_id).values_list("follower_id", flat=True)))
+
+
+def is_following(follower_id, following_id):
+    return following_id in following_ids(follower_id)
+
+
+def followed_among(follower_id, user_ids):
+    """Which of user_ids does follower_id follow? One cache read, no per-row queries"""
+    return following_ids(follower_id).intersection(user_ids)
+
+
+def invalidate(*user_ids):
+    transaction.on_commit(lambda: versions.bump(*(_gen_key(u) for u in user_ids)))
+
+
+def follow(follower, following):
+    """Create the edge if missing; returns True when it was new"""
+    from . import timeline
+
+    _, created = Follow.objects.get_or_create(follower=follower, following=following)
+    if created:
+        invalidate(follower.id, following.id)
+        timeline.on_follow(follower.id, following.id)
+    return created
+
+
+def unfollow(follower, following):
+    from . import timeline
+
+    deleted = Follow.objects.filter(follower=follower, following=following).delete()[0]
+    if deleted:
+        invalidate(follower.id, following.id)
+        timeline.on_unfollow(follower.id, following.id)
+    return bool(deleted)
+
+
+def hit_rate():
+    total = stats["hit"] + stats["miss"]
+    return stats["hit"] / total if total else 0.0
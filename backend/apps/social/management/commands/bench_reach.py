@@ -0,0 +1,76 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.social import reach
+from apps.social.posts import Post
+from apps.social.views import list_posts
+
+
+class Command(BaseCommand):
+    help = "Profile-view throughput on a popular author: per-post reach UPDATEs vs the reach buffer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=50)
+        parser.add_argument("--viewers", type=int, default=8)
+        parser.add_argument("--views", type=int, default=50, help="views per viewer")
+
+    def handle(self, *args, **options):
+        author = User.objects.create_user("bench_reach_author")
+        viewers = [User.objects.create_user(f"bench_reach_{i}") for i in range(options["viewers"])]
+        Post.objects.bulk_create(Post(author=author, text=f"post {i}") for i in range(options["posts"]))
+        try:
+            total = options["viewers"] * options["views"]
+            before = self._drive(viewers, options["views"], self._legacy_view)
+            start = Post.objects.filter(author=author).values_list("reach_count", flat=True).first()
+            after = self._drive(viewers, options["views"], self._buffered_view)
+            reach.buffer.flush()
+            end = Post.objects.filter(author=author).values_list("reach_count", flat=True).first()
+            self.stdout.write(f"per-post UPDATEs : {total / before:>8.0f} views/s")
+            self.stdout.write(f"reach buffer     : {total / after:>8.0f} views/s")
+            self.stdout.write(f"reach counted    : {end - start} of {total}")
+        finally:
+            author.delete()
+            for v in viewers:
+                v.delete()
+
+    def _drive(self, viewers, views, view):
+        factory = APIRequestFactory()
+        errors = []
+
+        def run(user):
+            try:
+                for _ in range(views):
+                    view(factory, user)
+            except Exception as e:  # surfaced below; sqlite may refuse concurrent writers
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=run, args=(u,)) for u in viewers]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        if errors:
+            self.stderr.write(f"{len(errors)} viewer(s) failed: {errors[0]!r}")
+        return elapsed
+
+    def _buffered_view(self, factory, user):
+        req = factory.get("/api/posts/", {"username": "bench_reach_author"})
+        force_authenticate(req, user=user)
+        list_posts(req).render()
+
+    def _legacy_view(self, factory, user):
+        # list_posts as it was: build the page, then re-run the query and save() each post
+        qs = Post.objects.filter(author__username="bench_reach_author").order_by("-created_at")
+        [{"id": p.id, "author": p.author.username, "reach_count": p.reach_count} for p in qs]
+        for p in qs:
+            p.reach_count = (p.reach_count or 0) + 1
+            p.save(update_fields=["reach_count"])
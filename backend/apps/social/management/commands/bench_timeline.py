@@ -0,0 +1,70 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from apps.social import timeline
+from apps.social.models import Follow
+from apps.social.posts import FanInAuthor, Post
+
+
+class Command(BaseCommand):
+    help = "Home timeline on a skewed (Zipf) follow graph: fan-out write cost and feed read latency vs naive fan-in (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--follows", type=int, default=50, help="followees per user")
+        parser.add_argument("--posts", type=int, default=2000)
+        parser.add_argument("--zipf", type=float, default=1.1)
+        parser.add_argument("--fanout-limit", type=int, default=300)
+        parser.add_argument("--reads", type=int, default=200)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with override_settings(FEED_FANOUT_LIMIT=options["fanout_limit"]), transaction.atomic():
+            users = User.objects.bulk_create(User(username=f"bench_tl_{i}") for i in range(options["users"]))
+            if users[0].id is None:
+                users = list(User.objects.filter(username__startswith="bench_tl_").order_by("id"))
+            weights = [1 / (rank + 1) ** options["zipf"] for rank in range(len(users))]
+            follows = set()
+            for u in users:
+                for v in rng.choices(users, weights=weights, k=options["follows"]):
+                    if v.id != u.id:
+                        follows.add((u.id, v.id))
+            Follow.objects.bulk_create(Follow(follower_id=a, following_id=b) for a, b in follows)
+            top = sorted(((sum(1 for _, b in follows if b == u.id), u.username) for u in users[:3]), reverse=True)
+            self.stdout.write(f"follow edges: {len(follows)}; top authors: {top}")
+
+            write_ms = []
+            for i in range(options["posts"]):
+                author = rng.choices(users, weights=weights)[0]
+                t0 = time.perf_counter()
+                post = Post.objects.create(author=author, text=f"post {i}", visibility="public")
+                timeline.on_post_created(post)
+                write_ms.append((time.perf_counter() - t0) * 1000)
+            self.stdout.write(f"fan-in authors: {FanInAuthor.objects.count()}")
+            self._report("write (post + fan-out)", write_ms)
+
+            readers = rng.sample(users, min(options["reads"], len(users)))
+            self._report("read materialized feed", [self._time(lambda: timeline.page_feed(u)) for u in readers])
+            self._report("read naive fan-in", [self._time(lambda: self._naive(u)) for u in readers])
+            transaction.set_rollback(True)
+
+    def _naive(self, user):
+        followed = Follow.objects.filter(follower=user).values("following_id")
+        return list(Post.objects.filter(author_id__in=followed, visibility__in=timeline.FEED_VISIBILITY)
+                    .select_related("author").order_by("-created_at", "-id")[:50])
+
+    def _time(self, fn):
+        t0 = time.perf_counter()
+        fn()
+        return (time.perf_counter() - t0) * 1000
+
+    def _report(self, label, samples):
+        samples = sorted(samples)
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        self.stdout.write(f"{label:<24} p50 {statistics.median(samples):7.2f} ms  p95 {p95:7.2f} ms  max {samples[-1]:7.2f} ms")
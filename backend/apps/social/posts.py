@@ -6,6 +6,32 @@ class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField(blank=True, default="")
     image = models.ImageField(upload_to="posts/", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # {"64": name, ...}, see apps.media.images
     visibility = models.CharField(max_length=10, choices=VIS_CHOICES, default="public")
     reach_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["author", "-created_at", "-id"], name="social_post_author_time_idx"),
+        ]
+
+class FeedItem(models.Model):
+    """A post pushed into a follower's materialized home timeline"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="feed_items")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="feed_items")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField()  # copy of post.created_at, the feed's sort key
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"], name="social_feed_user_post_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"], name="social_feed_user_time_idx"),
+            models.Index(fields=["user", "author"], name="social_feed_user_author_idx"),
+        ]
+
+class FanInAuthor(models.Model):
+    """Authors with too many followers to fan out to; their posts are merged in at read time"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="+")
@@ -0,0 +1,81 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .posts import Post
+
+log = logging.getLogger(__name__)
+
+
+class ReachBuffer:
+    """Per-process reach counter that turns N per-view UPDATEs into a few batched ones.
+
+    Views call add() with the post ids they showed. A background thread
+    flushes every `interval` seconds, or sooner once `max_pending` distinct
+    posts are waiting, issuing one `reach_count = reach_count + n` UPDATE per
+    distinct n. Counts still pending at interpreter exit are flushed by atexit.
+    A failed flush puts its counts back for the next one.
+    """
+
+    def __init__(self, interval, max_pending):
+        self.interval = interval
+        self.max_pending = max_pending
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, post_ids):
+        with self._lock:
+            self._counts.update(post_ids)
+            full = len(self._counts) >= self.max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="reach-flush", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._counts)
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        by_delta = defaultdict(list)
+        for post_id, n in counts.items():
+            by_delta[n].append(post_id)
+        try:
+            with transaction.atomic():
+                for n, ids in by_delta.items():
+                    Post.objects.filter(id__in=ids).update(reach_count=F("reach_count") + n)
+        except Exception:
+            with self._lock:
+                self._counts.update(counts)
+            raise
+        return len(counts)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("reach flush failed; counts kept for the next one")
+            finally:
+                close_old_connections()
+
+
+buffer = ReachBuffer(
+    interval=settings.REACH_FLUSH_SECONDS,
+    max_pending=settings.REACH_MAX_PENDING,
+)
+atexit.register(buffer.flush)
@@ -0,0 +1,90 @@
+import random
+import threading
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, close_old_connections
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from . import graph, timeline
+from .models import Follow
+from .posts import FanInAuthor, Post
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "social-tests"}}
+
+
+@override_settings(CACHES=LOCAL_CACHE, FEED_FANOUT_LIMIT=1)
+class FanInTransitionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user("feed_author")
+        self.reader = User.objects.create_user("feed_reader")
+        self.other = User.objects.create_user("feed_other")
+
+    def _post(self, text):
+        post = Post.objects.create(author=self.author, text=text)
+        with self.captureOnCommitCallbacks(execute=True):
+            timeline.on_post_created(post)
+        return post
+
+    def _follow(self, follower, follow=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            (graph.follow if follow else graph.unfollow)(follower, self.author)
+
+    def test_posts_written_while_fan_in_survive_the_switch_back(self):
+        self._follow(self.reader)
+        self._follow(self.other)
+        during = self._post("written while fan-in")
+        self.assertTrue(FanInAuthor.objects.filter(user=self.author).exists())
+        self.assertEqual([p.id for p in timeline.page_feed(self.reader)[0]], [during.id])
+
+        self._follow(self.other, follow=False)
+        after = self._post("written after")
+        self.assertFalse(FanInAuthor.objects.filter(user=self.author).exists())
+        self.assertEqual([p.id for p in timeline.page_feed(self.reader)[0]], [after.id, during.id])
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class GraphCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(f"graph_{i}") for i in range(8)]
+
+    def _worker(self, seed, ops, errors):
+        rng = random.Random(seed)
+        try:
+            for _ in range(ops):
+                a, b = rng.sample(self.users, 2)
+                op = rng.random()
+                for attempt in range(20):
+                    try:
+                        if op < 0.35:
+                            graph.follow(a, b)
+                        elif op < 0.7:
+                            graph.unfollow(a, b)
+                        else:
+                            graph.following_ids(a.id)
+                            graph.follower_ids(b.id)
+                            graph.follower_count(b.id)
+                        break
+                    except OperationalError:  # sqlite: database is locked
+                        pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close_old_connections()
+
+    def test_cache_agrees_with_the_database_after_concurrent_writes(self):
+        errors = []
+        threads = [threading.Thread(target=self._worker, args=(n, 60, errors)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        for u in self.users:
+            following = set(Follow.objects.filter(follower=u).values_list("following_id", flat=True))
+            followers = set(Follow.objects.filter(following=u).values_list("follower_id", flat=True))
+            self.assertEqual(graph.following_ids(u.id), following)
+            self.assertEqual(graph.follower_ids(u.id), followers)
+            self.assertEqual(graph.follower_count(u.id), len(followers))
@@ -0,0 +1,107 @@
+import random
+
+from django.conf import settings
+from django.db.models import Q
+
+from . import graph
+from .posts import FanInAuthor, FeedItem, Post
+
+# Home timeline: posts are pushed into each follower's FeedItem rows when
+# written (fan-out), except for authors past FEED_FANOUT_LIMIT followers,
+# whose posts are pulled in when the feed is read (fan-in).
+
+FEED_VISIBILITY = ("public", "followers")
+
+
+def _trim(user_ids):
+    """Cap feeds at FEED_MAX_ITEMS; sampled so a fan-out doesn't pay a DELETE per follower"""
+    limit = settings.FEED_MAX_ITEMS
+    for uid in user_ids:
+        if random.random() >= settings.FEED_TRIM_SAMPLE:
+            continue
+        cutoff = (FeedItem.objects.filter(user_id=uid).order_by("-created_at", "-post_id")
+                  .values_list("created_at", "post_id")[limit:limit + 1].first())
+        if cutoff:
+            ts, pid = cutoff
+            FeedItem.objects.filter(user_id=uid).filter(
+                Q(created_at__lt=ts) | Q(created_at=ts, post_id__lte=pid)
+            ).delete()
+
+
+def on_post_created(post):
+    """Fan a new post out to its author's followers (or mark the author fan-in)"""
+    items = [FeedItem(user_id=post.author_id, post=post, author_id=post.author_id, created_at=post.created_at)]
+    if post.visibility in FEED_VISIBILITY:
+        if graph.follower_count(post.author_id) > settings.FEED_FANOUT_LIMIT:
+            FanInAuthor.objects.get_or_create(user_id=post.author_id)
+            follower_ids = []
+        else:
+            follower_ids = graph.follower_ids(post.author_id)
+            if FanInAuthor.objects.filter(user_id=post.author_id).delete()[0]:
+                # back under the limit: nothing the author wrote while fan-in was pushed,
+                # and reads stop merging it in, so push the recent posts now
+                _backfill(follower_ids, post.author_id)
+        items += [FeedItem(user_id=uid, post=post, author_id=post.author_id, created_at=post.created_at)
+                  for uid in follower_ids]
+    FeedItem.objects.bulk_create(items, batch_size=1000, ignore_conflicts=True)
+    _trim(item.user_id for item in items)
+
+
+def _backfill(follower_ids, author_id):
+    """Push the author's FEED_BACKFILL most recent posts into these followers' feeds"""
+    posts = list(Post.objects.filter(author_id=author_id, visibility__in=FEED_VISIBILITY)
+                 .order_by("-created_at", "-id").values_list("id", "created_at")[:settings.FEED_BACKFILL])
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=uid, post_id=pid, author_id=author_id, created_at=ts)
+         for uid in follower_ids for pid, ts in posts),
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+def on_follow(follower_id, following_id):
+    """Backfill a new followee's recent posts, unless they are read by fan-in"""
+    if FanInAuthor.objects.filter(user_id=following_id).exists():
+        return
+    _backfill([follower_id], following_id)
+
+
+def on_unfollow(follower_id, following_id):
+    FeedItem.objects.filter(user_id=follower_id, author_id=following_id).delete()
+
+
+def _keyset(cursor, time_field, id_field):
+    ts, pid = cursor
+    return Q(**{f"{time_field}__lt": ts}) | Q(**{time_field: ts, f"{id_field}__lt": pid})
+
+
+def page_feed(user, before=None, limit=50):
+    """A page of the user's home timeline, newest first.
+
+    `before` is the id of the last post on the previous page. Pushed items
+    and fan-in authors' posts are each read with one keyset range query and
+    merged, so a page costs the same however large the feed is.
+    """
+    cursor = None
+    if before is not None:
+        cursor = Post.objects.filter(id=before).values_list("created_at", "id").first()
+        if cursor is None:
+            return [], False
+
+    pushed = FeedItem.objects.filter(user=user)
+    if cursor:
+        pushed = pushed.filter(_keyset(cursor, "created_at", "post_id"))
+    entries = list(pushed.order_by("-created_at", "-post_id").values_list("created_at", "post_id")[:limit + 1])
+
+    pulled = Post.objects.filter(
+        author_id__in=FanInAuthor.objects.filter(user_id__in=graph.following_ids(user.id)).values("user_id"),
+        visibility__in=FEED_VISIBILITY,
+    )
+    if cursor:
+        pulled = pulled.filter(_keyset(cursor, "created_at", "id"))
+    entries += list(pulled.order_by("-created_at", "-id").values_list("created_at", "id")[:limit + 1])
+
+    entries = sorted(set(entries), reverse=True)
+    has_more = len(entries) > limit
+    ids = [pid for _, pid in entries[:limit]]
+    posts = Post.objects.select_related("author").in_bulk(ids)
+    return [posts[pid] for pid in ids if pid in posts], has_more
@@ -4,8 +4,13 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.contrib.auth.models import User
 from django.db.models import Q
-from .models import Follow, FriendRequest
+from .models import FriendRequest
 from .posts import Post
+from . import graph, reach, timeline
+from pookiechat.pagination import parse_limit
+from apps.media import images
+
+POST_IMAGE_PX = 1024  # feed / profile post width
 
 @api_view(["POST"])  # follow
 @permission_classes([IsAuthenticated])
@@ -15,7 +20,7 @@ def follow(request):
         u = User.objects.get(username=target)
         if u == request.user:
             return Response({"error": "cannot follow self"}, status=400)
-        Follow.objects.get_or_create(follower=request.user, following=u)
+        graph.follow(request.user, u)
         return Response({"ok": True})
     except User.DoesNotExist:
         return Response({"error": "not found"}, status=404)
@@ -26,11 +31,26 @@ def unfollow(request):
     target = request.data.get("username")
     try:
         u = User.objects.get(username=target)
-        Follow.objects.filter(follower=request.user, following=u).delete()
+        graph.unfollow(request.user, u)
         return Response({"ok": True})
     except User.DoesNotExist:
         return Response({"error": "not found"}, status=404)
 
+@api_view(["GET"])  # follower/following counts for a user: ?username=
+@permission_classes([IsAuthenticated])
+def follow_stats(request):
+    target = request.query_params.get("username")
+    try:
+        u = User.objects.get(username=target) if target else request.user
+    except User.DoesNotExist:
+        return Response({"error": "not found"}, status=404)
+    return Response({
+        "username": u.username,
+        "followers": graph.follower_count(u.id),
+        "following": graph.following_count(u.id),
+        "is_following": graph.is_following(request.user.id, u.id),
+    })
+
 @api_view(["POST"])  # send friend request
 @permission_classes([IsAuthenticated])
 def send_request(request):
@@ -53,8 +73,8 @@ def decide_request(request, request_id):
         if action == "accept":
             r.status = "accepted"
             r.save()
-            Follow.objects.get_or_create(follower=r.sender, following=r.recipient)
-            Follow.objects.get_or_create(follower=r.recipient, following=r.sender)
+            graph.follow(r.sender, r.recipient)
+            graph.follow(r.recipient, r.sender)
         elif action == "reject":
             r.status = "rejected"
             r.save()
@@ -71,10 +91,19 @@ def create_post(request):
     text = request.data.get("text", "")
     visibility = request.data.get("visibility", "public")
     image = request.FILES.get("image")
+    if getattr(request, "upload_too_large", False):
+        return Response({"error": "image too large"}, status=413)
     p = Post(author=request.user, text=text, visibility=visibility)
     if image:
+        try:
+            images.probe(image)
+        except images.InvalidImage as e:
+            return Response({"error": str(e)}, status=400)
         p.image = image
     p.save()
+    if image:
+        images.process(p, "image")
+    timeline.on_post_created(p)
     return Response({"id": p.id})
 
 @api_view(["GET"])  # list posts honoring visibility
@@ -89,22 +118,46 @@ def list_posts(request):
 
     qs = Post.objects.filter(author=author).order_by("-created_at")
     if author != user:
-        is_follower = Follow.objects.filter(follower=user, following=author).exists()
+        is_follower = graph.is_following(user.id, author.id)
         qs = qs.filter(Q(visibility="public") | (Q(visibility="followers") & Q(visibility__isnull=False) if is_follower else Q(pk__isnull=True)))
+    # plain tuples of the columns the response needs; no model instances
+    rows = list(qs.values_list("id", "text", "image", "image_variants", "visibility", "reach_count", "created_at"))
+    data = [
+        {
+            "id": pid,
+            "author": author.username,
+            "text": text,
+            "imageUrl": images.variant_url(request, image, variants, POST_IMAGE_PX),
+            "visibility": visibility,
+            "reach_count": reach_count,
+            "created_at": created_at.isoformat(),
+        }
+        for pid, text, image, variants, visibility, reach_count, created_at in rows
+    ]
+    if author != user:
+        reach.buffer.add(row[0] for row in rows)
+    return Response(data)
+
+@api_view(["GET"])  # home timeline, newest first: ?before=<post id>&limit=
+@permission_classes([IsAuthenticated])
+def feed(request):
+    before = request.query_params.get("before")
+    if before is not None and not before.isdigit():
+        return Response({"error": "before must be a post id"}, status=400)
+    posts, has_more = timeline.page_feed(request.user, before=int(before) if before else None,
+                                         limit=parse_limit(request.query_params.get("limit")))
     data = [
         {
             "id": p.id,
             "author": p.author.username,
             "text": p.text,
-            "imageUrl": (request.build_absolute_uri(p.image.url) if p.image else ""),
+            "imageUrl": images.variant_url(request, p.image, p.image_variants, POST_IMAGE_PX),
             "visibility": p.visibility,
             "reach_count": p.reach_count,
             "created_at": p.created_at.isoformat(),
         }
-        for p in qs
+        for p in posts
     ]
-    if author != user:
-        for p in qs:
-            p.reach_count = (p.reach_count or 0) + 1
-            p.save(update_fields=["reach_count"])
-    return Response(data)
+    resp = Response(data)
+    resp["X-Has-More"] = "1" if has_more else "0"
+    return resp
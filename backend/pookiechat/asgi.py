@@ -13,6 +13,7 @@ application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter([
+            path("ws/chat/", ChatConsumer.as_asgi()),
             path("ws/chat/<uuid:conversation_id>/", ChatConsumer.as_asgi()),
         ])
     ),
@@ -0,0 +1,13 @@
+# ?limit= handling shared by the paged list endpoints (messages, inbox, feed)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def parse_limit(raw):
+    """Clamp a ?limit= value into [1, MAX_LIMIT]; fall back to DEFAULT_LIMIT"""
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
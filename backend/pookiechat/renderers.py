@@ -0,0 +1,29 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+# orjson builds the body in C, several times faster than json.dumps with
+# DRF's encoder on list endpoints. Output is byte-for-byte what JSONRenderer
+# gives for the plain dicts/lists/str/int payloads the API returns. Types
+# orjson would format differently (datetimes, which DRF writes with a "Z"
+# suffix and millisecond precision) are handed to DRF's encoder, and
+# anything orjson refuses (ints past 64 bits, ...) falls back to JSONRenderer
+# as a whole, as do indented (browsable API) responses.
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        encoder = self.encoder_class()
+        try:
+            ret = orjson.dumps(data, default=encoder.default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these so the output is a strict JavaScript subset
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
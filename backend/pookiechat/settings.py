@@ -22,9 +22,12 @@ INSTALLED_APPS = [
     "apps.accounts",
     "apps.chat",
     "apps.social",
+    "apps.media",
+    "apps.metrics",
 ]
 
 MIDDLEWARE = [
+    "apps.metrics.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -69,10 +72,52 @@ DATABASES = {
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
-        "CONFIG": {"hosts": [os.getenv("REDIS_URL", "redis://127.0.0.1:6379")]},
+        # capacity bounds each channel's buffer in Redis; past it, group sends to that socket are dropped
+        "CONFIG": {"hosts": [os.getenv("REDIS_URL", "redis://127.0.0.1:6379")], "capacity": 200, "expiry": 30},
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379"),
+    }
+}
+
+# ChatConsumer write-behind: flush queued messages every N ms or once a batch fills
+CHAT_WRITE_FLUSH_MS = int(os.getenv("CHAT_WRITE_FLUSH_MS", "5"))
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200"))
+# Messages older than CHAT_ARCHIVE_AFTER_DAYS that everyone has read are moved by
+# `manage.py tier_messages` into compressed segments of CHAT_ARCHIVE_SEGMENT_SIZE
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90"))
+CHAT_ARCHIVE_SEGMENT_SIZE = 500
+CHAT_EXPORT_CHUNK = 2000  # messages per query (and per NDJSON write) when exporting a conversation
+
+# ChatConsumer backpressure: sends/sec (+ burst) per socket and per user, outbound queue bound per socket
+CHAT_SEND_RATE = float(os.getenv("CHAT_SEND_RATE", "5"))
+CHAT_SEND_BURST = int(os.getenv("CHAT_SEND_BURST", "20"))
+CHAT_USER_SEND_RATE = float(os.getenv("CHAT_USER_SEND_RATE", "10"))
+CHAT_USER_SEND_BURST = int(os.getenv("CHAT_USER_SEND_BURST", "40"))
+CHAT_OUTBOX_LIMIT = int(os.getenv("CHAT_OUTBOX_LIMIT", "500"))
+CHAT_SLOW_CONSUMER_POLICY = os.getenv("CHAT_SLOW_CONSUMER_POLICY", "resync")  # or "close"
+# resume: missed messages are replayed in pages of CHAT_REPLAY_PAGE; a client
+# further behind than CHAT_REPLAY_MAX gets a resync and reloads over REST
+CHAT_REPLAY_PAGE = int(os.getenv("CHAT_REPLAY_PAGE", "200"))
+CHAT_REPLAY_MAX = int(os.getenv("CHAT_REPLAY_MAX", "2000"))
+# per-worker membership LRU in front of the shared cache (apps.chat.membership)
+CHAT_MEMBERSHIP_LOCAL_SIZE = int(os.getenv("CHAT_MEMBERSHIP_LOCAL_SIZE", "10000"))
+CHAT_MEMBERSHIP_LOCAL_TTL = float(os.getenv("CHAT_MEMBERSHIP_LOCAL_TTL", "5"))
+
+# list_posts reach counting: buffered per process, flushed every N seconds or at N distinct posts
+REACH_FLUSH_SECONDS = float(os.getenv("REACH_FLUSH_SECONDS", "5"))
+REACH_MAX_PENDING = int(os.getenv("REACH_MAX_PENDING", "1000"))
+
+# Home timeline: fan out on write up to FEED_FANOUT_LIMIT followers, fan in on read past it
+FEED_FANOUT_LIMIT = int(os.getenv("FEED_FANOUT_LIMIT", "5000"))
+FEED_MAX_ITEMS = 800
+FEED_TRIM_SAMPLE = 0.05
+FEED_BACKFILL = 50
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -86,13 +131,49 @@ USE_TZ = True
 STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# uploads are stored by content hash (apps.media.storage) and served with immutable caching;
+# set one of these to let the web server send the bytes instead of a Django worker
+STORAGES = {
+    "default": {"BACKEND": "apps.media.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "")  # nginx internal location, e.g. /protected-media/
+MEDIA_SENDFILE = os.getenv("MEDIA_SENDFILE", "") == "1"  # X-Sendfile (Apache mod_xsendfile, lighttpd)
+# Uploads stream to temp files (never memory) and are cut off past MEDIA_UPLOAD_MAX_BYTES.
+# Images are resized into WebP variants by MEDIA_IMAGE_WORKERS processes (0 = inline).
+FILE_UPLOAD_HANDLERS = ["apps.media.uploads.LimitedUploadHandler"]
+MEDIA_UPLOAD_MAX_BYTES = int(os.getenv("MEDIA_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+MEDIA_IMAGE_MAX_PIXELS = int(os.getenv("MEDIA_IMAGE_MAX_PIXELS", "40000000"))
+MEDIA_IMAGE_SIZES = (64, 256, 1024)
+MEDIA_IMAGE_WORKERS = int(os.getenv("MEDIA_IMAGE_WORKERS", "2"))
+# /api/metrics/ (Prometheus text) is open to staff sessions and to "Bearer <METRICS_TOKEN>".
+# A request or socket event running one SQL statement METRICS_NPLUSONE_THRESHOLD times is logged.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_NPLUSONE_THRESHOLD = int(os.getenv("METRICS_NPLUSONE_THRESHOLD", "10"))
+# Sessions are read from the cache (written through to the DB), and the
+# user with its profile from apps.accounts.context; ModelBackend stays listed
+# so sessions created before the switch keep working (blocks are enforced for
+# those by apps.accounts.authentication and the socket handshake).
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+AUTHENTICATION_BACKENDS = [
+    "apps.accounts.backends.CachedModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+ACCOUNTS_CONTEXT_TTL = 300
+# blocked-user set (apps.accounts.blocks): shared cache entry, and each worker's copy of it
+ACCOUNTS_BLOCKS_TTL = 300
+ACCOUNTS_BLOCKS_LOCAL_TTL = float(os.getenv("ACCOUNTS_BLOCKS_LOCAL_TTL", "5"))
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.SessionAuthentication",
+        "apps.accounts.authentication.BlockAwareSessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "pookiechat.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
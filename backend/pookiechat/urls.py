@@ -1,14 +1,14 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from apps.media.views import serve as serve_media
+from apps.metrics.views import metrics
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("apps.chat.urls")),
     path("api/", include("apps.accounts.urls")),
     path("api/", include("apps.social.urls")),
+    path("api/metrics/", metrics),
+    path(settings.MEDIA_URL.lstrip("/") + "<path:path>", serve_media),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
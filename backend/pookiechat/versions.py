@@ -0,0 +1,102 @@
+import asyncio
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+# Change versions let polled endpoints answer If-None-Match with a 304 from
+# one cache read. Counters are seeded from the clock, so an evicted key
+# comes back as a value no client has seen and can never yield a stale 304.
+# The same counters are the cache generations of apps.chat.membership,
+# apps.social.graph and apps.accounts.blocks, hence this shared module.
+
+LONG_POLL_MAX = 30
+LONG_POLL_TICK = 0.5
+
+
+def conversation_key(conversation_id):
+    return f"chat:v:conv:{conversation_id}"
+
+
+def user_key(user_id):
+    return f"chat:v:user:{user_id}"
+
+
+def _seed():
+    return time.time_ns() // 1000
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _seed(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _seed(), timeout=None)
+
+
+def bump_on_commit(conversation_ids=(), user_ids=()):
+    """Bump after the surrounding transaction commits, so a new version never points at old rows"""
+    keys = [conversation_key(c) for c in conversation_ids] + [user_key(u) for u in user_ids]
+    transaction.on_commit(lambda: bump(*keys))
+
+
+def _tag(version):
+    return f'W/"{version}"'
+
+
+def etag(key):
+    return _tag(get_version(key))
+
+
+def not_modified(request, tag):
+    return tag in [t.strip() for t in request.headers.get("If-None-Match", "").split(",")]
+
+
+def conditional(response, tag):
+    """Stamp a polled response so browsers revalidate it with If-None-Match"""
+    response["ETag"] = tag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def long_poll(key_for):
+    """Optional long-poll mode for a polled GET view: ?wait=<seconds>.
+
+    While the client's If-None-Match still matches the current version the
+    request is parked on the event loop, re-reading one cache key per tick,
+    then handed to the wrapped (sync) view, which answers 200 or 304 as usual.
+    `key_for(request, **kwargs)` names the version key to watch.
+    """
+    def decorator(view):
+        sync_view = sync_to_async(view)
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            wait = request.GET.get("wait")
+            if wait and request.headers.get("If-None-Match"):
+                user = await request.auser()
+                if user.is_authenticated:
+                    try:
+                        wait = min(float(wait), LONG_POLL_MAX)
+                    except ValueError:
+                        wait = 0
+                    key = key_for(request, user=user, **kwargs)
+                    deadline = time.monotonic() + wait
+                    while time.monotonic() < deadline:
+                        if not not_modified(request, _tag(await cache.aget(key))):
+                            break
+                        await asyncio.sleep(LONG_POLL_TICK)
+            return await sync_view(request, *args, **kwargs)
+
+        return wrapper
+    return decorator
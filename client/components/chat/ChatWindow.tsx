@@ -1,6 +1,8 @@
 import { useEffect, useRef, useState } from "react";
-import { Button, Input, List } from "antd";
+import { Button, Input, List, message as toast } from "antd";
 import { api } from "@/lib/api";
+import { ChatSocket, SocketMessage } from "@/lib/chatSocket";
+import { base64ToText, textToBase64 } from "@/lib/crypto";
 
 export default function ChatWindow() {
   const [me, setMe] = useState<string | null>(null);
@@ -22,22 +24,44 @@ export default function ChatWindow() {
     who();
   }, []);
 
+  const socket = useRef<ChatSocket | null>(null);
+  const lastSent = useRef("");
+  useEffect(() => {
+    if (!me) return;
+    socket.current = new ChatSocket();
+    return () => {
+      socket.current?.close();
+      socket.current = null;
+    };
+  }, [me]);
+
   useEffect(() => {
     let stop = false;
     async function load() {
-      try {
-        const res = await api.get("/conversations/list/");
-        const list: string[] = Array.from(
-          new Set(res.data.flatMap((c: any) => c.peers)),
-        );
-        if (!stop) setPeers(list);
-      } catch {}
+      // long-poll: the server holds the request until the inbox changes
+      let etag: string | undefined;
+      while (!stop) {
+        try {
+          const res = await api.get("/conversations/list/", {
+            params: etag ? { wait: 25 } : {},
+            headers: etag ? { "If-None-Match": etag } : {},
+            validateStatus: (s) => s === 200 || s === 304,
+          });
+          if (res.status === 200) {
+            etag = res.headers["etag"];
+            const list: string[] = Array.from(
+              new Set(res.data.flatMap((c: any) => c.peers)),
+            );
+            if (!stop) setPeers(list);
+          }
+        } catch {
+          await new Promise((r) => setTimeout(r, 5000));
+        }
+      }
     }
     load();
-    const iv = setInterval(load, 5000);
     return () => {
       stop = true;
-      clearInterval(iv);
     };
   }, []);
 
@@ -57,26 +81,61 @@ export default function ChatWindow() {
   useEffect(() => {
     if (!conversationId || !me) return;
     let stop = false;
-    async function fetchMessages() {
+    const toItem = (m: SocketMessage) =>
+      ({
+        id: String(m.id),
+        dir: m.sender === me ? "out" : "in",
+        text: base64ToText(m.ciphertext),
+        created_at: m.created_at,
+      }) as (typeof items)[number];
+    async function loadLatest() {
+      // the latest page over REST; the socket then resumes from its last id
+      const res = await api.get(`/conversations/${conversationId}/messages/`);
+      const rows = (res.data as SocketMessage[]).map(toItem);
+      if (stop) return null;
+      setItems(rows);
+      return rows.length ? rows[rows.length - 1].id : null;
+    }
+    async function start() {
+      let lastId: string | null = null;
       try {
-        const res = await api.get(`/conversations/${conversationId}/messages/`);
-        const rows = (res.data as any[]).map((m) => ({
-          id: m.id,
-          dir: m.sender === me ? "out" : "in",
-          text: m.ciphertext,
-          created_at: m.created_at,
-        }));
-        if (!stop) setItems(rows);
+        lastId = await loadLatest();
       } catch {}
+      if (stop) return;
+      socket.current?.subscribe(conversationId!, lastId, {
+        onMessage: (m) =>
+          setItems((prev) =>
+            prev.some((p) => p.id === String(m.id))
+              ? prev
+              : [...prev, toItem(m)],
+          ),
+        onResync: () => {
+          loadLatest().catch(() => {});
+        },
+        onError: (error) => toast.error(`Message not sent: ${error}`),
+        onThrottled: (retryAfter) => {
+          // the draft was cleared on send; hand it back unless something new was typed
+          setMessage((draft) => draft || lastSent.current);
+          toast.warning(
+            `Sending too fast, try again in ${Math.ceil(retryAfter)}s`,
+          );
+        },
+      });
     }
-    fetchMessages();
-    const iv = setInterval(fetchMessages, 5000);
+    setItems([]);
+    start();
     return () => {
       stop = true;
-      clearInterval(iv);
+      socket.current?.unsubscribe(conversationId);
     };
   }, [conversationId, me]);
 
+  useEffect(() => {
+    // everything on screen has been seen: move the read cursor to the newest message
+    if (!conversationId || !items.length) return;
+    socket.current?.markRead(conversationId, items[items.length - 1].id);
+  }, [items, conversationId]);
+
   const endRef = useRef<HTMLDivElement>(null);
   useEffect(
     () => endRef.current?.scrollIntoView({ behavior: "smooth" }),
@@ -86,9 +145,20 @@ export default function ChatWindow() {
   async function onSend(e: React.FormEvent) {
     e.preventDefault();
     if (!peer || !message.trim() || !conversationId) return;
-    await api.post(`/conversations/${conversationId}/messages/post/`, {
-      ciphertext: message.trim(),
-    });
+    const ciphertext = textToBase64(message.trim());
+    lastSent.current = message;
+    if (!socket.current?.send(conversationId, ciphertext)) {
+      try {
+        await api.post(`/conversations/${conversationId}/messages/post/`, {
+          ciphertext,
+        });
+      } catch (err: any) {
+        toast.error(
+          `Message not sent: ${err?.response?.data?.error ?? "network error"}`,
+        );
+        return;
+      }
+    }
     setMessage("");
   }
 
@@ -0,0 +1,121 @@
+// One multiplexed WebSocket (ws/chat/) for every conversation on screen.
+// Each subscription remembers the last message id it saw; after a reconnect
+// it resubscribes with that id and the server replays what was missed
+// before switching back to live messages.
+
+export type SocketMessage = {
+  id: string;
+  conversation: string;
+  ciphertext: string;
+  sender: string;
+  created_at: string;
+};
+
+type Handlers = {
+  onMessage: (m: SocketMessage) => void;
+  onResync?: () => void;
+  onError?: (error: string) => void;
+  onThrottled?: (retryAfter: number) => void;
+};
+
+const WS_BASE =
+  import.meta.env.VITE_WS_BASE_URL ||
+  `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}`;
+
+export class ChatSocket {
+  private ws: WebSocket | null = null;
+  private subs = new Map<string, { lastId: string | null; handlers: Handlers }>();
+  private retry = 0;
+  private closed = false;
+
+  constructor() {
+    this.open();
+  }
+
+  subscribe(conversationId: string, lastId: string | null, handlers: Handlers) {
+    this.subs.set(conversationId, { lastId, handlers });
+    this.sendSubscribe(conversationId);
+  }
+
+  unsubscribe(conversationId: string) {
+    this.subs.delete(conversationId);
+    this.raw({ action: "unsubscribe", conversation_id: conversationId });
+  }
+
+  send(conversationId: string, ciphertext: string) {
+    return this.raw({
+      action: "send",
+      conversation_id: conversationId,
+      ciphertext,
+    });
+  }
+
+  markRead(conversationId: string, messageId: string) {
+    return this.raw({
+      action: "read",
+      conversation_id: conversationId,
+      message_id: messageId,
+    });
+  }
+
+  close() {
+    this.closed = true;
+    this.ws?.close();
+  }
+
+  private open() {
+    const ws = new WebSocket(`${WS_BASE}/ws/chat/`);
+    this.ws = ws;
+    ws.onopen = () => {
+      this.retry = 0;
+      this.subs.forEach((_, id) => this.sendSubscribe(id));
+    };
+    ws.onmessage = (e) => {
+      const data = JSON.parse(e.data);
+      for (const frame of data.batch ?? [data]) this.dispatch(frame);
+    };
+    ws.onclose = (e) => {
+      if (this.closed) return;
+      // 4403: the account was blocked; reconnecting would only be refused
+      if (e.code === 4403) return;
+      const delay = Math.min(30000, 500 * 2 ** this.retry++);
+      setTimeout(() => this.open(), delay);
+    };
+  }
+
+  private dispatch(frame: any) {
+    if (frame.conversation === undefined) {
+      // socket-wide: a dropped backlog could have held any conversation's messages
+      if (frame.event === "resync")
+        this.subs.forEach((s) => s.handlers.onResync?.());
+      return;
+    }
+    const sub = this.subs.get(frame.conversation);
+    if (!sub) return;
+    if (frame.event === "resync") {
+      sub.handlers.onResync?.();
+    } else if (frame.event === "error") {
+      sub.handlers.onError?.(frame.error);
+    } else if (frame.event === "throttled") {
+      sub.handlers.onThrottled?.(frame.retry_after);
+    } else if (frame.id !== undefined && !frame.event) {
+      sub.lastId = frame.id;
+      sub.handlers.onMessage(frame);
+    }
+  }
+
+  private sendSubscribe(conversationId: string) {
+    const sub = this.subs.get(conversationId);
+    this.raw({
+      action: "subscribe",
+      conversation_id: conversationId,
+      last_id: sub?.lastId ?? undefined,
+    });
+  }
+
+  private raw(payload: object) {
+    if (this.ws?.readyState !== WebSocket.OPEN) return false;
+    this.ws.send(JSON.stringify(payload));
+    return true;
+  }
+}
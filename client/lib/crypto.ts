@@ -19,6 +19,20 @@ function base64ToBuf(b64: string): ArrayBuffer {
   return buf.buffer;
 }
 
+// The server stores a message's ciphertext as bytes and carries it as base64.
+// Until the chat window encrypts with encryptFor, it sends its text as UTF-8.
+export function textToBase64(text: string): string {
+  return bufToBase64(textEncoder.encode(text).buffer);
+}
+
+export function base64ToText(b64: string): string {
+  try {
+    return textDecoder.decode(base64ToBuf(b64));
+  } catch {
+    return b64;
+  }
+}
+
 export async function generateKeyPair(): Promise<{
   publicJwk: Jwk;
   privateJwk: Jwk;